@@ -0,0 +1,34 @@
+"""Add data generation counter
+
+Revision ID: 3f2a9c41d7e5
+Revises: 9be86f57bf7b
+Create Date: 2026-10-18 10:12:40.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f2a9c41d7e5'
+down_revision: Union[str, None] = '9be86f57bf7b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Счетчик поколений данных для инвалидации кэша результатов
+    op.create_table(
+        'data_generation',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('generation', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO data_generation (id, generation, updated_at) VALUES (1, 0, now())")
+
+
+def downgrade() -> None:
+    op.drop_table('data_generation')
@@ -0,0 +1,71 @@
+"""Add hourly and daily snapshot rollups
+
+Revision ID: 7c1e5b2f90a4
+Revises: 3f2a9c41d7e5
+Create Date: 2026-10-18 12:41:03.552917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e5b2f90a4'
+down_revision: Union[str, None] = '3f2a9c41d7e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+METRICS = ('views', 'likes', 'comments', 'reports')
+
+
+def _rollup_columns():
+    columns = [sa.Column(f'delta_{metric}_count', sa.BigInteger(), nullable=False) for metric in METRICS]
+    columns.append(sa.Column('snapshots_count', sa.BigInteger(), nullable=False))
+    columns.append(sa.Column('videos_count', sa.BigInteger(), nullable=False))
+    columns += [sa.Column(f'videos_with_{metric}_growth', sa.BigInteger(), nullable=False) for metric in METRICS]
+    return columns
+
+
+def _populate_sql(table: str, key: str, bucket_expr: str) -> str:
+    sums = ', '.join(f'COALESCE(SUM(vs.delta_{metric}_count), 0)' for metric in METRICS)
+    growth = ', '.join(
+        f'COUNT(DISTINCT vs.video_id) FILTER (WHERE vs.delta_{metric}_count > 0)' for metric in METRICS
+    )
+    columns = ', '.join(
+        [f'delta_{metric}_count' for metric in METRICS]
+        + ['snapshots_count', 'videos_count']
+        + [f'videos_with_{metric}_growth' for metric in METRICS]
+    )
+    return (
+        f"INSERT INTO {table} ({key}, creator_id, {columns}) "
+        f"SELECT {bucket_expr}, v.creator_id, {sums}, COUNT(*), COUNT(DISTINCT vs.video_id), {growth} "
+        f"FROM video_snapshots vs JOIN videos v ON vs.video_id = v.id GROUP BY 1, 2"
+    )
+
+
+def upgrade() -> None:
+    op.create_table(
+        'snapshot_rollup_hourly',
+        sa.Column('bucket', sa.DateTime(), nullable=False),
+        sa.Column('creator_id', sa.String(), nullable=False),
+        *_rollup_columns(),
+        sa.PrimaryKeyConstraint('bucket', 'creator_id')
+    )
+    op.create_table(
+        'snapshot_rollup_daily',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('creator_id', sa.String(), nullable=False),
+        *_rollup_columns(),
+        sa.PrimaryKeyConstraint('day', 'creator_id')
+    )
+
+    # Заполняем агрегаты по уже загруженным данным
+    op.execute(_populate_sql('snapshot_rollup_hourly', 'bucket', "date_trunc('hour', vs.created_at)"))
+    op.execute(_populate_sql('snapshot_rollup_daily', 'day', 'vs.created_at::date'))
+
+
+def downgrade() -> None:
+    op.drop_table('snapshot_rollup_daily')
+    op.drop_table('snapshot_rollup_hourly')
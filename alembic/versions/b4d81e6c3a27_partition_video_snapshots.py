@@ -0,0 +1,90 @@
+"""Partition video_snapshots by created_at
+
+Revision ID: b4d81e6c3a27
+Revises: 7c1e5b2f90a4
+Create Date: 2026-10-18 14:05:37.218604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.config import SNAPSHOT_PARTITION_INTERVAL
+from src.db.partitions import create_partition_sql, partitions_for_range
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4d81e6c3a27'
+down_revision: Union[str, None] = '7c1e5b2f90a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _snapshot_columns():
+    return [
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('video_id', sa.String(), nullable=False),
+        sa.Column('views_count', sa.BigInteger(), nullable=True),
+        sa.Column('likes_count', sa.BigInteger(), nullable=True),
+        sa.Column('comments_count', sa.BigInteger(), nullable=True),
+        sa.Column('reports_count', sa.BigInteger(), nullable=True),
+        sa.Column('delta_views_count', sa.BigInteger(), nullable=True),
+        sa.Column('delta_likes_count', sa.BigInteger(), nullable=True),
+        sa.Column('delta_comments_count', sa.BigInteger(), nullable=True),
+        sa.Column('delta_reports_count', sa.BigInteger(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['video_id'], ['videos.id'], ),
+    ]
+
+
+def _rename_old_table():
+    op.rename_table('video_snapshots', 'video_snapshots_old')
+    op.execute('ALTER INDEX video_snapshots_pkey RENAME TO video_snapshots_old_pkey')
+    op.execute('ALTER INDEX ix_video_snapshots_video_id RENAME TO ix_video_snapshots_old_video_id')
+    op.execute('ALTER INDEX ix_video_snapshots_created_at RENAME TO ix_video_snapshots_old_created_at')
+
+
+def _create_indexes():
+    op.create_index(op.f('ix_video_snapshots_video_id'), 'video_snapshots', ['video_id'], unique=False)
+    op.create_index(op.f('ix_video_snapshots_created_at'), 'video_snapshots', ['created_at'], unique=False)
+
+
+def upgrade() -> None:
+    _rename_old_table()
+
+    op.create_table(
+        'video_snapshots',
+        *_snapshot_columns(),
+        sa.PrimaryKeyConstraint('id', 'created_at'),
+        postgresql_partition_by='RANGE (created_at)',
+    )
+    _create_indexes()
+
+    # Партиции под уже загруженные данные
+    bounds = op.get_bind().execute(
+        sa.text('SELECT MIN(created_at), MAX(created_at) FROM video_snapshots_old')
+    ).one()
+    if bounds[0] is not None:
+        for name, lower, upper in partitions_for_range(bounds[0], bounds[1], SNAPSHOT_PARTITION_INTERVAL):
+            op.execute(create_partition_sql(name, lower, upper))
+
+    op.execute('INSERT INTO video_snapshots SELECT * FROM video_snapshots_old')
+    op.drop_table('video_snapshots_old')
+    op.execute('ANALYZE video_snapshots')
+
+
+def downgrade() -> None:
+    _rename_old_table()
+
+    op.create_table(
+        'video_snapshots',
+        *_snapshot_columns(),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    _create_indexes()
+
+    op.execute('INSERT INTO video_snapshots SELECT * FROM video_snapshots_old')
+    # Удаление родительской таблицы удаляет и все ее партиции
+    op.drop_table('video_snapshots_old')
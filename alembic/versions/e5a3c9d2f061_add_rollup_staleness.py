@@ -0,0 +1,29 @@
+"""Track snapshot rollups staleness in data_generation
+
+Revision ID: e5a3c9d2f061
+Revises: b4d81e6c3a27
+Create Date: 2026-10-18 23:10:52.604187
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a3c9d2f061'
+down_revision: Union[str, None] = 'b4d81e6c3a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Интервал замеров, загруженных после последнего пересчета агрегатов
+    op.add_column('data_generation', sa.Column('rollups_stale_from', sa.DateTime(), nullable=True))
+    op.add_column('data_generation', sa.Column('rollups_stale_to', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('data_generation', 'rollups_stale_to')
+    op.drop_column('data_generation', 'rollups_stale_from')
@@ -0,0 +1,71 @@
+"""
+Отправка пакета вопросов боту (POST /batch) и печать ответов в NDJSON
+
+Вопросы берутся из текстового файла (по одному на строку) или из CSV:
+каждая строка CSV подставляется в шаблон вопроса по именам колонок.
+
+    python scripts/ask_batch.py --input questions.txt
+    python scripts/ask_batch.py --input creators.csv \\
+        --template "Сколько видео у креатора с id {creator_id} вышло {date}?" --output answers.ndjson
+"""
+import argparse
+import asyncio
+import csv
+import json
+import sys
+import aiohttp
+from src.config import BATCH_API_HOST, BATCH_API_PORT, BATCH_API_TOKEN, BATCH_CONCURRENCY
+
+
+def read_questions(path: str, template: str = None) -> list[str]:
+    with open(path, encoding='utf-8', newline='') as f:
+        if template:
+            return [template.format(**row) for row in csv.DictReader(f)]
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+async def ask(url: str, questions: list[str], concurrency: int, token: str, output) -> dict:
+    """Отправляет пакет и пишет строки ответа по мере поступления; возвращает итоговую строку"""
+    headers = {'Authorization': f"Bearer {token}"} if token else {}
+    timeout = aiohttp.ClientTimeout(total=None, sock_read=None)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        payload = {'questions': questions, 'concurrency': concurrency}
+        async with session.post(url, json=payload, headers=headers) as response:
+            if response.status != 200:
+                raise SystemExit(f"{response.status}: {await response.text()}")
+            summary = {}
+            async for line in response.content:
+                item = json.loads(line)
+                if item.get('done'):
+                    summary = item
+                    continue
+                output.write(json.dumps(item, ensure_ascii=False) + '\n')
+                output.flush()
+            return summary
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Пакет вопросов к боту через HTTP")
+    parser.add_argument("--input", required=True, help="Файл вопросов (строка - вопрос) или CSV с --template")
+    parser.add_argument("--template", help="Шаблон вопроса для строк CSV, например '... {creator_id} ... {date}'")
+    parser.add_argument("--url", default=f"http://{BATCH_API_HOST}:{BATCH_API_PORT or 8090}/batch")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--token", default=BATCH_API_TOKEN)
+    parser.add_argument("--output", help="Файл для ответов (по умолчанию stdout)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    questions = read_questions(args.input, args.template)
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        summary = asyncio.run(ask(args.url, questions, args.concurrency, args.token, output))
+    finally:
+        if args.output:
+            output.close()
+    print(json.dumps(summary, ensure_ascii=False), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+"""
+Бенчмарк конвейера вопрос -> SQL -> ответ без сети и без настоящей модели
+
+Вместо Ollama поднимается локальная заглушка (scripts/ollama_stub.py) с
+настраиваемыми задержками prefill и генерации токенов. Корпус вопросов
+прогоняется на нескольких уровнях параллелизма тем же путем, что и в боте:
+правила, очередь генерации планировщика, LLM, извлечение и валидация SQL,
+переписывание запроса и (с --execute) выполнение в БД через очередь execute.
+
+Для каждого уровня печатаются p50/p95/p99 по этапам (мс) и вопросы в секунду,
+итог - JSON. Кэши шаблонов и результатов по умолчанию выключены, чтобы
+повторные прогоны измеряли весь путь; --with-caches оставляет их как в .env.
+
+    python scripts/benchmark_pipeline.py --concurrency 1,4,16 --output bench.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+from contextvars import ContextVar
+from functools import wraps
+from typing import Optional
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'bench_questions.txt')
+STAGES = (
+    'rules', 'queue_generate', 'generate', 'llm', 'extract', 'validate',
+    'prepare', 'queue_execute', 'execute', 'total',
+)
+
+# Замеры текущего вопроса; задачи планировщика получают их через _in_context
+_timings: ContextVar[Optional[dict]] = ContextVar('timings', default=None)
+
+
+def _record(stage: str, started: float):
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - started) * 1000
+
+
+def timed(stage: str, func):
+    """Обертка, добавляющая время вызова func к этапу stage текущего вопроса"""
+    if asyncio.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _record(stage, started)
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _record(stage, started)
+    return wrapper
+
+
+def _in_context(timings: dict, queue_stage: str, func):
+    """Задача для планировщика: пишет замеры в timings и считает ожидание в очереди"""
+    submitted = time.perf_counter()
+
+    async def job(*args, **kwargs):
+        timings[queue_stage] = (time.perf_counter() - submitted) * 1000
+        token = _timings.set(timings)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _timings.reset(token)
+    return job
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Перцентиль по методу ближайшего ранга"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        'count': len(values),
+        'p50': round(percentile(values, 50), 2),
+        'p95': round(percentile(values, 95), 2),
+        'p99': round(percentile(values, 99), 2),
+        'mean': round(sum(values) / len(values), 2),
+    }
+
+
+def load_corpus(path: str) -> list[str]:
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def instrument():
+    """Оборачивает функции конвейера замерами этапов"""
+    from src.llm import sql_generator
+    from src.llm.client import OllamaClient
+
+    sql_generator.extract_sql_from_response = timed('extract', sql_generator.extract_sql_from_response)
+    sql_generator.validate_sql = timed('validate', sql_generator.validate_sql)
+    OllamaClient.generate = timed('llm', OllamaClient.generate)
+    OllamaClient.generate_stream = timed('llm', OllamaClient.generate_stream)
+
+
+async def answer(chat_id: int, question: str, args: argparse.Namespace) -> dict:
+    """Один вопрос по пути бота; возвращает замеры этапов и исход"""
+    from src.bot.pipeline import execute_sql_query, prepare_sql, remember_sql
+    from src.bot.scheduler import scheduler
+    from src.llm.rules import rule_matcher
+    from src.llm.sql_generator import generate_sql
+
+    timings: dict = {}
+    token = _timings.set(timings)
+    started = time.perf_counter()
+    outcome = 'ok'
+    try:
+        sql = None if args.no_rules else timed('rules', rule_matcher.match)(question)
+        from_rules = bool(sql)
+        if not sql:
+            sql = await timed('generate', scheduler.generate.run)(
+                chat_id, _in_context(timings, 'queue_generate', generate_sql), question,
+            )
+        if not sql:
+            outcome = 'no_sql'
+        else:
+            generated_sql = sql
+            sql = timed('prepare', prepare_sql)(sql)
+            success = True
+            if args.execute:
+                success, _ = await timed('execute', scheduler.execute.run)(
+                    chat_id, _in_context(timings, 'queue_execute', execute_sql_query), sql,
+                    check_cost=not from_rules,
+                )
+                outcome = 'ok' if success else 'execute_error'
+            # Как в боте: шаблон сохраняется после выполнения (без --execute - сразу)
+            if success and not from_rules:
+                remember_sql(question, generated_sql)
+        if from_rules:
+            outcome += '_rules'
+    except Exception as e:
+        outcome = type(e).__name__
+    finally:
+        timings['total'] = (time.perf_counter() - started) * 1000
+        _timings.reset(token)
+    return {'timings': timings, 'outcome': outcome}
+
+
+async def run_level(questions: list[str], concurrency: int, args: argparse.Namespace) -> dict:
+    """Прогон корпуса: concurrency пользователей берут вопросы из общей очереди"""
+    pending = iter(questions)
+    results = []
+
+    async def user(chat_id: int):
+        for question in pending:
+            results.append(await answer(chat_id, question, args))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(chat_id) for chat_id in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    outcomes: dict[str, int] = {}
+    for result in results:
+        outcomes[result['outcome']] = outcomes.get(result['outcome'], 0) + 1
+    stages = {}
+    for stage in STAGES:
+        values = [r['timings'][stage] for r in results if stage in r['timings']]
+        if values:
+            stages[stage] = summarize(values)
+    return {
+        'concurrency': concurrency,
+        'questions': len(results),
+        'elapsed_s': round(elapsed, 3),
+        'qps': round(len(results) / elapsed, 2),
+        'outcomes': outcomes,
+        'stages_ms': stages,
+    }
+
+
+async def start_stub(args: argparse.Namespace):
+    """Запускает заглушку Ollama на свободном порту; возвращает (runner, base_url)"""
+    from aiohttp import web
+    from ollama_stub import create_app, parse_model  # scripts/ - каталог запуска скрипта
+
+    models = dict(parse_model(value) for value in args.model)
+    app = create_app(args.prefill_ms, args.token_ms, args.chars_per_token, models)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Офлайн бенчмарк конвейера вопрос -> SQL")
+    parser.add_argument("--corpus", default=CORPUS_PATH, help="Файл с вопросами, по одному в строке")
+    parser.add_argument("--concurrency", default="1,4,16", help="Уровни параллелизма через запятую")
+    parser.add_argument("--rounds", type=int, default=1, help="Сколько раз пройти корпус на каждом уровне")
+    parser.add_argument("--warmup", type=int, default=4, help="Вопросов для прогрева перед замерами")
+    parser.add_argument("--prefill-ms", type=float, default=200, help="Задержка заглушки до первого токена")
+    parser.add_argument("--token-ms", type=float, default=15, help="Задержка заглушки между токенами")
+    parser.add_argument("--chars-per-token", type=int, default=4)
+    parser.add_argument("--model", action="append", default=[],
+                        help="Модель каскада в заглушке: имя=prefill_ms:token_ms:доля_отказов (можно несколько)")
+    parser.add_argument("--stub-url", help="Уже запущенная заглушка (или настоящая Ollama) вместо встроенной")
+    parser.add_argument("--no-rules", action="store_true", help="Все вопросы через LLM, без правил")
+    parser.add_argument("--execute", action="store_true", help="Выполнять SQL в БД (нужен DATABASE_URL)")
+    parser.add_argument("--with-caches", action="store_true", help="Не выключать кэши шаблонов и результатов")
+    parser.add_argument("--verbose", action="store_true", help="Не скрывать вывод конвейера")
+    parser.add_argument("--output", help="Сохранить JSON отчет в файл")
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace):
+    """Основная функция"""
+    from src import config
+    from src.bot.scheduler import scheduler
+    from src.db.database import close_db
+    from src.llm.cascade import model_cascade
+    from src.llm.client import close_llm_client, init_llm_client
+
+    runner = None
+    if args.stub_url:
+        base_url = args.stub_url
+    else:
+        runner, base_url = await start_stub(args)
+    init_llm_client(base_url=base_url)
+    instrument()
+
+    questions = load_corpus(args.corpus)
+    levels = [int(level) for level in args.concurrency.split(',')]
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'corpus': os.path.basename(args.corpus),
+        'corpus_size': len(questions),
+        'config': {
+            'ollama_url': base_url,
+            'stub': None if args.stub_url else {
+                'prefill_ms': args.prefill_ms, 'token_ms': args.token_ms, 'chars_per_token': args.chars_per_token,
+                'models': args.model,
+            },
+            'model_tiers': config.OLLAMA_MODEL_TIERS,
+            'cascade_mode': config.CASCADE_MODE,
+            'ollama_max_concurrency': config.OLLAMA_MAX_CONCURRENCY,
+            'ollama_stream': config.OLLAMA_STREAM,
+            'generate_workers': scheduler.generate.workers,
+            'execute_workers': scheduler.execute.workers,
+            'rules': not args.no_rules,
+            'execute': args.execute,
+            'caches': args.with_caches,
+            'rounds': args.rounds,
+        },
+        'levels': [],
+    }
+
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    try:
+        with output:
+            if args.warmup:
+                await run_level(questions[:args.warmup], 1, args)
+            for level in levels:
+                report['levels'].append(await run_level(questions * args.rounds, level, args))
+        if runner is not None:
+            report['stub_stats'] = dict(runner.app['stats'])
+        report['scheduler'] = scheduler.stats()
+        report['cascade'] = model_cascade.stats()
+    finally:
+        await scheduler.stop()
+        await close_llm_client()
+        if args.execute:
+            await close_db()
+        if runner is not None:
+            await runner.cleanup()
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not args.with_caches:
+        # До импорта src: кэши создаются при импорте модулей
+        os.environ['SQL_TEMPLATE_CACHE_ENABLED'] = '0'
+        os.environ['RESULT_CACHE_ENABLED'] = '0'
+    asyncio.run(main(args))
@@ -0,0 +1,54 @@
+"""
+Скрипт для отсоединения старых партиций video_snapshots
+
+Партиции, целиком лежащие раньше указанной даты, отсоединяются от таблицы
+(ALTER TABLE ... DETACH PARTITION) и при --drop удаляются. Это не требует
+построчного DELETE и VACUUM. Предагрегированные таблицы не затрагиваются.
+"""
+import argparse
+import asyncio
+from datetime import datetime
+import asyncpg
+from src.db.database import BUMP_DATA_GENERATION_SQL
+from src.db.partitions import detach_partitions_before, list_partitions
+from src.ingest.bulk import asyncpg_dsn
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Отсоединение старых партиций video_snapshots")
+    parser.add_argument(
+        "--before", required=True, type=datetime.fromisoformat,
+        help="Отсоединить партиции, которые целиком раньше этой даты (YYYY-MM-DD)",
+    )
+    parser.add_argument("--drop", action="store_true", help="Удалить отсоединенные партиции")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет отсоединено")
+    return parser.parse_args()
+
+
+async def main():
+    """Основная функция"""
+    args = parse_args()
+    conn = await asyncpg.connect(asyncpg_dsn())
+    try:
+        if args.dry_run:
+            for name, lower, upper in await list_partitions(conn):
+                if upper <= args.before:
+                    print(f"{name}: {lower} - {upper}")
+            return
+
+        async with conn.transaction():
+            detached = await detach_partitions_before(conn, args.before, drop=args.drop)
+            if detached:
+                # Запросы к снапшотам теперь возвращают другие результаты
+                await conn.execute(BUMP_DATA_GENERATION_SQL)
+    finally:
+        await conn.close()
+
+    action = "Удалено" if args.drop else "Отсоединено"
+    print(f"{action} партиций: {len(detached)}")
+    for name in detached:
+        print(f"  {name}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,148 @@
+"""
+Оценка выбора похожих примеров для промпта (src/llm/examples.py)
+
+Банк примеров делится на обучающую и отложенную части. Индекс строится только
+по обучающей части, и для каждого отложенного вопроса считается:
+- попал ли пример того же типа (intent) в top-1 и top-k;
+- размер промпта со всеми примерами и с top-k (символы и приблизительные токены,
+  с --ollama - точное число токенов prompt_eval_count).
+С --ollama SQL генерируется по обоим вариантам промпта. Точность - доля
+ответов, совпавших с эталоном: по результату запроса в БД с --execute, иначе
+по канонической форме SQL. Итог печатается в JSON.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import statistics
+from typing import Optional
+import asyncpg
+from src.config import OLLAMA_MODEL
+from src.db.result_cache import canonicalize_sql
+from src.ingest.bulk import asyncpg_dsn
+from src.llm.client import close_llm_client, get_llm_client
+from src.llm.examples import Example, ExampleIndex, load_examples
+from src.llm.prompts import build_system_prompt, get_sql_generation_prompt
+from src.llm.sql_generator import extract_sql_from_response, generation_options, validate_sql
+
+_TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+
+
+def approx_tokens(text: str) -> int:
+    """Грубая оценка числа токенов: слова и знаки препинания"""
+    return len(_TOKEN_RE.findall(text))
+
+
+async def generate(system: str, prompt: str) -> tuple[Optional[str], int]:
+    """SQL и число токенов промпта по данным Ollama"""
+    data = await get_llm_client().generate({
+        "model": OLLAMA_MODEL,
+        "system": system,
+        "prompt": prompt,
+        "stream": False,
+        "options": generation_options(),
+    })
+    sql = extract_sql_from_response(data.get("response", ""))
+    if sql and not validate_sql(sql):
+        sql = None
+    return sql, data.get("prompt_eval_count", 0)
+
+
+async def same_answer(conn: Optional[asyncpg.Connection], sql: Optional[str], reference: str) -> bool:
+    if not sql:
+        return False
+    if conn is None:
+        return canonicalize_sql(sql) == canonicalize_sql(reference)
+    try:
+        return await conn.fetchval(sql) == await conn.fetchval(reference)
+    except Exception as e:
+        print(f"Ошибка при выполнении SQL: {e}")
+        return False
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Оценка выбора примеров для промпта")
+    parser.add_argument("--examples", help="Файл банка примеров (по умолчанию EXAMPLES_PATH)")
+    parser.add_argument("--holdout", type=float, default=0.25, help="Доля отложенных примеров")
+    parser.add_argument("--seed", type=int, default=0, help="Seed для разбиения")
+    parser.add_argument("--k", type=int, default=3, help="Сколько примеров класть в промпт")
+    parser.add_argument("--ollama", action="store_true", help="Генерировать SQL через Ollama и считать точность")
+    parser.add_argument("--execute", action="store_true", help="Сравнивать результаты запросов в БД (с --ollama)")
+    return parser.parse_args()
+
+
+async def main():
+    """Основная функция"""
+    args = parse_args()
+    examples = load_examples(args.examples) if args.examples else load_examples()
+    random.Random(args.seed).shuffle(examples)
+    split = max(1, int(len(examples) * args.holdout))
+    held_out, train = examples[:split], examples[split:]
+    index = ExampleIndex(train)
+
+    full_system = build_system_prompt(with_examples=True)
+    short_system = build_system_prompt(with_examples=False)
+
+    hits_top1 = hits_top_k = 0
+    # Отдельно - по вопросам, тип которых есть в обучающей части (иначе попадание невозможно)
+    train_intents = {e.intent for e in train}
+    seen = seen_hits_top_k = 0
+    full_chars, short_chars, full_tokens, short_tokens = [], [], [], []
+    correct = {"all_examples": 0, "top_k": 0}
+    ollama_tokens = {"all_examples": [], "top_k": []}
+
+    conn = await asyncpg.connect(asyncpg_dsn()) if args.ollama and args.execute else None
+    try:
+        for example in held_out:
+            selected: list[Example] = index.top_k(example.question, args.k)
+            intents = [e.intent for e in selected]
+            hits_top1 += bool(intents) and intents[0] == example.intent
+            hits_top_k += example.intent in intents
+            if example.intent in train_intents:
+                seen += 1
+                seen_hits_top_k += example.intent in intents
+
+            # Полный промпт: все примеры в системной части; короткий - только top-k
+            full_prompt = get_sql_generation_prompt(example.question, examples=[])
+            short_prompt = get_sql_generation_prompt(example.question, examples=selected)
+            full_chars.append(len(full_system) + len(full_prompt))
+            short_chars.append(len(short_system) + len(short_prompt))
+            full_tokens.append(approx_tokens(full_system + full_prompt))
+            short_tokens.append(approx_tokens(short_system + short_prompt))
+
+            if args.ollama:
+                for name, system, prompt in (
+                    ("all_examples", full_system, full_prompt),
+                    ("top_k", short_system, short_prompt),
+                ):
+                    sql, tokens = await generate(system, prompt)
+                    ollama_tokens[name].append(tokens)
+                    correct[name] += await same_answer(conn, sql, example.sql)
+    finally:
+        if conn is not None:
+            await conn.close()
+        await close_llm_client()
+
+    total = len(held_out)
+    report = {
+        "examples": len(examples),
+        "train": len(train),
+        "held_out": total,
+        "k": args.k,
+        "intent_hit_top1": hits_top1 / total,
+        "intent_hit_top_k": hits_top_k / total,
+        "intent_hit_top_k_seen": seen_hits_top_k / seen if seen else None,
+        "prompt_chars": {"all_examples": statistics.mean(full_chars), "top_k": statistics.mean(short_chars)},
+        "prompt_tokens_approx": {"all_examples": statistics.mean(full_tokens), "top_k": statistics.mean(short_tokens)},
+        "prompt_tokens_saved": 1 - statistics.mean(short_tokens) / statistics.mean(full_tokens),
+    }
+    if args.ollama:
+        report["prompt_tokens_ollama"] = {name: statistics.mean(v) for name, v in ollama_tokens.items()}
+        report["accuracy"] = {name: value / total for name, value in correct.items()}
+        report["accuracy_by"] = "result" if args.execute else "canonical_sql"
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
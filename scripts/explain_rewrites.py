@@ -0,0 +1,82 @@
+"""
+Проверка переписывания условий по времени (src/sql/sargable.py)
+
+Для каждого примера SQL из промпта (и запросов из файла, если он указан)
+скрипт выполняет исходный и переписанный запрос, сравнивает результаты и
+печатает оценку стоимости плана до и после (EXPLAIN). С --analyze также
+выводится фактическое время выполнения. Код возврата 1, если хотя бы один
+результат не совпал.
+"""
+import argparse
+import asyncio
+import json
+import re
+import sys
+import asyncpg
+from src.ingest.bulk import asyncpg_dsn
+from src.llm.prompts import EXAMPLES
+from src.sql.sargable import rewrite_sargable
+
+_EXAMPLE_SQL_RE = re.compile(r'SQL:\s*(SELECT.*?);', re.IGNORECASE | re.DOTALL)
+
+
+def example_queries() -> list[str]:
+    """SQL из примеров в промпте"""
+    return [re.sub(r'\s+', ' ', m.group(1)).strip() for m in _EXAMPLE_SQL_RE.finditer(EXAMPLES)]
+
+
+async def explain(conn: asyncpg.Connection, sql: str, analyze: bool) -> dict:
+    options = 'ANALYZE, FORMAT JSON' if analyze else 'FORMAT JSON'
+    plan = json.loads(await conn.fetchval(f'EXPLAIN ({options}) {sql}'))[0]
+    return {
+        'cost': plan['Plan']['Total Cost'],
+        'time': plan.get('Execution Time'),
+        'node': plan['Plan']['Node Type'],
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Сравнение планов до и после переписывания условий по времени")
+    parser.add_argument("--queries", help="Файл с дополнительными запросами (по одному SQL на строку)")
+    parser.add_argument("--analyze", action="store_true", help="Выполнить EXPLAIN ANALYZE")
+    return parser.parse_args()
+
+
+async def main() -> int:
+    """Основная функция"""
+    args = parse_args()
+    queries = example_queries()
+    if args.queries:
+        with open(args.queries, encoding='utf-8') as f:
+            queries += [line.strip().rstrip(';') for line in f if line.strip()]
+
+    mismatches = 0
+    conn = await asyncpg.connect(asyncpg_dsn())
+    try:
+        for sql in queries:
+            rewritten = rewrite_sargable(sql)
+            if rewritten == sql:
+                continue
+
+            before = await explain(conn, sql, args.analyze)
+            after = await explain(conn, rewritten, args.analyze)
+            expected = await conn.fetchval(sql)
+            actual = await conn.fetchval(rewritten)
+            same = expected == actual
+            mismatches += not same
+
+            print(f"До:    {sql}")
+            print(f"После: {rewritten}")
+            print(f"  стоимость: {before['cost']:.1f} ({before['node']}) -> {after['cost']:.1f} ({after['node']})")
+            if args.analyze:
+                print(f"  время: {before['time']:.2f} мс -> {after['time']:.2f} мс")
+            print(f"  результат: {expected} / {actual} {'OK' if same else 'НЕ СОВПАДАЕТ'}\n")
+    finally:
+        await conn.close()
+
+    print(f"Расхождений: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,143 @@
+"""
+Выгрузка videos и video_snapshots в колоночные файлы для локального движка
+
+Таблицы читаются в одной транзакции REPEATABLE READ (один снимок данных,
+поколение данных из того же снимка) порциями через курсор, отсортированными
+по времени, и пишутся в .npy файлы колонок (src/columnar/store.py). Выгрузка
+собирается во временном каталоге и подменяет прежнюю целиком, поэтому бот
+никогда не видит ее наполовину записанной; новую выгрузку бот откроет сам,
+когда поколение данных в БД с ней совпадет.
+
+    python scripts/export_columnar.py --output data/columnar
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+import asyncpg
+import numpy as np
+from src.config import COLUMNAR_PATH
+from src.columnar.store import SNAPSHOT_COLUMNS, TIME_DTYPE, VIDEO_COLUMNS, ColumnWriter
+from src.ingest.bulk import asyncpg_dsn
+
+_COUNTERS = ['views_count', 'likes_count', 'comments_count', 'reports_count']
+_DELTAS = [f'delta_{column}' for column in _COUNTERS]
+
+VIDEOS_SQL = (
+    f"SELECT id, creator_id, video_created_at, {', '.join(_COUNTERS)} "
+    "FROM videos ORDER BY video_created_at, id"
+)
+SNAPSHOTS_SQL = (
+    f"SELECT video_id, created_at, {', '.join(_COUNTERS + _DELTAS)} "
+    "FROM video_snapshots ORDER BY created_at, video_id"
+)
+
+
+def _column(rows: list, index: int, dtype: str, nulls: dict, column: str) -> np.ndarray:
+    """
+    Колонка части строк; NULL в счетчиках пишется как 0 и считается в nulls[column],
+    движок не отвечает на запросы по таким колонкам
+    """
+    if dtype == TIME_DTYPE:
+        return np.array([row[index] for row in rows], dtype=dtype)
+    missing = sum(1 for row in rows if row[index] is None)
+    if missing:
+        nulls[column] = nulls.get(column, 0) + missing
+    return np.fromiter((0 if row[index] is None else row[index] for row in rows), dtype=dtype, count=len(rows))
+
+
+async def export(conn: asyncpg.Connection, path: str, chunk_size: int) -> dict:
+    """Выгружает обе таблицы в каталог path и возвращает число строк"""
+    async with conn.transaction(isolation='repeatable_read', readonly=True):
+        generation = await conn.fetchval("SELECT generation FROM data_generation WHERE id = 1") or 0
+        rows = {
+            'videos': await conn.fetchval("SELECT count(*) FROM videos"),
+            'video_snapshots': await conn.fetchval("SELECT count(*) FROM video_snapshots"),
+        }
+        print(f"Поколение данных {generation}: видео {rows['videos']:,}, замеров {rows['video_snapshots']:,}")
+        writer = ColumnWriter(path, rows)
+
+        nulls: dict[str, dict[str, int]] = {'videos': {}, 'video_snapshots': {}}
+        creators: dict[str, int] = {}
+        # Код видео - номер строки в videos; креатор видео нужен и в замерах
+        video_codes: dict[str, tuple[int, int]] = {}
+        cursor = await conn.cursor(VIDEOS_SQL)
+        while batch := await cursor.fetch(chunk_size):
+            chunk = {'video_created_at': _column(batch, 2, TIME_DTYPE, nulls['videos'], 'video_created_at')}
+            creator_codes = []
+            for row in batch:
+                creator = creators.setdefault(row['creator_id'], len(creators))
+                video_codes[row['id']] = (len(video_codes), creator)
+                creator_codes.append(creator)
+            chunk['creator'] = np.array(creator_codes, dtype=VIDEO_COLUMNS['creator'])
+            for i, column in enumerate(_COUNTERS, start=3):
+                chunk[column] = _column(batch, i, VIDEO_COLUMNS[column], nulls['videos'], column)
+            writer.append('videos', chunk)
+
+        exported = 0
+        started = time.perf_counter()
+        cursor = await conn.cursor(SNAPSHOTS_SQL)
+        while batch := await cursor.fetch(chunk_size):
+            codes = [video_codes[row['video_id']] for row in batch]
+            chunk = {
+                'created_at': _column(batch, 1, TIME_DTYPE, nulls['video_snapshots'], 'created_at'),
+                'video': np.fromiter((code for code, _ in codes), dtype=SNAPSHOT_COLUMNS['video'], count=len(codes)),
+                'creator': np.fromiter((creator for _, creator in codes), dtype=SNAPSHOT_COLUMNS['creator'],
+                                       count=len(codes)),
+            }
+            for i, column in enumerate(_COUNTERS + _DELTAS, start=2):
+                chunk[column] = _column(batch, i, SNAPSHOT_COLUMNS[column], nulls['video_snapshots'], column)
+            writer.append('video_snapshots', chunk)
+            exported += len(batch)
+            print(f"\rЗамеров выгружено: {exported:,} ({exported / (time.perf_counter() - started):,.0f} строк/с)",
+                  end='', flush=True)
+        print()
+
+    for table, columns in nulls.items():
+        for column, count in columns.items():
+            print(f"{table}.{column}: {count:,} NULL - запросы по этой колонке пойдут в БД")
+    creator_ids = sorted(creators, key=creators.get)
+    writer.close(creator_ids, generation, datetime.now(timezone.utc).isoformat(timespec='seconds'), nulls)
+    return rows
+
+
+def replace_dir(source: str, target: str):
+    """Подменяет каталог target каталогом source (прежняя выгрузка удаляется)"""
+    previous = f"{target}.old"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(target):
+        os.rename(target, previous)
+    os.rename(source, target)
+    # Открытые ботом mmap продолжают работать: файлы удаляются, но остаются доступны до закрытия
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Выгрузка таблиц в колоночные файлы NumPy")
+    parser.add_argument("--output", default=COLUMNAR_PATH, help=f"Каталог выгрузки (по умолчанию {COLUMNAR_PATH})")
+    parser.add_argument("--chunk-size", type=int, default=100_000, help="Строк за одно чтение курсора")
+    return parser.parse_args()
+
+
+async def main():
+    """Основная функция"""
+    args = parse_args()
+    output = args.output.rstrip('/')
+    temporary = f"{output}.tmp-{os.getpid()}"
+    started = time.perf_counter()
+    conn = await asyncpg.connect(asyncpg_dsn())
+    try:
+        rows = await export(conn, temporary, args.chunk_size)
+    except BaseException:
+        shutil.rmtree(temporary, ignore_errors=True)
+        raise
+    finally:
+        await conn.close()
+    replace_dir(temporary, output)
+    print(f"Выгрузка {output}: {rows} за {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
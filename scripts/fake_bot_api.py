@@ -0,0 +1,222 @@
+"""
+Локальный поддельный Telegram Bot API для проверки бота без сети
+
+Поддерживает методы, которые использует бот: getMe, sendMessage, setWebhook,
+deleteWebhook, getWebhookInfo и getUpdates (long polling). Обновления
+добавляются служебным запросом и доставляются на зарегистрированный webhook
+(с секретным токеном) или отдаются через getUpdates.
+
+    python scripts/fake_bot_api.py --port 8081
+    TELEGRAM_API_URL=http://127.0.0.1:8081 TELEGRAM_BOT_TOKEN=123:test python run_bot.py
+
+Служебные маршруты:
+    POST /fake/send      {"text": "...", "chat_id": 1, "count": 1} - отправить боту сообщения
+    GET  /fake/messages  ответы бота (sendMessage)
+    GET  /fake/stats     число обновлений, доставок на webhook и ответов
+
+    python scripts/fake_bot_api.py --burst 200 --text "Сколько всего видео есть в системе?"
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from typing import Optional
+import aiohttp
+from aiohttp import web
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class FakeBotAPI:
+    """Состояние поддельного Bot API: webhook, очередь обновлений и отправленные сообщения"""
+
+    def __init__(self):
+        self.webhook_url = ''
+        self.secret_token = ''
+        self.updates: asyncio.Queue[dict] = asyncio.Queue()
+        self.messages: list[dict] = []
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.updates_created = 0
+        self.delivered = 0
+        self.delivery_errors = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._deliveries: set[asyncio.Task] = set()
+
+    def make_update(self, chat_id: int, text: str) -> dict:
+        self.updates_created += 1
+        user = {'id': chat_id, 'is_bot': False, 'first_name': 'Test'}
+        return {
+            'update_id': next(self.update_ids),
+            'message': {
+                'message_id': next(self.message_ids),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private', 'first_name': 'Test'},
+                'from': user,
+                'text': text,
+            },
+        }
+
+    async def deliver(self, update: dict):
+        """Webhook: POST на адрес бота, повтор при ошибке (как делает Telegram)"""
+        headers = {SECRET_HEADER: self.secret_token} if self.secret_token else {}
+        deadline = time.monotonic() + 120
+        for attempt in itertools.count():
+            if time.monotonic() > deadline:
+                return
+            try:
+                async with self._session.post(self.webhook_url, json=update, headers=headers) as response:
+                    if response.status == 200:
+                        self.delivered += 1
+                        return
+            except aiohttp.ClientError:
+                pass
+            self.delivery_errors += 1
+            await asyncio.sleep(min(0.2 * 2 ** attempt, 5))
+
+    def push(self, update: dict):
+        if self.webhook_url:
+            task = asyncio.create_task(self.deliver(update))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+        else:
+            self.updates.put_nowait(update)
+
+    async def start(self, app: web.Application):
+        self._session = aiohttp.ClientSession()
+
+    async def stop(self, app: web.Application):
+        for task in self._deliveries:
+            task.cancel()
+        await self._session.close()
+
+
+async def _params(request: web.Request) -> dict:
+    """Параметры метода: JSON, form-data или query string"""
+    if request.content_type == 'application/json':
+        return await request.json()
+    params = dict(request.query)
+    params.update(await request.post())
+    return params
+
+
+def create_app() -> web.Application:
+    api = FakeBotAPI()
+
+    def ok(result) -> web.Response:
+        return web.json_response({'ok': True, 'result': result})
+
+    async def call_method(request: web.Request) -> web.Response:
+        method = request.match_info['method'].lower()
+        params = await _params(request)
+        if method == 'getme':
+            return ok({'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'})
+        if method == 'sendmessage':
+            message = {
+                'message_id': next(api.message_ids),
+                'date': int(time.time()),
+                'chat': {'id': int(params['chat_id']), 'type': 'private', 'first_name': 'Test'},
+                'text': str(params.get('text', '')),
+            }
+            api.messages.append({'chat_id': message['chat']['id'], 'text': message['text']})
+            return ok(message)
+        if method == 'setwebhook':
+            api.webhook_url = str(params['url'])
+            api.secret_token = str(params.get('secret_token', ''))
+            # Накопленные обновления доставляются на новый webhook
+            while not api.updates.empty():
+                api.push(api.updates.get_nowait())
+            return ok(True)
+        if method == 'deletewebhook':
+            api.webhook_url = ''
+            return ok(True)
+        if method == 'getwebhookinfo':
+            return ok({'url': api.webhook_url, 'has_custom_certificate': False, 'pending_update_count': 0})
+        if method == 'getupdates':
+            offset = int(params.get('offset') or 0)
+            timeout = float(params.get('timeout') or 0)
+            updates = []
+            try:
+                updates.append(await asyncio.wait_for(api.updates.get(), timeout) if timeout else api.updates.get_nowait())
+            except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                pass
+            while not api.updates.empty():
+                updates.append(api.updates.get_nowait())
+            return ok([u for u in updates if u['update_id'] >= offset])
+        return web.json_response({'ok': False, 'error_code': 404, 'description': f'Not Found: {method}'}, status=404)
+
+    async def fake_send(request: web.Request) -> web.Response:
+        body = await request.json()
+        count = int(body.get('count', 1))
+        chat_id = int(body.get('chat_id', 1))
+        for i in range(count):
+            # Разные чаты, если не задан один чат явно
+            api.push(api.make_update(chat_id if 'chat_id' in body else chat_id + i, body['text']))
+        return web.json_response({'queued': count})
+
+    async def fake_messages(request: web.Request) -> web.Response:
+        return web.json_response(api.messages)
+
+    async def fake_stats(request: web.Request) -> web.Response:
+        return web.json_response({
+            'updates': api.updates_created,
+            'webhook': api.webhook_url,
+            'delivered': api.delivered,
+            'delivery_errors': api.delivery_errors,
+            'pending': api.updates.qsize(),
+            'messages': len(api.messages),
+        })
+
+    app = web.Application()
+    app['api'] = api
+    app.on_startup.append(api.start)
+    app.on_cleanup.append(api.stop)
+    app.router.add_route('*', '/bot{token}/{method}', call_method)
+    app.router.add_post('/fake/send', fake_send)
+    app.router.add_get('/fake/messages', fake_messages)
+    app.router.add_get('/fake/stats', fake_stats)
+    return app
+
+
+async def burst(url: str, text: str, count: int, wait: float):
+    """Отправляет count вопросов из разных чатов и ждет ответы"""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{url}/fake/stats") as response:
+            before = (await response.json())['messages']
+        started = time.perf_counter()
+        async with session.post(f"{url}/fake/send", json={'text': text, 'count': count}) as response:
+            response.raise_for_status()
+        deadline = started + wait
+        answered = 0
+        while time.perf_counter() < deadline:
+            async with session.get(f"{url}/fake/stats") as response:
+                answered = (await response.json())['messages'] - before
+            if answered >= count:
+                break
+            await asyncio.sleep(0.1)
+        elapsed = time.perf_counter() - started
+        print(json.dumps({
+            'sent': count,
+            'answered': answered,
+            'elapsed_s': round(elapsed, 3),
+            'answers_per_second': round(answered / elapsed, 2),
+        }, ensure_ascii=False))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Поддельный Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--burst", type=int, help="Не запускать сервер, а отправить N вопросов уже запущенному")
+    parser.add_argument("--text", default="Сколько всего видео есть в системе?")
+    parser.add_argument("--wait", type=float, default=60, help="Сколько ждать ответы в режиме --burst")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.burst:
+        asyncio.run(burst(f"http://{args.host}:{args.port}", args.text, args.burst, args.wait))
+    else:
+        web.run_app(create_app(), host=args.host, port=args.port)
@@ -0,0 +1,237 @@
+"""
+Генератор синтетических данных о видео и почасовых замерах статистики
+
+Пишет файл того же вида, что читает scripts/load_data.py: массив видео,
+объект {"videos": [...]} или NDJSON, при расширении .gz - со сжатием gzip.
+Видео генерируются и записываются по одному, поэтому размер файла не
+ограничен объемом памяти. При одинаковых параметрах и --seed результат
+побайтно совпадает.
+
+Модель данных:
+- креаторы выбираются по закону Ципфа: немногие креаторы публикуют большую часть видео;
+- у каждого видео своя "популярность" (логнормальная), прирост просмотров
+  затухает с возрастом видео и колеблется в течение суток;
+- лайки, комментарии и жалобы растут пропорционально просмотрам с индивидуальными долями;
+- изредка прирост отрицательный (списание накрученных просмотров, снятые лайки),
+  но счетчики не уходят ниже нуля;
+- итоговые счетчики видео равны счетчикам последнего замера, а delta_* каждого
+  замера - разнице с предыдущим.
+
+    python scripts/generate_data.py data/synthetic.ndjson.gz --videos 1000000 --hours 720
+"""
+import argparse
+import bisect
+import gzip
+import io
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Iterator, TextIO
+from src.ingest.reader import NDJSON_EXTENSIONS
+
+METRICS = ('views', 'likes', 'comments', 'reports')
+OUTPUT_FORMATS = ('auto', 'array', 'object', 'ndjson')
+
+
+def _hex_id(rng: random.Random) -> str:
+    return f"{rng.getrandbits(128):032x}"
+
+
+def _ts(value: datetime) -> str:
+    return value.isoformat() + '+00:00'
+
+
+def _poisson(rng: random.Random, lam: float) -> int:
+    """Пуассоновская величина; при большом lam - нормальное приближение"""
+    if lam <= 0:
+        return 0
+    if lam > 30:
+        return max(0, round(rng.gauss(lam, math.sqrt(lam))))
+    limit = math.exp(-lam)
+    k, p = 0, rng.random()
+    while p > limit:
+        k += 1
+        p *= rng.random()
+    return k
+
+
+class ZipfSampler:
+    """Выбор индекса 0..n-1 с вероятностью, пропорциональной 1 / (i + 1) ** s"""
+
+    def __init__(self, n: int, s: float):
+        self._cumulative = list(itertools.accumulate(1 / (i + 1) ** s for i in range(n)))
+
+    def sample(self, rng: random.Random) -> int:
+        return bisect.bisect_left(self._cumulative, rng.random() * self._cumulative[-1])
+
+
+class VideoGenerator:
+    """Последовательность видео с замерами; все случайные величины - из одного seed"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.window_start = args.start
+        self.window_end = args.start + timedelta(hours=args.hours)
+        self.publish_start = args.start - timedelta(days=args.publish_before_days)
+        self.creators = [_hex_id(self.rng) for _ in range(args.creators)]
+        self.creator_sampler = ZipfSampler(args.creators, args.zipf)
+
+    def _views_rate(self, popularity: float, age_hours: float, hour_of_day: int) -> float:
+        """Ожидаемый прирост просмотров за час: затухание с возрастом и суточный цикл"""
+        decay = (age_hours + 6) ** -1.2
+        daily = 1 + 0.6 * math.sin((hour_of_day - 9) / 24 * 2 * math.pi)
+        return popularity * decay * daily
+
+    def _delta(self, rng: random.Random, current: int, expected: float) -> int:
+        delta = _poisson(rng, expected)
+        if rng.random() < self.args.negative_rate and current > 0:
+            # Отрицательная поправка: не больше накопленного значения
+            delta = -rng.randint(1, max(1, min(current, int(expected) + 10)))
+        return delta
+
+    def video(self) -> dict:
+        rng = self.rng
+        args = self.args
+        video_id = _hex_id(rng)
+        span = (self.window_end - self.publish_start).total_seconds()
+        published = self.publish_start + timedelta(seconds=rng.random() * span)
+        published = published.replace(microsecond=0)
+        popularity = rng.lognormvariate(args.popularity_mu, args.popularity_sigma)
+        shares = {
+            'views': 1.0,
+            'likes': rng.uniform(0.01, 0.08),
+            'comments': rng.uniform(0.0005, 0.005),
+            'reports': rng.uniform(0.0, 0.0003),
+        }
+
+        # Замеры раз в час со своим сдвигом в пределах первых минут часа
+        offset = timedelta(seconds=rng.randint(0, 299))
+        first_hour = max(self.window_start, published.replace(minute=0, second=0) + timedelta(hours=1))
+        counters = dict.fromkeys(METRICS, 0)
+        if published < self.window_start:
+            # Видео вышло до окна замеров: накопленные к началу окна значения
+            age = (self.window_start - published).total_seconds() / 3600
+            accumulated = popularity * ((age + 6) ** -0.2 - 6 ** -0.2) / -0.2
+            for metric in METRICS:
+                counters[metric] = _poisson(rng, accumulated * shares[metric])
+
+        snapshots = []
+        moment = first_hour
+        while moment < self.window_end:
+            created_at = moment + offset
+            age = (created_at - published).total_seconds() / 3600
+            views_rate = self._views_rate(popularity, age, moment.hour)
+            snapshot = {'id': _hex_id(rng), 'video_id': video_id}
+            deltas = {}
+            for metric in METRICS:
+                deltas[metric] = self._delta(rng, counters[metric], views_rate * shares[metric])
+                counters[metric] += deltas[metric]
+                snapshot[f'{metric}_count'] = counters[metric]
+            for metric in METRICS:
+                snapshot[f'delta_{metric}_count'] = deltas[metric]
+            snapshot['created_at'] = _ts(created_at)
+            snapshot['updated_at'] = _ts(created_at)
+            snapshots.append(snapshot)
+            moment += timedelta(hours=1)
+
+        updated_at = snapshots[-1]['created_at'] if snapshots else _ts(published)
+        return {
+            'id': video_id,
+            'creator_id': self.creators[self.creator_sampler.sample(rng)],
+            'video_created_at': _ts(published),
+            **{f'{metric}_count': counters[metric] for metric in METRICS},
+            'created_at': _ts(published),
+            'updated_at': updated_at,
+            'snapshots': snapshots,
+        }
+
+    def __iter__(self) -> Iterator[dict]:
+        for _ in range(self.args.videos):
+            yield self.video()
+
+
+def open_output(path: str, compresslevel: int) -> TextIO:
+    """Файл для записи; .gz - со сжатием gzip (без времени в заголовке, для повторяемости)"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.GzipFile(path, 'wb', compresslevel=compresslevel, mtime=0), encoding='utf-8')
+    return open(path, 'w', encoding='utf-8')
+
+
+def output_format(path: str, fmt: str) -> str:
+    if fmt != 'auto':
+        return fmt
+    name = path[:-3] if path.endswith('.gz') else path
+    return 'ndjson' if os.path.splitext(name)[1].lower() in NDJSON_EXTENSIONS else 'array'
+
+
+def write_videos(f: TextIO, videos: Iterator[dict], fmt: str, progress_every: int) -> tuple[int, int]:
+    """Пишет видео потоково; возвращает (видео, замеры)"""
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    videos_written = snapshots_written = 0
+    started = time.perf_counter()
+    if fmt == 'object':
+        f.write('{"videos":[\n')
+    elif fmt == 'array':
+        f.write('[\n')
+    for video in videos:
+        if fmt != 'ndjson' and videos_written:
+            f.write(',\n')
+        f.write(dumps(video))
+        if fmt == 'ndjson':
+            f.write('\n')
+        videos_written += 1
+        snapshots_written += len(video['snapshots'])
+        if progress_every and videos_written % progress_every == 0:
+            elapsed = time.perf_counter() - started
+            print(f"Видео: {videos_written}, замеров: {snapshots_written} "
+                  f"({snapshots_written / elapsed:.0f} замеров/с)", file=sys.stderr)
+    if fmt == 'object':
+        f.write('\n]}\n')
+    elif fmt == 'array':
+        f.write('\n]\n')
+    return videos_written, snapshots_written
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Генерация синтетических данных для load_data.py")
+    parser.add_argument("output", help="Файл результата (.json, .ndjson/.jsonl, опционально .gz)")
+    parser.add_argument("--videos", type=int, default=10000, help="Число видео")
+    parser.add_argument("--creators", type=int, default=1000, help="Число креаторов")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Показатель распределения видео по креаторам")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=datetime(2025, 11, 1),
+                        help="Начало окна почасовых замеров (по умолчанию 2025-11-01)")
+    parser.add_argument("--hours", type=int, default=24 * 30, help="Длина окна замеров в часах")
+    parser.add_argument("--publish-before-days", type=int, default=60,
+                        help="За сколько дней до окна замеров могли выйти видео")
+    parser.add_argument("--popularity-mu", type=float, default=7.0, help="Параметр mu логнормальной популярности")
+    parser.add_argument("--popularity-sigma", type=float, default=1.5, help="Параметр sigma логнормальной популярности")
+    parser.add_argument("--negative-rate", type=float, default=0.002,
+                        help="Доля замеров с отрицательным приростом (по каждой метрике)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="auto",
+                        help="Формат файла (auto: NDJSON по расширению, иначе массив)")
+    parser.add_argument("--compresslevel", type=int, default=6, help="Уровень сжатия gzip")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--progress-every", type=int, default=10000, help="Печатать прогресс каждые N видео")
+    return parser.parse_args()
+
+
+def main():
+    """Основная функция"""
+    args = parse_args()
+    fmt = output_format(args.output, args.format)
+    started = time.perf_counter()
+    with open_output(args.output, args.compresslevel) as f:
+        videos, snapshots = write_videos(f, iter(VideoGenerator(args)), fmt, args.progress_every)
+    elapsed = time.perf_counter() - started
+    print(f"Записано видео: {videos}, замеров: {snapshots} в {args.output} ({fmt}) за {elapsed:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
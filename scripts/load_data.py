@@ -1,121 +1,269 @@
 """
 Скрипт для загрузки JSON данных в базу данных
+
+Файл читается потоково (по одному видео за раз), поэтому потребление памяти
+не зависит от его размера. Поддерживаются массив видео, объект с ключом
+'videos' и NDJSON, в том числе сжатые gzip. После каждого коммита прогресс
+сохраняется в контрольную точку, и прерванную загрузку можно продолжить с --resume.
+
+Режим --mode copy загружает данные через бинарный COPY с разбором записей
+в пуле процессов; итоговая скорость (строк/с) печатается для всех режимов.
+Режим --mode incremental повторно запускается на существующей базе: видео
+обновляются только при изменении счетчиков, вставляются только новые снапшоты.
+В конце пересчитываются почасовые и дневные агрегаты за затронутые дни (и дни
+прерванных загрузок); до пересчета бот не перенаправляет запросы в агрегаты.
+Недостающие партиции video_snapshots создаются автоматически перед записью.
 """
+import argparse
 import asyncio
-import json
 import os
-from datetime import datetime
+import time
+from itertools import islice
+from typing import Optional
+import asyncpg
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.db.database import async_session_maker, init_db
+from src.db.database import async_session_maker, engine, init_db, bump_data_generation
 from src.db.models import Video, VideoSnapshot
+from src.db.partitions import PartitionManager
+from src.ingest.checkpoint import LoadCheckpoint
+from src.ingest.bulk import LoadStats, asyncpg_dsn, bulk_load
+from src.ingest.incremental import IncrementalWriter
+from src.ingest.reader import FORMATS, iter_videos
+from src.ingest.records import (
+    SNAPSHOT_COLUMNS,
+    VIDEO_COLUMNS,
+    snapshot_records,
+    snapshot_time_bounds,
+    video_record,
+)
+from src.ingest.rollups import TimeBounds, refresh_rollups
 
 
-def parse_datetime(dt_str: str) -> datetime:
-    """Парсит строку даты в datetime объект (без timezone)"""
-    try:
-        dt = datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
-        # Убираем timezone для PostgreSQL TIMESTAMP WITHOUT TIME ZONE
-        if dt.tzinfo is not None:
-            dt = dt.replace(tzinfo=None)
-        return dt
-    except:
-        dt = datetime.fromisoformat(dt_str)
-        if dt.tzinfo is not None:
-            dt = dt.replace(tzinfo=None)
-        return dt
+def build_objects(video_data: dict) -> tuple[Video, list[VideoSnapshot], tuple]:
+    """Создает ORM объекты видео и его снапшотов (и границы времени замеров)"""
+    video = Video(**dict(zip(VIDEO_COLUMNS, video_record(video_data))))
+    records = snapshot_records(video_data)
+    snapshots = [VideoSnapshot(**dict(zip(SNAPSHOT_COLUMNS, record))) for record in records]
+    return video, snapshots, snapshot_time_bounds(records)
 
 
-async def load_videos_data(session: AsyncSession, json_file: str):
-    """Загружает данные из JSON файла в базу данных"""
+async def load_videos_data(
+    session: AsyncSession,
+    json_file: str,
+    fmt: str = 'auto',
+    batch_size: int = 100,
+    checkpoint: Optional[LoadCheckpoint] = None,
+    resume: bool = False,
+) -> LoadStats:
+    """Потоково загружает данные из JSON файла в базу данных через ORM"""
     print(f"Загрузка данных из {json_file}...")
-    
-    with open(json_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    # Поддержка разных форматов: массив напрямую или объект с ключом 'videos'
-    if isinstance(data, list):
-        videos_data = data
-    else:
-        videos_data = data.get('videos', [])
-    total_videos = len(videos_data)
-    print(f"Найдено видео: {total_videos}")
-    
+    started = time.perf_counter()
+
+    skip = checkpoint.load() if checkpoint is not None and resume else 0
+    # Пачки до контрольной точки, которые не закоммитились в прошлый раз, загружаются заново
+    retry = checkpoint.load_failed() if checkpoint is not None and resume else []
+    if skip:
+        print(f"Продолжение с контрольной точки: пропускаем {skip} уже загруженных видео")
+    if retry:
+        print(f"Повтор пачек, не закоммиченных в прошлый раз: {sum(end - start for start, end in retry)} видео")
+
     videos_created = 0
     snapshots_created = 0
-    
-    for idx, video_data in enumerate(videos_data, 1):
+    failed_videos = 0
+    batch_videos = 0
+    batch_snapshots = 0
+    # Номер видео файла, следующего за последним прочитанным
+    position = skip
+    # Номера видео текущей пачки и интервалы номеров пачек, которые не удалось закоммитить
+    batch_indices: list[int] = []
+    failed_ranges: list[tuple[int, int]] = []
+    time_bounds = TimeBounds()
+    batch_bounds = TimeBounds()
+    partitions = PartitionManager()
+
+    async def execute_ddl(sql: str):
+        # Отдельная транзакция: откат пачки не должен откатывать созданную партицию
+        async with engine.begin() as conn:
+            await conn.execute(text(sql))
+
+    def save_checkpoint():
+        # Еще не пройденные повторы остаются в контрольной точке вместе с новыми неудачами
+        pending = [(max(start, position), end) for start, end in retry if end > position]
+        checkpoint.save(max(position, skip), failed=sorted(failed_ranges + pending))
+
+    async def commit_batch():
+        nonlocal videos_created, snapshots_created, failed_videos, batch_videos, batch_snapshots
+        nonlocal batch_indices, batch_bounds
         try:
-            # Создаем видео
-            video = Video(
-                id=video_data['id'],
-                creator_id=video_data['creator_id'],
-                video_created_at=parse_datetime(video_data['video_created_at']),
-                views_count=video_data.get('views_count', 0),
-                likes_count=video_data.get('likes_count', 0),
-                comments_count=video_data.get('comments_count', 0),
-                reports_count=video_data.get('reports_count', 0),
-                created_at=parse_datetime(video_data.get('created_at', video_data['video_created_at'])),
-                updated_at=parse_datetime(video_data.get('updated_at', video_data['video_created_at']))
-            )
-            session.add(video)
-            videos_created += 1
-            
-            # Создаем снапшоты
-            snapshots = video_data.get('snapshots', [])
-            for snapshot_data in snapshots:
-                snapshot = VideoSnapshot(
-                    id=snapshot_data['id'],
-                    video_id=video_data['id'],
-                    views_count=snapshot_data.get('views_count', 0),
-                    likes_count=snapshot_data.get('likes_count', 0),
-                    comments_count=snapshot_data.get('comments_count', 0),
-                    reports_count=snapshot_data.get('reports_count', 0),
-                    delta_views_count=snapshot_data.get('delta_views_count', 0),
-                    delta_likes_count=snapshot_data.get('delta_likes_count', 0),
-                    delta_comments_count=snapshot_data.get('delta_comments_count', 0),
-                    delta_reports_count=snapshot_data.get('delta_reports_count', 0),
-                    created_at=parse_datetime(snapshot_data['created_at']),
-                    updated_at=parse_datetime(snapshot_data.get('updated_at', snapshot_data['created_at']))
-                )
-                session.add(snapshot)
-                snapshots_created += 1
-            
-            if idx % 100 == 0:
-                await session.commit()
-                print(f"Обработано {idx}/{total_videos} видео...")
-                
+            # До первого запроса в сессии: он вызовет flush снапшотов в родительскую таблицу
+            await partitions.ensure(execute_ddl, batch_bounds.start, batch_bounds.end)
+            # Новое поколение данных сбрасывает кэш результатов бота, агрегаты за дни пачки устаревают
+            await bump_data_generation(session, batch_bounds.start, batch_bounds.end)
+            await session.commit()
+            videos_created += batch_videos
+            snapshots_created += batch_snapshots
         except Exception as e:
-            print(f"Ошибка при обработке видео {video_data.get('id', 'unknown')}: {e}")
+            print(f"Ошибка при коммите пачки из {batch_videos} видео: {e}")
             await session.rollback()
+            failed_videos += batch_videos
+            # Контрольная точка идет дальше, а пачка запоминается для повтора с --resume
+            for index in batch_indices:
+                if failed_ranges and failed_ranges[-1][1] == index:
+                    failed_ranges[-1] = (failed_ranges[-1][0], index + 1)
+                else:
+                    failed_ranges.append((index, index + 1))
+        # Освобождаем объекты пачки, чтобы память не росла с размером файла
+        session.expunge_all()
+        batch_videos = 0
+        batch_snapshots = 0
+        batch_indices = []
+        batch_bounds = TimeBounds()
+        if checkpoint is not None:
+            save_checkpoint()
+
+    # С повторами файл читается с начала, уже загруженные видео до контрольной точки пропускаются
+    first = position = min([skip] + [start for start, _ in retry])
+    for index, video_data in enumerate(islice(iter_videos(json_file, fmt), first, None), start=first):
+        position = index + 1
+        if index < skip and not any(start <= index < end for start, end in retry):
+            continue
+        try:
+            video, snapshots, bounds = build_objects(video_data)
+        except Exception as e:
+            print(f"Ошибка при обработке видео {video_data.get('id', 'unknown')}: {e}")
+            failed_videos += 1
             continue
-    
+
+        session.add(video)
+        session.add_all(snapshots)
+        batch_videos += 1
+        batch_snapshots += len(snapshots)
+        batch_indices.append(index)
+        time_bounds.update(*bounds)
+        batch_bounds.update(*bounds)
+
+        if batch_videos >= batch_size:
+            await commit_batch()
+            print(f"Обработано {index + 1} видео...")
+
     # Финальный коммит
-    await session.commit()
-    print(f"\nЗагрузка завершена!")
-    print(f"Видео создано: {videos_created}")
-    print(f"Снапшотов создано: {snapshots_created}")
+    await commit_batch()
+    if checkpoint is not None:
+        if failed_ranges:
+            print(f"Не закоммичено пачек на {sum(end - start for start, end in failed_ranges)} видео, "
+                  "их можно повторить с --resume")
+        else:
+            checkpoint.clear()
+
+    return LoadStats(
+        videos=videos_created,
+        snapshots=snapshots_created,
+        failed=failed_videos,
+        elapsed=time.perf_counter() - started,
+        time_bounds=time_bounds,
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Загрузка JSON данных о видео в базу данных")
+    parser.add_argument(
+        "json_file", nargs="?",
+        default=os.getenv("JSON_FILE", "data/videos_data.json"),
+        help="Путь к файлу (.json, .ndjson/.jsonl, опционально .gz)",
+    )
+    parser.add_argument("--format", choices=FORMATS, default="auto", help="Формат файла")
+    parser.add_argument(
+        "--mode", choices=("orm", "copy", "incremental"), default="orm",
+        help=(
+            "orm - построчная вставка через SQLAlchemy, copy - массовая загрузка через COPY, "
+            "incremental - идемпотентная догрузка (upsert видео, только новые снапшоты)"
+        ),
+    )
+    parser.add_argument("--batch-size", type=int, default=100, help="Сколько видео коммитить за раз")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Процессы разбора (copy/incremental)")
+    parser.add_argument("--queue-size", type=int, help="Максимум пачек в очереди к писателю (copy/incremental)")
+    parser.add_argument(
+        "--drop-indexes", action="store_true",
+        help="Удалить вторичные индексы на время загрузки и пересоздать после (режим copy)",
+    )
+    parser.add_argument("--checkpoint", help="Файл контрольной точки (по умолчанию <json_file>.checkpoint)")
+    parser.add_argument("--resume", action="store_true", help="Продолжить прерванную загрузку")
+    parser.add_argument(
+        "--skip-rollups", action="store_true",
+        help="Не пересчитывать почасовые/дневные агрегаты (бот не использует их до следующего пересчета)",
+    )
+    return parser.parse_args()
 
 
 async def main():
     """Основная функция"""
-    json_file = os.getenv("JSON_FILE", "data/videos_data.json")
-    
+    args = parse_args()
+    json_file = args.json_file
+
     if not os.path.exists(json_file):
         print(f"Файл {json_file} не найден!")
         print("Сначала запустите scripts/download_data.py для скачивания данных")
         return
-    
+
     # Инициализация БД
     await init_db()
     print("База данных инициализирована")
-    
+
+    checkpoint = LoadCheckpoint(args.checkpoint or f"{json_file}.checkpoint", json_file)
+
     # Загрузка данных
-    async with async_session_maker() as session:
-        await load_videos_data(session, json_file)
-    
+    if args.mode == "copy":
+        stats = await bulk_load(
+            json_file,
+            fmt=args.format,
+            chunk_size=args.batch_size,
+            workers=args.workers,
+            queue_size=args.queue_size,
+            drop_indexes=args.drop_indexes,
+            checkpoint=checkpoint,
+            resume=args.resume,
+        )
+    elif args.mode == "incremental":
+        if args.drop_indexes:
+            print("--drop-indexes игнорируется в режиме incremental: индексы нужны для поиска конфликтов")
+        writer = IncrementalWriter()
+        stats = await bulk_load(
+            json_file,
+            fmt=args.format,
+            chunk_size=args.batch_size,
+            workers=args.workers,
+            queue_size=args.queue_size,
+            checkpoint=checkpoint,
+            resume=args.resume,
+            writer=writer,
+        )
+        print(f"Видео в файле: {writer.videos_seen}, уже загруженных снапшотов пропущено: {writer.snapshots_skipped}")
+    else:
+        async with async_session_maker() as session:
+            stats = await load_videos_data(
+                session,
+                json_file,
+                fmt=args.format,
+                batch_size=args.batch_size,
+                checkpoint=checkpoint,
+                resume=args.resume,
+            )
+
+    print(f"\nЗагрузка завершена!")
+    print(stats.report(args.mode))
+
+    # Пересчитываются и дни прежних прерванных загрузок, отмеченные устаревшими
+    if not args.skip_rollups:
+        conn = await asyncpg.connect(asyncpg_dsn())
+        try:
+            days = await refresh_rollups(conn, stats.time_bounds.days())
+        finally:
+            await conn.close()
+        if days:
+            print(f"Агрегаты пересчитаны за {days[0]} - {days[1]}")
     print("Готово!")
 
 
 if __name__ == "__main__":
     asyncio.run(main())
-
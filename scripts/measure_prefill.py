@@ -0,0 +1,108 @@
+"""
+Замер времени prefill промпта в Ollama
+
+Сравнивает два способа построения промпта на одинаковых вопросах:
+- legacy: схема и примеры, затем вопрос, затем правила - одной строкой prompt
+  (общий префикс обрывается на вопросе, правила пересчитываются каждый раз);
+- system: побайтно одинаковый SYSTEM_PROMPT и короткая пользовательская часть.
+
+Для каждого запроса генерируется один токен, из ответа Ollama берутся
+prompt_eval_count/prompt_eval_duration. Дополнительно измеряется первый
+запрос после выгрузки модели (холодный старт) с прогревом и без.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from src.config import OLLAMA_MODEL
+from src.llm.client import close_llm_client, get_llm_client
+from src.llm.prompts import EXAMPLES, GUIDANCE, RULES, SCHEMA_DESCRIPTION, SYSTEM_PROMPT, get_sql_generation_prompt
+from src.llm.sql_generator import warm_up_llm
+
+QUESTIONS = [
+    "Сколько всего видео есть в системе?",
+    "Сколько видео у креатора с id 'aca1061a9d324ecf8c3fa2bb32d7be63' набрали больше 10000 просмотров?",
+    "На сколько просмотров в сумме выросли все видео 28 ноября 2025?",
+    "Сколько разных видео получали новые лайки 27 ноября 2025?",
+    "Какое суммарное количество просмотров набрали все видео, опубликованные в июне 2025 года?",
+    "Сколько замеров, в которых число комментариев за час оказалось отрицательным?",
+]
+
+
+def legacy_payload(question: str) -> dict:
+    """Прежняя раскладка: вопрос посередине одной строки prompt"""
+    prompt = (
+        f"{SCHEMA_DESCRIPTION}\n\n{EXAMPLES}{GUIDANCE}\n"
+        f"Запрос пользователя на русском языке: \"{question}\"\n{RULES}\nSQL запрос:\n"
+    )
+    return {"model": OLLAMA_MODEL, "prompt": prompt}
+
+
+def system_payload(question: str) -> dict:
+    return {"model": OLLAMA_MODEL, "system": SYSTEM_PROMPT, "prompt": get_sql_generation_prompt(question)}
+
+
+async def generate_one_token(payload: dict, keep_alive: str) -> dict:
+    started = time.perf_counter()
+    data = await get_llm_client().generate({
+        **payload,
+        "stream": False,
+        "keep_alive": keep_alive,
+        "options": {"temperature": 0.1, "num_predict": 1},
+    })
+    data["wall"] = time.perf_counter() - started
+    return data
+
+
+async def unload_model():
+    """Выгружает модель из памяти Ollama"""
+    await get_llm_client().generate({"model": OLLAMA_MODEL, "keep_alive": 0})
+
+
+def summarize(name: str, results: list[dict]):
+    prefill = [r.get("prompt_eval_duration", 0) / 1e6 for r in results]
+    tokens = [r.get("prompt_eval_count", 0) for r in results]
+    wall = [r["wall"] * 1000 for r in results]
+    print(
+        f"{name:8s} prefill медиана {statistics.median(prefill):8.1f} мс, "
+        f"токенов {statistics.median(tokens):6.0f}, время ответа {statistics.median(wall):8.1f} мс"
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Замер prefill промпта в Ollama")
+    parser.add_argument("--rounds", type=int, default=3, help="Сколько раз пройти по списку вопросов")
+    parser.add_argument("--keep-alive", default="30m", help="keep_alive для запросов замера")
+    parser.add_argument("--skip-cold", action="store_true", help="Не замерять холодный старт (не выгружать модель)")
+    return parser.parse_args()
+
+
+async def main():
+    """Основная функция"""
+    args = parse_args()
+    try:
+        if not args.skip_cold:
+            await unload_model()
+            cold = await generate_one_token(system_payload(QUESTIONS[0]), args.keep_alive)
+            print(f"Первый запрос после выгрузки без прогрева: {cold['wall']:.2f} с "
+                  f"(загрузка {cold.get('load_duration', 0) / 1e9:.2f} с)")
+
+            await unload_model()
+            await warm_up_llm()
+            warm = await generate_one_token(system_payload(QUESTIONS[1]), args.keep_alive)
+            print(f"Первый запрос после выгрузки с прогревом:  {warm['wall']:.2f} с\n")
+
+        for name, build in (("legacy", legacy_payload), ("system", system_payload)):
+            # Первый запрос раскладки заполняет кэш префикса и в статистику не входит
+            await generate_one_token(build(QUESTIONS[-1]), args.keep_alive)
+            results = []
+            for _ in range(args.rounds):
+                for question in QUESTIONS:
+                    results.append(await generate_one_token(build(question), args.keep_alive))
+            summarize(name, results)
+    finally:
+        await close_llm_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
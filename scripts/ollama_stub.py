@@ -0,0 +1,153 @@
+"""
+Локальная заглушка Ollama /api/generate для бенчмарков без сети и модели
+
+На вопрос из промпта заглушка отвечает SQL ближайшего примера из банка
+(src/llm/examples.json), за которым следует пояснение, как это делает
+настоящая модель. Задержки настраиваются: prefill (перед первым токеном)
+и пауза между токенами. Поддерживаются "stream": true (NDJSON по токенам,
+генерация прекращается при закрытии соединения клиентом) и "stream": false.
+
+Для каскада моделей у отдельных моделей можно задать свои задержки и долю
+вопросов, на которые модель отвечает без SQL (один и тот же вопрос одна и та
+же модель всегда проваливает или всегда решает).
+
+Запуск отдельно:
+    python scripts/ollama_stub.py --port 11500 --prefill-ms 300 --token-ms 20
+    python scripts/ollama_stub.py --model small=80:5:0.3 --model big=300:20:0
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+import zlib
+from aiohttp import web
+from src.llm.examples import ExampleIndex, load_examples
+
+_QUESTION_RE = re.compile(r'Запрос пользователя на русском языке: "(.*)"')
+_EXPLANATION = (
+    "\nПояснение: запрос выбирает нужные строки по условиям из вопроса и "
+    "агрегирует их, чтобы получить одно число в ответе."
+)
+_NO_SQL = "Не уверен, как ответить на этот вопрос по имеющимся таблицам."
+
+
+def split_tokens(text: str, chars_per_token: int) -> list[str]:
+    return [text[i:i + chars_per_token] for i in range(0, len(text), chars_per_token)]
+
+
+def parse_model(value: str) -> tuple[str, tuple[float, float, float]]:
+    """'имя=prefill_ms:token_ms:доля_отказов' -> (имя, (prefill_ms, token_ms, доля_отказов))"""
+    name, _, profile = value.partition('=')
+    prefill_ms, token_ms, fail_rate = (float(part) for part in profile.split(':'))
+    return name, (prefill_ms, token_ms, fail_rate)
+
+
+def create_app(
+    prefill_ms: float = 200,
+    token_ms: float = 15,
+    chars_per_token: int = 4,
+    models: dict[str, tuple[float, float, float]] = None,
+) -> web.Application:
+    """
+    Приложение aiohttp с маршрутом POST /api/generate
+
+    Args:
+        prefill_ms: Задержка до первого токена
+        token_ms: Задержка между токенами
+        chars_per_token: Сколько символов ответа в одном токене
+        models: Модель -> (prefill_ms, token_ms, доля вопросов без SQL); остальные модели
+            отвечают с общими задержками и всегда с SQL
+    """
+    index = ExampleIndex(load_examples())
+    models = models or {}
+    stats = {'requests': 0, 'tokens_sent': 0, 'cancelled': 0, 'no_sql': 0}
+
+    def answer(prompt: str, model: str, fail_rate: float) -> str:
+        m = _QUESTION_RE.search(prompt)
+        question = m.group(1) if m else prompt
+        if fail_rate and zlib.crc32(f"{model}:{question}".encode()) % 1000 < fail_rate * 1000:
+            stats['no_sql'] += 1
+            return _NO_SQL
+        example = index.top_k(question, 1)[0]
+        return f"```sql\n{example.sql};\n```{_EXPLANATION}"
+
+    async def generate(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        stats['requests'] += 1
+        if not body.get('prompt'):
+            # Запрос без промпта (загрузка/выгрузка модели)
+            return web.json_response({'model': body.get('model'), 'response': '', 'done': True})
+
+        started = time.perf_counter_ns()
+        prefill, per_token, fail_rate = models.get(body.get('model'), (prefill_ms, token_ms, 0.0))
+        prompt_tokens = (len(body.get('system', '')) + len(body['prompt'])) // chars_per_token
+        tokens = split_tokens(answer(body['prompt'], body.get('model'), fail_rate), chars_per_token)
+        options = body.get('options') or {}
+        if options.get('num_predict', 0) > 0:
+            tokens = tokens[:options['num_predict']]
+
+        await asyncio.sleep(prefill / 1000)
+        prefill_done = time.perf_counter_ns()
+        final = {
+            'model': body.get('model'),
+            'done': True,
+            'prompt_eval_count': prompt_tokens,
+            'prompt_eval_duration': prefill_done - started,
+            'load_duration': 0,
+        }
+
+        if not body.get('stream', True):
+            await asyncio.sleep(per_token * len(tokens) / 1000)
+            stats['tokens_sent'] += len(tokens)
+            final.update(response=''.join(tokens), eval_count=len(tokens),
+                         total_duration=time.perf_counter_ns() - started)
+            return web.json_response(final)
+
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        sent = 0
+        try:
+            for token in tokens:
+                await response.write(json.dumps({'response': token, 'done': False}).encode() + b'\n')
+                sent += 1
+                await asyncio.sleep(per_token / 1000)
+            final.update(response='', eval_count=sent, total_duration=time.perf_counter_ns() - started)
+            await response.write(json.dumps(final).encode() + b'\n')
+            await response.write_eof()
+        except ConnectionResetError:
+            # Клиент закрыл соединение (ранняя остановка) - генерация прекращается
+            stats['cancelled'] += 1
+        finally:
+            stats['tokens_sent'] += sent
+        return response
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response(stats)
+
+    app = web.Application()
+    app['stats'] = stats
+    app.router.add_post('/api/generate', generate)
+    app.router.add_get('/stats', get_stats)
+    return app
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Заглушка Ollama /api/generate")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--prefill-ms", type=float, default=200, help="Задержка до первого токена")
+    parser.add_argument("--token-ms", type=float, default=15, help="Задержка между токенами")
+    parser.add_argument("--chars-per-token", type=int, default=4)
+    parser.add_argument("--model", action="append", type=parse_model, default=[],
+                        help="Свои задержки модели: имя=prefill_ms:token_ms:доля_отказов (можно несколько)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    web.run_app(
+        create_app(args.prefill_ms, args.token_ms, args.chars_per_token, dict(args.model)),
+        host=args.host,
+        port=args.port,
+    )
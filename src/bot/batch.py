@@ -0,0 +1,173 @@
+"""
+Пакетная обработка вопросов и локальный HTTP адрес для нее
+
+answer_batch прогоняет список вопросов через тот же конвейер, что и бот
+(src/bot/pipeline.py): общие кэши, пул соединений с БД и объединение
+одинаковых запросов. Одинаковые вопросы пакета (с точностью до question_key)
+обрабатываются один раз. Одновременно обрабатывается не больше concurrency
+вопросов, а для планировщика весь пакет - один клиент, поэтому пакет не
+вытесняет вопросы из Telegram. Результаты отдаются по мере готовности.
+
+POST /batch принимает {"questions": [...], "concurrency": N}, JSON список
+или текст (вопрос на строку) и отвечает потоком NDJSON: строка на каждый
+вопрос пакета и итоговая строка {"done": true, ...}.
+"""
+import asyncio
+import hmac
+import itertools
+import json
+import logging
+import time
+from contextlib import aclosing
+from typing import AsyncIterator, Optional
+from aiohttp import web
+from src.config import (
+    BATCH_API_TOKEN,
+    BATCH_CONCURRENCY,
+    BATCH_MAX_QUESTIONS,
+    SCHEDULER_MAX_PENDING_PER_CHAT,
+)
+from src.bot.pipeline import answer_question
+from src.bot.singleflight import question_key
+
+logger = logging.getLogger(__name__)
+
+# id чатов Telegram укладываются в 52 бита, клиенты пакетов берут id за этим диапазоном
+BATCH_CLIENT_BASE = -(1 << 53)
+_batch_ids = itertools.count(1)
+
+
+def group_questions(questions: list[str]) -> dict[str, list[int]]:
+    """Номера вопросов пакета по ключу вопроса (в порядке первого появления)"""
+    groups: dict[str, list[int]] = {}
+    for index, question in enumerate(questions):
+        groups.setdefault(question_key(question), []).append(index)
+    return groups
+
+
+async def answer_batch(questions: list[str], concurrency: int = BATCH_CONCURRENCY) -> AsyncIterator[dict]:
+    """
+    Отвечает на вопросы пакета и отдает результаты по мере готовности
+
+    Yields:
+        {"index", "question", "outcome", "answer", "sql", "total_ms", "duplicate"} на каждый вопрос;
+        duplicate - ответ взят у такого же вопроса пакета
+    """
+    batch_id = next(_batch_ids)
+    client_id = BATCH_CLIENT_BASE - batch_id
+    # Больше задач одного клиента планировщик не примет в очередь этапа
+    concurrency = max(1, min(concurrency, SCHEDULER_MAX_PENDING_PER_CHAT))
+    groups = group_questions(questions)
+    pending = iter(groups.values())
+    done: asyncio.Queue = asyncio.Queue()
+
+    async def worker():
+        for indices in pending:
+            question = questions[indices[0]].strip()
+            if not question:
+                await done.put((indices, None))
+                continue
+            await done.put((indices, await answer_question(client_id, question, batch_id=batch_id)))
+
+    logger.info(
+        "Пакет вопросов",
+        extra={'batch_id': batch_id, 'questions': len(questions), 'unique': len(groups), 'concurrency': concurrency},
+    )
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(groups)))]
+    try:
+        for _ in range(len(groups)):
+            indices, result = await done.get()
+            for position, index in enumerate(indices):
+                yield {
+                    'index': index,
+                    'question': questions[index],
+                    'outcome': result.outcome if result else 'empty',
+                    'answer': result.answer if result else None,
+                    'sql': result.sql if result else None,
+                    'total_ms': result.total_ms if result else 0.0,
+                    'duplicate': position > 0,
+                }
+    finally:
+        # Клиент ушел, не дождавшись пакета: незавершенные вопросы отменяются
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+async def _read_questions(request: web.Request) -> tuple[list[str], Optional[int]]:
+    """
+    Вопросы и concurrency из тела запроса
+
+    Raises:
+        ValueError: тело не JSON объект/список строк или concurrency не целое положительное
+    """
+    if request.content_type != 'application/json':
+        return [line for line in (await request.text()).splitlines() if line.strip()], None
+
+    body = await request.json()
+    concurrency = None
+    if isinstance(body, dict):
+        questions = body.get('questions')
+        concurrency = body.get('concurrency')
+        if concurrency is not None and (
+            isinstance(concurrency, bool) or not isinstance(concurrency, int) or concurrency < 1
+        ):
+            raise ValueError("concurrency должно быть целым положительным числом")
+    else:
+        questions = body
+    if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+        raise ValueError("questions должно быть списком строк")
+    return questions, concurrency
+
+
+def create_batch_app(token: str = BATCH_API_TOKEN, max_questions: int = BATCH_MAX_QUESTIONS) -> web.Application:
+    """Приложение aiohttp с POST /batch"""
+
+    async def handle_batch(request: web.Request) -> web.StreamResponse:
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+            return web.json_response({'error': 'unauthorized'}, status=401)
+        try:
+            questions, concurrency = await _read_questions(request)
+        except ValueError as e:
+            # json.JSONDecodeError - тоже ValueError
+            return web.json_response(
+                {'error': f'ожидался {{"questions": [...]}}, JSON список строк или текст: {e}'}, status=400,
+            )
+        if len(questions) > max_questions:
+            return web.json_response({'error': f'не больше {max_questions} вопросов в пакете'}, status=413)
+
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson; charset=utf-8'})
+        await response.prepare(request)
+        started = time.perf_counter()
+        outcomes: dict[str, int] = {}
+        async with aclosing(answer_batch(questions, concurrency or BATCH_CONCURRENCY)) as results:
+            async for item in results:
+                outcomes[item['outcome']] = outcomes.get(item['outcome'], 0) + 1
+                await response.write(json.dumps(item, ensure_ascii=False).encode() + b'\n')
+        summary = {
+            'done': True,
+            'questions': len(questions),
+            'unique': len(group_questions(questions)),
+            'outcomes': outcomes,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        }
+        await response.write(json.dumps(summary, ensure_ascii=False).encode() + b'\n')
+        await response.write_eof()
+        return response
+
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app.router.add_post('/batch', handle_batch)
+    return app
+
+
+async def start_batch_server(host: str, port: int) -> web.AppRunner:
+    """
+    Запускает HTTP сервер с POST /batch
+
+    Returns:
+        aiohttp AppRunner; остановка - await runner.cleanup()
+    """
+    runner = web.AppRunner(create_batch_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -1,56 +1,15 @@
 """
 Обработчики сообщений для Telegram бота
 """
+import logging
 from aiogram import Router, F
 from aiogram.types import Message
 from aiogram.filters import Command
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import text
-from src.db.database import async_session_maker
-from src.llm.sql_generator import generate_sql
+from src.bot.pipeline import answer_question
+from src.metrics import span
 
 router = Router()
-
-
-async def execute_sql_query(sql: str) -> tuple[bool, any]:
-    """
-    Выполняет SQL запрос к базе данных
-    
-    Returns:
-        (success, result) - успех выполнения и результат
-    """
-    try:
-        async with async_session_maker() as session:
-            result = await session.execute(text(sql))
-            row = result.fetchone()
-            
-            if row is None:
-                return True, 0
-            
-            # Извлекаем первое значение из результата
-            value = row[0]
-            
-            # Преобразуем в число
-            if value is None:
-                return True, 0
-            
-            # Если это Decimal, преобразуем в int или float
-            if hasattr(value, '__int__'):
-                try:
-                    int_value = int(value)
-                    if float(value) == int_value:
-                        return True, int_value
-                    else:
-                        return True, float(value)
-                except (ValueError, TypeError):
-                    return True, float(value)
-            
-            return True, value
-            
-    except Exception as e:
-        print(f"Ошибка при выполнении SQL: {e}")
-        print(f"SQL запрос: {sql}")
-        return False, None
+logger = logging.getLogger(__name__)
 
 
 @router.message(Command("start"))
@@ -78,6 +37,25 @@ async def cmd_help(message: Message):
     )
 
 
+async def reply(message: Message, text: str):
+    """Отправляет ответ с замером времени отправки в Telegram"""
+    with span("telegram_send"):
+        await message.answer(text)
+
+
+# Ответы пользователю, если числа получить не удалось
+ERROR_REPLIES = {
+    "no_sql": "Извините, не удалось сформировать запрос к базе данных. Попробуйте переформулировать вопрос.",
+    "too_expensive": (
+        "Запрос получился слишком тяжелым для базы данных. "
+        "Попробуйте сузить вопрос (например, указать дату или креатора)."
+    ),
+    "execute_error": "Произошла ошибка при выполнении запроса. Попробуйте переформулировать вопрос.",
+    "busy": "Сейчас слишком много запросов. Попробуйте повторить вопрос через минуту.",
+    "error": "Произошла ошибка при обработке запроса. Попробуйте позже.",
+}
+
+
 @router.message(F.text)
 async def handle_text_message(message: Message):
     """Обработчик текстовых сообщений"""
@@ -87,51 +65,6 @@ async def handle_text_message(message: Message):
         await message.answer("Пожалуйста, задай вопрос на русском языке.")
         return
     
-    try:
-        # Генерируем SQL запрос
-        print(f"Генерация SQL для запроса: {user_query}")
-        sql = await generate_sql(user_query)
-        
-        if not sql:
-            print("Не удалось сгенерировать SQL")
-            await message.answer(
-                "Извините, не удалось сформировать запрос к базе данных. "
-                "Попробуйте переформулировать вопрос."
-            )
-            return
-        
-        print(f"Сгенерированный SQL: {sql}")
-        
-        # Выполняем SQL запрос
-        success, result = await execute_sql_query(sql)
-        
-        if not success:
-            print(f"Ошибка при выполнении SQL: {sql}")
-            await message.answer(
-                "Произошла ошибка при выполнении запроса. "
-                "Попробуйте переформулировать вопрос."
-            )
-            return
-        
-        print(f"Результат запроса: {result}")
-        
-        # Форматируем ответ - только число
-        if isinstance(result, (int, float)):
-            if isinstance(result, float) and result.is_integer():
-                answer = str(int(result))
-            else:
-                answer = str(result)
-        else:
-            answer = str(result)
-        
-        print(f"Отправка ответа: {answer}")
-        await message.answer(answer)
-        
-    except Exception as e:
-        import traceback
-        print(f"Ошибка при обработке сообщения: {e}")
-        print(traceback.format_exc())
-        await message.answer(
-            "Произошла ошибка при обработке запроса. Попробуйте позже."
-        )
-
+    # Генерация и выполнение SQL - в src/bot/pipeline.py
+    result = await answer_question(message.chat.id, user_query)
+    await reply(message, result.answer if result.ok else ERROR_REPLIES.get(result.outcome, ERROR_REPLIES["error"]))
@@ -3,46 +3,225 @@
 """
 import asyncio
 import logging
+import multiprocessing
+import signal
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.fsm.storage.memory import MemoryStorage
-from src.config import TELEGRAM_BOT_TOKEN
+from src.config import (
+    BATCH_API_HOST,
+    BATCH_API_PORT,
+    BOT_MODE,
+    METRICS_HOST,
+    METRICS_PORT,
+    OLLAMA_MODEL_TIERS,
+    OLLAMA_WARMUP,
+    TELEGRAM_API_URL,
+    TELEGRAM_BOT_TOKEN,
+    WEBHOOK_MAX_CONNECTIONS,
+    WEBHOOK_PATH,
+    WEBHOOK_PROCESSES,
+    WEBHOOK_SECRET_TOKEN,
+    WEBHOOK_URL,
+)
+from src.bot.batch import start_batch_server
 from src.bot.handlers import router
+from src.bot.scheduler import scheduler
+from src.bot.singleflight import question_flight, sql_flight
+from src.bot.webhook import serve_webhook
+from src.columnar.engine import columnar_engine
+from src.db.database import close_db
+from src.llm.cascade import model_cascade
+from src.llm.client import init_llm_client, close_llm_client
+from src.llm.sql_generator import warm_up_llm
+from src.llm.template_cache import template_cache
+from src.llm.rules import rule_matcher
+from src.log import setup_logging, shutdown_logging
+from src.metrics import start_metrics_server
+from src.sql.parameterize import shape_stats
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 
-async def main():
-    """Основная функция запуска бота"""
-    if not TELEGRAM_BOT_TOKEN:
-        logger.error("TELEGRAM_BOT_TOKEN не установлен в переменных окружения!")
-        return
-    
-    # Инициализация бота и диспетчера
-    bot = Bot(token=TELEGRAM_BOT_TOKEN)
+async def _warm_up():
+    # Все модели каскада: сильная модель тоже должна быть загружена к первой передаче вопроса
+    for model in OLLAMA_MODEL_TIERS:
+        data = await warm_up_llm(model=model)
+        if data is not None:
+            logger.info(
+                f"Модель Ollama {model} прогрета: загрузка {data.get('load_duration', 0) / 1e9:.2f} с, "
+                f"prefill {data.get('prompt_eval_duration', 0) / 1e9:.2f} с "
+                f"({data.get('prompt_eval_count', 0)} токенов)"
+            )
+
+
+def create_bot() -> Bot:
+    """Бот с сессией к официальному Bot API или к TELEGRAM_API_URL"""
+    session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+    return Bot(token=TELEGRAM_BOT_TOKEN, session=session)
+
+
+def create_dispatcher() -> Dispatcher:
     dp = Dispatcher(storage=MemoryStorage())
-    
-    # Регистрация роутера
     dp.include_router(router)
-    
-    logger.info("Бот запущен")
-    
+    return dp
+
+
+async def register_webhook(bot: Bot, dp: Dispatcher):
+    """Сообщает Telegram адрес webhook (если задан WEBHOOK_URL)"""
+    if not WEBHOOK_URL:
+        return
+    await bot.set_webhook(
+        WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET_TOKEN or None,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    logger.info(f"Webhook зарегистрирован: {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+
+
+async def run_bot(process_index: int = 0, set_webhook: bool = True):
+    """
+    Запускает бота в текущем процессе
+
+    Args:
+        process_index: Номер процесса webhook (метрики и пакетный API слушают порт + номер)
+        set_webhook: Регистрировать webhook (при нескольких процессах это делает родитель)
+    """
+    bot = create_bot()
+    dp = create_dispatcher()
+
+    # Общий клиент Ollama с пулом соединений
+    init_llm_client()
+
+    # Прогрев модели в фоне, чтобы не задерживать старт бота
+    warmup_task = asyncio.create_task(_warm_up()) if OLLAMA_WARMUP else None
+
+    if template_cache is not None:
+        template_cache.load()
+    if columnar_engine is not None:
+        columnar_engine.load()
+
+    # Воркеры этапов генерации и выполнения SQL
+    scheduler.start()
+
+    # Локальный HTTP адрес с метриками в формате Prometheus
+    metrics_runner = None
+    if METRICS_PORT:
+        metrics_port = METRICS_PORT + process_index
+        metrics_runner = await start_metrics_server(METRICS_HOST, metrics_port)
+        logger.info(f"Метрики: http://{METRICS_HOST}:{metrics_port}/metrics")
+
+    # Пакетные вопросы по HTTP (общие с ботом кэши и пул соединений)
+    batch_runner = None
+    if BATCH_API_PORT:
+        batch_port = BATCH_API_PORT + process_index
+        batch_runner = await start_batch_server(BATCH_API_HOST, batch_port)
+        logger.info(f"Пакетные вопросы: http://{BATCH_API_HOST}:{batch_port}/batch")
+
+    logger.info(f"Бот запущен ({BOT_MODE})")
+
     try:
-        # Запуск бота
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        if BOT_MODE == "webhook":
+            if set_webhook:
+                await register_webhook(bot, dp)
+            await serve_webhook(dp, bot, reuse_port=WEBHOOK_PROCESSES > 1)
+        else:
+            await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     except Exception as e:
         logger.error(f"Ошибка при работе бота: {e}")
     finally:
+        if warmup_task is not None and not warmup_task.done():
+            warmup_task.cancel()
+        if template_cache is not None:
+            template_cache.save()
+            logger.info(f"Кэш SQL шаблонов: {template_cache.stats()}")
+        logger.info(f"Покрытие правилами: {rule_matcher.coverage()}")
+        logger.info(f"Планировщик: {scheduler.stats()}")
+        logger.info(f"Объединение запросов: вопросы {question_flight.stats()}, SQL {sql_flight.stats()}")
+        logger.info(f"Формы SQL с параметрами: {shape_stats.stats()}")
+        logger.info(f"Каскад моделей: {model_cascade.stats()}")
+        if columnar_engine is not None:
+            logger.info(f"Колоночный движок: {columnar_engine.stats()}")
+        if batch_runner is not None:
+            await batch_runner.cleanup()
+        await scheduler.stop()
+        await close_llm_client()
+        await close_db()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
         await bot.session.close()
 
 
+def _webhook_process(process_index: int):
+    """Точка входа дочернего процесса webhook"""
+    setup_logging()
+    try:
+        asyncio.run(run_bot(process_index, set_webhook=False))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown_logging()
+
+
+async def _run_webhook_processes(count: int):
+    """Запускает count процессов webhook на одном порту и ждет их завершения"""
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=_webhook_process, args=(i,), name=f"webhook-{i}") for i in range(count)
+    ]
+    for process in processes:
+        process.start()
+    
+    stop_event = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop_event.set)
+    except (NotImplementedError, RuntimeError):
+        pass
+    joined = asyncio.gather(*(asyncio.to_thread(process.join) for process in processes))
+    stopped = asyncio.create_task(stop_event.wait())
+    try:
+        await asyncio.wait({joined, stopped}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        stopped.cancel()
+        # Родителя остановили: останавливаем и процессы (SIGTERM - штатное завершение)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+        await joined
+
+
+async def main():
+    """Основная функция запуска бота"""
+    # Запись логов идет в отдельном потоке, обработчики только ставят записи в очередь
+    setup_logging()
+
+    if not TELEGRAM_BOT_TOKEN:
+        logger.error("TELEGRAM_BOT_TOKEN не установлен в переменных окружения!")
+        shutdown_logging()
+        return
+
+    try:
+        if BOT_MODE == "webhook" and WEBHOOK_PROCESSES > 1:
+            # Webhook регистрируется один раз, процессы только принимают обновления
+            bot = create_bot()
+            try:
+                await register_webhook(bot, create_dispatcher())
+            finally:
+                await bot.session.close()
+            logger.info(f"Запуск {WEBHOOK_PROCESSES} процессов webhook")
+            await _run_webhook_processes(WEBHOOK_PROCESSES)
+        else:
+            await run_bot()
+    finally:
+        shutdown_logging()
+
+
 if __name__ == "__main__":
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Бот остановлен")
-
@@ -0,0 +1,328 @@
+"""
+Конвейер ответа на вопрос: правила или LLM -> переписывание SQL -> выполнение
+
+Не зависит от Telegram: его используют обработчик сообщений бота
+(src/bot/handlers.py) и пакетный API (src/bot/batch.py). Генерация и
+выполнение идут через очереди планировщика, одинаковые вопросы и запросы,
+заданные одновременно, объединяются, кэши общие для всех источников.
+"""
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from sqlalchemy.exc import DBAPIError
+from src.config import (
+    QUERY_COST_ACTION,
+    QUERY_MAX_COST,
+    ROLLUP_ROUTING_ENABLED,
+    SARGABLE_REWRITE_ENABLED,
+    SQL_BIND_PARAMS_ENABLED,
+)
+from src.db.database import read_session_maker
+from src.db.guard import QueryCostExceeded, error_sqlstate, run_guarded
+from src.bot.scheduler import SchedulerBusy, StaleJob, scheduler
+from src.bot.singleflight import question_flight, question_key, sql_flight
+from src.columnar.engine import columnar_engine
+from src.db.result_cache import result_cache, canonicalize_sql
+from src.llm.sql_generator import generate_sql
+from src.llm.template_cache import template_cache
+from src.llm.rules import rule_matcher
+from src.log import bind_request
+from src.metrics import CACHE_REQUESTS, REQUESTS, STAGE_SECONDS, span, start_request
+from src.sql.parameterize import parameterize, shape_stats
+from src.sql.rollup_router import rollup_state, route_to_rollups
+from src.sql.sargable import rewrite_sargable
+
+logger = logging.getLogger(__name__)
+
+
+def _to_number(value):
+    """Приводит первое значение результата к числу"""
+    if value is None:
+        return 0
+    
+    # Если это Decimal, преобразуем в int или float
+    if hasattr(value, '__int__'):
+        try:
+            int_value = int(value)
+            if float(value) == int_value:
+                return int_value
+            else:
+                return float(value)
+        except (ValueError, TypeError):
+            return float(value)
+    
+    return value
+
+
+def _is_bind_error(error: DBAPIError) -> bool:
+    """Ошибка из-за типа параметра: 22xxx/42xxx от сервера или ошибка кодирования в asyncpg"""
+    cause = getattr(error.orig, '__cause__', None)
+    return error_sqlstate(error)[:2] in ('22', '42') or isinstance(cause, (TypeError, ValueError))
+
+
+async def run_query(sql: str, check_cost: bool = True) -> tuple[Optional[Any], Optional[int]]:
+    """
+    Выполняет запрос с константами, вынесенными в параметры.
+    Если сервер или asyncpg не приняли тип параметра, запрос повторяется как есть.
+
+    Returns:
+        (первая строка, поколение данных в снимке запроса или None без кэша результатов)
+    """
+    max_cost = None if not check_cost else QUERY_MAX_COST
+    # Поколение читается там же, где выполнен запрос: реплика может отставать от основной БД
+    with_generation = result_cache is not None
+    statement = parameterize(sql) if SQL_BIND_PARAMS_ENABLED else None
+    if statement is not None:
+        try:
+            async with read_session_maker()() as session:
+                result = await run_guarded(session, statement.sql, max_cost=max_cost, params=statement.params,
+                                           with_generation=with_generation)
+            shape_stats.record_bound(statement)
+            return result if with_generation else (result, None)
+        except DBAPIError as e:
+            if not _is_bind_error(e):
+                raise
+            shape_stats.record_fallback()
+            logger.info("Запрос с параметрами не выполнен, повтор без параметров: %s", e.orig,
+                        extra={'sql': statement.sql})
+    else:
+        shape_stats.record_literal()
+    
+    # Только чтение: при наличии реплик запросы распределяются между ними
+    async with read_session_maker()() as session:
+        result = await run_guarded(session, sql, max_cost=max_cost, with_generation=with_generation)
+    return result if with_generation else (result, None)
+
+
+async def execute_sql_query(sql: str, check_cost: bool = True) -> tuple[bool, any]:
+    """
+    Выполняет SQL запрос к базе данных.
+    Повторные запросы по неизменившимся данным отдаются из кэша результатов.
+    Запрос выполняется в read-only транзакции с таймаутом (src/db/guard.py),
+    константы передаются параметрами (src/sql/parameterize.py).
+    
+    Args:
+        sql: SQL запрос
+        check_cost: Проверять оценку стоимости плана перед выполнением
+    
+    Returns:
+        (success, result) - успех выполнения и результат
+    
+    Raises:
+        QueryCostExceeded: если план дороже QUERY_MAX_COST
+    """
+    cache_key = canonicalize_sql(sql)
+    generation = None
+    if result_cache is not None:
+        generation = await result_cache.refresh_generation()
+        if generation is not None:
+            found, cached_value = result_cache.get(cache_key)
+            CACHE_REQUESTS.inc(cache='result', result='hit' if found else 'miss')
+            if found:
+                return True, cached_value
+    
+    # Типовые агрегаты считаются по локальной колоночной выгрузке, если она актуальна
+    if columnar_engine is not None:
+        with span("columnar"):
+            value = await columnar_engine.answer(sql)
+        if value is not None:
+            if result_cache is not None:
+                result_cache.put(cache_key, value, generation)
+            return True, value
+    
+    try:
+        row, row_generation = await run_query(sql, check_cost)
+        
+        value = _to_number(row[0] if row is not None else None)
+        if result_cache is not None:
+            # Результат отстающей реплики не попадает в кэш нового поколения
+            result_cache.put(cache_key, value, row_generation)
+        return True, value
+            
+    except QueryCostExceeded:
+        raise
+    except Exception as e:
+        logger.warning("Ошибка при выполнении SQL: %s", e, extra={'sql': sql})
+        return False, None
+
+
+def prepare_sql(sql: str, rollups_fresh: bool = True) -> str:
+    """
+    Переписывает SQL перед выполнением: диапазоны по времени и предагрегированные таблицы
+    (только если rollups_fresh - агрегаты пересчитаны после последней загрузки)
+    """
+    # Условия по дате/часу переписываем в диапазоны, чтобы работали индекс и отсечение партиций
+    if SARGABLE_REWRITE_ENABLED:
+        rewritten_sql = rewrite_sargable(sql)
+        if rewritten_sql != sql:
+            logger.debug("Условия по времени переписаны", extra={'sql': rewritten_sql})
+            sql = rewritten_sql
+    
+    # Запрос, на который ответит колоночный движок, не переписываем на агрегаты
+    if columnar_engine is not None and columnar_engine.supports(sql):
+        return sql
+    
+    # Агрегаты по снапшотам считаем по предагрегированным таблицам, если это возможно
+    if ROLLUP_ROUTING_ENABLED and rollups_fresh:
+        routed_sql = route_to_rollups(sql)
+        if routed_sql:
+            logger.debug("Запрос перенаправлен в агрегаты", extra={'sql': routed_sql})
+            sql = routed_sql
+    
+    return sql
+
+
+def remember_sql(user_query: str, sql: str):
+    """Сохраняет SQL от LLM как шаблон вопроса - только после успешного выполнения"""
+    if template_cache is not None:
+        template_cache.put(user_query, sql)
+
+
+async def regenerate_expensive_sql(chat_id: int, user_query: str, error: QueryCostExceeded) -> tuple[bool, any]:
+    """Просит LLM переписать слишком дорогой запрос и выполняет новый вариант один раз"""
+    hint = (
+        f"Предыдущий вариант запроса слишком тяжелый для базы данных "
+        f"(оценка стоимости {error.cost:,.0f}). Сгенерируй более простой запрос: "
+        f"без self-join и декартовых произведений, с фильтрами по индексируемым колонкам."
+    )
+    sql = await question_flight.do(
+        f"regenerate:{question_key(user_query)}",
+        lambda: scheduler.generate.run(chat_id, generate_sql, user_query, hint=hint),
+    )
+    if not sql:
+        return False, None
+    
+    generated_sql = sql
+    sql = prepare_sql(sql, rollups_fresh=ROLLUP_ROUTING_ENABLED and await rollup_state.refresh())
+    logger.info("Повторно сгенерированный SQL", extra={'sql': sql})
+    try:
+        success, value = await execute_sql_shared(chat_id, sql)
+    except QueryCostExceeded as e:
+        logger.warning("Повторный запрос тоже слишком дорогой: %s", e)
+        return False, None
+    # Более простой вариант заменяет сохраненный шаблон
+    if success and value is not None:
+        remember_sql(user_query, generated_sql)
+    return success, value
+
+
+async def generate_sql_shared(chat_id: int, user_query: str) -> Optional[str]:
+    """Генерация SQL; одинаковые вопросы, заданные одновременно, генерируются один раз"""
+    return await question_flight.do(
+        question_key(user_query),
+        lambda: scheduler.generate.run(chat_id, generate_sql, user_query),
+    )
+
+
+async def execute_sql_shared(chat_id: int, sql: str, check_cost: bool = True) -> tuple[bool, any]:
+    """Выполнение SQL; одинаковые запросы, выполняющиеся одновременно, идут в БД один раз"""
+    return await sql_flight.do(
+        f"{int(check_cost)}:{canonicalize_sql(sql)}",
+        lambda: scheduler.execute.run(chat_id, execute_sql_query, sql, check_cost=check_cost),
+    )
+
+
+@dataclass
+class Answer:
+    """Итог обработки вопроса"""
+    question: str
+    # rules, llm, no_sql, too_expensive, execute_error, busy или error
+    outcome: str
+    answer: Optional[str] = None
+    sql: Optional[str] = None
+    spans_ms: dict[str, float] = field(default_factory=dict)
+    total_ms: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.answer is not None
+
+
+def format_answer(result: Any) -> str:
+    """Ответ пользователю - только число"""
+    if isinstance(result, float) and result.is_integer():
+        return str(int(result))
+    return str(result)
+
+
+async def answer_question(chat_id: int, user_query: str, **log_fields) -> Answer:
+    """
+    Отвечает на вопрос: правила или LLM, переписывание SQL и выполнение
+
+    Args:
+        chat_id: Чат (или клиент пакетного API) - ключ очередей планировщика
+        log_fields: Дополнительные поля контекста лога (например, batch_id)
+    """
+    # Контекст и замеры этапов наследуются задачами планировщика
+    bind_request(chat_id=chat_id, **log_fields)
+    spans = start_request()
+    started = time.perf_counter()
+    result = Answer(question=user_query, outcome="error")
+    
+    try:
+        # Типовые вопросы разбираются правилами, остальные - через LLM
+        # (генерация и выполнение идут через очереди планировщика)
+        with span("rules"):
+            sql = rule_matcher.match(user_query)
+        from_rules = bool(sql)
+        if from_rules:
+            logger.info("Запрос распознан правилами", extra={'question': user_query})
+        else:
+            logger.info("Генерация SQL для запроса", extra={'question': user_query})
+            sql = await generate_sql_shared(chat_id, user_query)
+        
+        if not sql:
+            result.outcome = "no_sql"
+            logger.warning("Не удалось сгенерировать SQL", extra={'question': user_query})
+            return result
+        
+        logger.info("Сгенерированный SQL", extra={'sql': sql})
+        generated_sql = sql
+        
+        with span("prepare"):
+            sql = prepare_sql(sql, rollups_fresh=ROLLUP_ROUTING_ENABLED and await rollup_state.refresh())
+        result.sql = sql
+        
+        # Выполняем SQL запрос; SQL из правил заведомо простой, стоимость проверяем только для LLM
+        try:
+            success, value = await execute_sql_shared(chat_id, sql, check_cost=not from_rules)
+        except QueryCostExceeded as e:
+            logger.warning("Запрос отклонен: %s", e, extra={'sql': sql})
+            if QUERY_COST_ACTION != "regenerate":
+                result.outcome = "too_expensive"
+                return result
+            success, value = await regenerate_expensive_sql(chat_id, user_query, e)
+            # Шаблон уже сохранен для нового варианта, дорогой не сохраняем
+            generated_sql = None
+        
+        if not success:
+            result.outcome = "execute_error"
+            return result
+        
+        result.answer = format_answer(value)
+        result.outcome = "rules" if from_rules else "llm"
+        if not from_rules and generated_sql and value is not None:
+            remember_sql(user_query, generated_sql)
+        
+    except (SchedulerBusy, StaleJob) as e:
+        result.outcome = "busy"
+        logger.warning("Запрос не обработан из-за нагрузки: %r", e)
+    except Exception:
+        logger.exception("Ошибка при обработке вопроса")
+    finally:
+        total = time.perf_counter() - started
+        STAGE_SECONDS.observe(total, stage="total")
+        REQUESTS.inc(outcome=result.outcome)
+        result.total_ms = round(total * 1000, 1)
+        result.spans_ms = {stage: round(seconds * 1000, 1) for stage, seconds in spans.items()}
+        logger.info(
+            "Вопрос обработан",
+            extra={
+                'outcome': result.outcome,
+                'answer': result.answer,
+                'total_ms': result.total_ms,
+                'spans_ms': result.spans_ms,
+            },
+        )
+    return result
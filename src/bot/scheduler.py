@@ -0,0 +1,217 @@
+"""
+Планировщик этапов обработки сообщений
+
+Обработка вопроса разбита на этапы "генерация SQL" и "выполнение SQL". У каждого
+этапа своя ограниченная очередь и свой пул воркеров. Задачи выбираются из
+очередей чатов по кругу, поэтому один активный чат не может занять все
+воркеры. Если очередь переполнена, задача сразу отклоняется (бот отвечает,
+что занят). Задача, прождавшая дольше SCHEDULER_MAX_WAIT, отбрасывается,
+а работа отменяется, если ответ больше никто не ждет.
+"""
+import asyncio
+import contextvars
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+from src.config import (
+    SCHEDULER_EXECUTE_QUEUE,
+    SCHEDULER_EXECUTE_WORKERS,
+    SCHEDULER_GENERATE_QUEUE,
+    SCHEDULER_GENERATE_WORKERS,
+    SCHEDULER_MAX_PENDING_PER_CHAT,
+    SCHEDULER_MAX_WAIT,
+)
+from src.metrics import record_span, registry
+
+
+class SchedulerBusy(Exception):
+    """Очередь этапа (или чата) заполнена"""
+
+
+class StaleJob(Exception):
+    """Задача слишком долго ждала в очереди и была отброшена"""
+
+
+@dataclass
+class _Job:
+    func: Callable[..., Awaitable]
+    args: tuple
+    kwargs: dict
+    future: asyncio.Future
+    submitted: float = field(default_factory=time.monotonic)
+    # Контекст отправителя: задача видит его контекст лога и замеры этапов
+    context: contextvars.Context = field(default_factory=contextvars.copy_context)
+
+
+class Stage:
+    """Этап обработки: очереди по чатам, круговой обход и пул воркеров"""
+
+    def __init__(self, name: str, workers: int, max_queue: int, max_per_chat: int, max_wait: float):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_per_chat = max_per_chat
+        self.max_wait = max_wait
+        self._pending: dict[int, deque[_Job]] = {}
+        # Чаты с задачами в порядке обхода
+        self._order: deque[int] = deque()
+        self._size = 0
+        self._wakeup: Optional[asyncio.Semaphore] = None
+        self._tasks: list[asyncio.Task] = []
+        self._stopping = False
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.stale = 0
+        self.cancelled = 0
+        self.max_wait_seen = 0.0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Semaphore(0)
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"{self.name}-worker-{i}") for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._stopping = False
+        for jobs in self._pending.values():
+            for job in jobs:
+                if not job.future.done():
+                    job.future.cancel()
+        self._pending.clear()
+        self._order.clear()
+        self._size = 0
+
+    async def run(self, chat_id: int, func: Callable[..., Awaitable], *args, **kwargs) -> Any:
+        """
+        Ставит задачу в очередь чата и ждет результат
+
+        Raises:
+            SchedulerBusy: очередь этапа или чата заполнена
+            StaleJob: задача не дождалась воркера за max_wait секунд
+        """
+        if not self._tasks:
+            self.start()
+
+        queue = self._pending.get(chat_id)
+        if self._size >= self.max_queue or (queue is not None and len(queue) >= self.max_per_chat):
+            self.rejected += 1
+            raise SchedulerBusy(self.name)
+
+        future = asyncio.get_running_loop().create_future()
+        if queue is None:
+            queue = self._pending[chat_id] = deque()
+            self._order.append(chat_id)
+        queue.append(_Job(func, args, kwargs, future))
+        self._size += 1
+        self.submitted += 1
+        self._wakeup.release()
+        return await future
+
+    def _next_job(self) -> _Job:
+        chat_id = self._order.popleft()
+        queue = self._pending[chat_id]
+        job = queue.popleft()
+        if queue:
+            self._order.append(chat_id)
+        else:
+            del self._pending[chat_id]
+        self._size -= 1
+        return job
+
+    async def _worker(self):
+        while True:
+            await self._wakeup.acquire()
+            job = self._next_job()
+
+            # Отправитель уже не ждет ответа (отменен)
+            if job.future.cancelled():
+                self.cancelled += 1
+                continue
+
+            waited = time.monotonic() - job.submitted
+            self.max_wait_seen = max(self.max_wait_seen, waited)
+            job.context.run(record_span, f"queue_{self.name}", waited)
+            if waited > self.max_wait:
+                self.stale += 1
+                job.future.set_exception(StaleJob(f"{self.name}: задача ждала {waited:.1f} с"))
+                continue
+
+            task = job.context.run(asyncio.create_task, job.func(*job.args, **job.kwargs))
+            # Если ожидающий отменен во время работы - отменяем и саму работу
+            job.future.add_done_callback(lambda f, t=task: t.cancel() if f.cancelled() else None)
+            try:
+                result = await task
+            except asyncio.CancelledError:
+                if not job.future.done():
+                    job.future.cancel()
+                # Отмена самого воркера (остановка этапа) доходит и до задачи - воркер завершается
+                if self._stopping or not task.cancelled():
+                    raise
+                self.cancelled += 1
+                continue
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+                continue
+            self.completed += 1
+            if not job.future.done():
+                job.future.set_result(result)
+
+    @property
+    def queued(self) -> int:
+        return self._size
+
+    def stats(self) -> dict:
+        return {
+            'queued': self._size,
+            'chats': len(self._pending),
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'stale': self.stale,
+            'cancelled': self.cancelled,
+            'max_wait_seen': round(self.max_wait_seen, 3),
+        }
+
+
+class Scheduler:
+    """Этапы обработки вопроса: generate (LLM) и execute (БД)"""
+
+    def __init__(
+        self,
+        generate_workers: int = SCHEDULER_GENERATE_WORKERS,
+        execute_workers: int = SCHEDULER_EXECUTE_WORKERS,
+        generate_queue: int = SCHEDULER_GENERATE_QUEUE,
+        execute_queue: int = SCHEDULER_EXECUTE_QUEUE,
+        max_per_chat: int = SCHEDULER_MAX_PENDING_PER_CHAT,
+        max_wait: float = SCHEDULER_MAX_WAIT,
+    ):
+        self.generate = Stage('generate', generate_workers, generate_queue, max_per_chat, max_wait)
+        self.execute = Stage('execute', execute_workers, execute_queue, max_per_chat, max_wait)
+
+    def start(self):
+        self.generate.start()
+        self.execute.start()
+
+    async def stop(self):
+        await self.generate.stop()
+        await self.execute.stop()
+
+    def stats(self) -> dict:
+        return {'generate': self.generate.stats(), 'execute': self.execute.stats()}
+
+
+scheduler = Scheduler()
+registry.gauge(
+    'bot_scheduler_queue_depth', 'Задачи, ожидающие воркера, по этапам', ('stage',),
+    lambda: {(stage.name,): stage.queued for stage in (scheduler.generate, scheduler.execute)},
+)
@@ -0,0 +1,85 @@
+"""
+Объединение одинаковых запросов, выполняющихся одновременно (single-flight)
+
+Когда вопрос пересылают в группу, многие пользователи отправляют один и тот
+же текст в течение нескольких секунд. Первый вызов с данным ключом выполняет
+работу, остальные ждут его результат. Ключи: нормализованный текст вопроса
+(генерация SQL) и каноническая форма SQL (выполнение запроса).
+"""
+import asyncio
+import re
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+from src.metrics import registry
+
+FLIGHT_CALLS = registry.counter(
+    'bot_singleflight_calls_total',
+    'Вызовы single-flight по роли: leader выполняет работу, follower ждет общий результат',
+    ('flight', 'role'),
+)
+
+
+def question_key(text: str) -> str:
+    """
+    Нормализует вопрос для ключа: пробелы, 'ё' и финальная пунктуация не важны.
+    Регистр сохраняется - от него зависят id креаторов.
+    """
+    return re.sub(r'\s+', ' ', text.replace('ё', 'е').replace('Ё', 'Е')).strip().rstrip('?!. ')
+
+
+@dataclass
+class _Call:
+    task: asyncio.Task
+    waiters: int = 0
+
+
+class SingleFlight:
+    """Не более одного выполнения на ключ; параллельные вызовы получают общий результат"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[str, _Call] = {}
+        self.calls = 0
+        self.merged = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable]) -> Any:
+        """
+        Выполняет func() или присоединяется к уже идущему вызову с тем же ключом.
+        Исключение общего вызова получают все ожидающие.
+        """
+        self.calls += 1
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(func()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _, key=key, call=call: self._forget(key, call))
+            FLIGHT_CALLS.inc(flight=self.name, role='leader')
+        else:
+            self.merged += 1
+            FLIGHT_CALLS.inc(flight=self.name, role='follower')
+
+        call.waiters += 1
+        try:
+            # shield: отмена одного ожидающего не отменяет работу для остальных
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Результат больше никому не нужен
+                call.task.cancel()
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        return {
+            'calls': self.calls,
+            'merged': self.merged,
+            'merge_rate': self.merged / self.calls if self.calls else 0.0,
+            'in_flight': len(self._calls),
+        }
+
+
+question_flight = SingleFlight('question')
+sql_flight = SingleFlight('sql')
@@ -0,0 +1,174 @@
+"""
+Прием обновлений Telegram через webhook
+
+HTTP обработчик проверяет секретный токен, кладет обновление в ограниченную
+очередь и сразу отвечает 200, не дожидаясь генерации SQL. Обновления из
+очереди разбирает пул воркеров через Dispatcher.feed_raw_update. Если очередь
+заполнена, обработчик отвечает 503, и Telegram повторит доставку позже.
+Несколько процессов могут слушать один порт (SO_REUSEPORT), у каждого свой
+событийный цикл и свой пул воркеров.
+"""
+import asyncio
+import hmac
+import logging
+import signal
+from typing import Optional
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from src.config import (
+    WEBHOOK_HOST,
+    WEBHOOK_PATH,
+    WEBHOOK_PORT,
+    WEBHOOK_QUEUE_SIZE,
+    WEBHOOK_SECRET_TOKEN,
+    WEBHOOK_WORKERS,
+)
+from src.metrics import registry
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_UPDATES = registry.counter(
+    'bot_webhook_updates_total', 'Обновления, полученные через webhook, по результату', ('result',),
+)
+WEBHOOK_QUEUE_DEPTH = registry.gauge('bot_webhook_queue_depth', 'Обновления, ожидающие воркера webhook')
+
+
+class UpdateDispatcher:
+    """Ограниченная очередь обновлений и пул воркеров, передающих их в aiogram"""
+
+    def __init__(self, dp: Dispatcher, bot: Bot, workers: int = WEBHOOK_WORKERS, max_queue: int = WEBHOOK_QUEUE_SIZE):
+        self.dp = dp
+        self.bot = bot
+        self.workers = workers
+        self._queue: asyncio.Queue[dict] = asyncio.Queue(max_queue)
+        self._tasks: list[asyncio.Task] = []
+        self.accepted = 0
+        self.rejected = 0
+        self.failed = 0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"webhook-worker-{i}") for i in range(self.workers)
+        ]
+        WEBHOOK_QUEUE_DEPTH.func = lambda: {(): self._queue.qsize()}
+
+    async def stop(self, drain_timeout: float = 10):
+        """Дает воркерам разобрать уже принятые обновления, затем останавливает их"""
+        try:
+            await asyncio.wait_for(self._queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Не разобрано обновлений при остановке: %d", self._queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, update: dict) -> bool:
+        """Ставит обновление в очередь; False - очередь заполнена"""
+        try:
+            self._queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self.accepted += 1
+        return True
+
+    async def _worker(self):
+        while True:
+            update = await self._queue.get()
+            try:
+                await self.dp.feed_raw_update(self.bot, update)
+            except Exception:
+                self.failed += 1
+                logger.exception("Ошибка при обработке обновления", extra={'update_id': update.get('update_id')})
+            finally:
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            'queued': self._queue.qsize(),
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'failed': self.failed,
+        }
+
+
+def create_webhook_app(
+    dispatcher: UpdateDispatcher,
+    path: str = WEBHOOK_PATH,
+    secret_token: str = WEBHOOK_SECRET_TOKEN,
+) -> web.Application:
+    """Приложение aiohttp: POST path принимает обновления, GET /healthz - состояние очереди"""
+
+    async def handle_update(request: web.Request) -> web.Response:
+        if secret_token and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), secret_token):
+            WEBHOOK_UPDATES.inc(result='unauthorized')
+            return web.Response(status=401)
+        try:
+            update = await request.json()
+        except ValueError:
+            WEBHOOK_UPDATES.inc(result='invalid')
+            return web.Response(status=400)
+        if not dispatcher.submit(update):
+            WEBHOOK_UPDATES.inc(result='rejected')
+            return web.Response(status=503)
+        WEBHOOK_UPDATES.inc(result='accepted')
+        return web.Response()
+
+    async def healthz(request: web.Request) -> web.Response:
+        return web.json_response(dispatcher.stats())
+
+    app = web.Application()
+    app.router.add_post(path, handle_update)
+    app.router.add_get('/healthz', healthz)
+    return app
+
+
+async def serve_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    host: str = WEBHOOK_HOST,
+    port: int = WEBHOOK_PORT,
+    reuse_port: bool = False,
+    stop_event: Optional[asyncio.Event] = None,
+):
+    """
+    Принимает обновления до SIGTERM/SIGINT (или до stop_event)
+
+    Args:
+        reuse_port: Разрешить нескольким процессам слушать один порт
+    """
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows или не главный поток
+            pass
+
+    dispatcher = UpdateDispatcher(dp, bot)
+    runner = web.AppRunner(create_webhook_app(dispatcher), access_log=None)
+    await runner.setup()
+    dispatcher.start()
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    try:
+        await web.TCPSite(runner, host, port, reuse_port=reuse_port or None).start()
+        logger.info(f"Webhook слушает http://{host}:{port}{WEBHOOK_PATH}")
+        await stop_event.wait()
+    finally:
+        # Сначала перестаем принимать новые обновления, затем дорабатываем принятые
+        await runner.shutdown()
+        await dispatcher.stop()
+        await runner.cleanup()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+        logger.info(f"Webhook: {dispatcher.stats()}")
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.remove_signal_handler(sig)
+            except (NotImplementedError, RuntimeError):
+                pass
@@ -0,0 +1,207 @@
+"""
+Локальный ответ на агрегирующие запросы по колоночной выгрузке
+
+Запрос разбирается в AggregateShape (src/sql/shapes.py). Интервал по времени
+находится двоичным поиском по отсортированной колонке времени, остальные
+условия (креатор, часы, пороги) - векторными масками по этому интервалу.
+Запросы другой формы, а также запросы при устаревшей выгрузке (поколение
+данных в БД изменилось) выполняются в PostgreSQL как обычно.
+"""
+import logging
+import operator
+import time
+from typing import Optional
+from src.config import COLUMNAR_ENABLED, COLUMNAR_GENERATION_CHECK_INTERVAL, COLUMNAR_PATH
+from src.db.database import async_session_maker, fetch_data_generation
+from src.metrics import registry
+from src.sql.shapes import AggregateShape, parse_aggregate
+
+try:
+    import numpy as np
+    from src.columnar.store import ColumnStore, read_meta
+except ImportError:  # numpy нужен только для локального движка
+    np = None
+
+logger = logging.getLogger(__name__)
+
+COLUMNAR_REQUESTS = registry.counter(
+    'bot_columnar_requests_total', 'Запросы к колоночному движку по результату', ('result',),
+)
+
+_OPERATORS = {
+    '=': operator.eq,
+    '<>': operator.ne,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+_MICROSECONDS_IN_HOUR = 3_600_000_000
+
+
+class ColumnarEngine:
+    """Ответы на AggregateShape по выгрузке ColumnStore"""
+
+    def __init__(self, path: str = COLUMNAR_PATH, check_interval: float = COLUMNAR_GENERATION_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self.store: Optional['ColumnStore'] = None
+        self._current = False
+        self._checked_at = 0.0
+        self._stale_generation: Optional[int] = None
+        self.answered = 0
+        self.unsupported = 0
+        self.stale = 0
+
+    def load(self) -> bool:
+        """Открывает выгрузку; False, если ее нет или она повреждена"""
+        try:
+            self.store = ColumnStore.open(self.path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Колоночная выгрузка не загружена (%s): %s", self.path, e)
+            self.store = None
+            return False
+        logger.info(
+            "Колоночная выгрузка загружена",
+            extra={'path': self.path, 'generation': self.store.generation, 'rows': self.store.rows},
+        )
+        return True
+
+    async def refresh(self) -> bool:
+        """
+        Проверяет, что выгрузка сделана на текущем поколении данных.
+        Если в БД поколение новее, а на диске уже лежит новая выгрузка - открывает ее.
+        """
+        now = time.monotonic()
+        if self.store is not None and now - self._checked_at < self.check_interval:
+            return self._current
+        self._checked_at = now
+
+        try:
+            async with async_session_maker() as session:
+                generation = await fetch_data_generation(session)
+        except Exception as e:
+            logger.warning("Не удалось получить поколение данных: %s", e)
+            self._current = False
+            return False
+
+        if self.store is None or self.store.generation != generation:
+            # После загрузки данных на диске могла появиться новая выгрузка
+            if _meta_generation(self.path) == generation:
+                self.load()
+        self._current = self.store is not None and self.store.generation == generation
+        if not self._current and self._stale_generation != generation:
+            self._stale_generation = generation
+            logger.warning(
+                "Колоночная выгрузка устарела: поколение %s, в БД %s",
+                self.store.generation if self.store else None, generation,
+            )
+        return self._current
+
+    def supports(self, sql: str) -> bool:
+        """Может ли движок ответить на запрос (без проверки поколения данных)"""
+        if self.store is None:
+            return False
+        shape = parse_aggregate(sql)
+        return shape is not None and self._columns_available(shape)
+
+    def _columns_available(self, shape: AggregateShape) -> bool:
+        columns = self.store.tables[shape.table]
+        # NULL выгружены нулями: сравнения и суммы по таким колонкам разошлись бы с PostgreSQL
+        nulls = self.store.nulls.get(shape.table, {})
+        used = [column for column, _, _ in shape.filters]
+        if shape.aggregate == 'sum':
+            used.append(shape.column)
+        return all(column in columns and not nulls.get(column) for column in used)
+
+    async def answer(self, sql: str) -> Optional[int]:
+        """Ответ на запрос или None, если его нужно выполнить в БД"""
+        shape = parse_aggregate(sql) if self.store is not None else None
+        if shape is None or not self._columns_available(shape):
+            self.unsupported += 1
+            COLUMNAR_REQUESTS.inc(result='unsupported')
+            return None
+        if not await self.refresh():
+            self.stale += 1
+            COLUMNAR_REQUESTS.inc(result='stale')
+            return None
+        self.answered += 1
+        COLUMNAR_REQUESTS.inc(result='answered')
+        return self.evaluate(shape)
+
+    def evaluate(self, shape: AggregateShape) -> int:
+        """Значение агрегата по выгрузке"""
+        columns = self.store.tables[shape.table]
+        times = columns[shape.time_column]
+
+        start, end = 0, len(times)
+        if shape.lower is not None:
+            value = np.datetime64(shape.lower.value, 'us')
+            start = int(np.searchsorted(times, value, side='left' if shape.lower.inclusive else 'right'))
+        if shape.upper is not None:
+            value = np.datetime64(shape.upper.value, 'us')
+            end = int(np.searchsorted(times, value, side='right' if shape.upper.inclusive else 'left'))
+        if end <= start:
+            return 0
+
+        mask = None
+
+        def narrow(condition):
+            nonlocal mask
+            mask = condition if mask is None else mask & condition
+
+        if shape.creator_id is not None:
+            code = self.store.creators.get(shape.creator_id)
+            if code is None:
+                return 0
+            narrow(columns['creator'][start:end] == code)
+        if shape.hours is not None:
+            hours = times[start:end].view('int64') // _MICROSECONDS_IN_HOUR % 24
+            narrow((hours >= shape.hours[0]) & (hours < shape.hours[1]))
+        for column, op, value in shape.filters:
+            narrow(_OPERATORS[op](columns[column][start:end], value))
+
+        if shape.aggregate == 'count':
+            return end - start if mask is None else int(np.count_nonzero(mask))
+
+        if shape.aggregate == 'sum':
+            values = columns[shape.column][start:end]
+            return int(values.sum() if mask is None else values.sum(where=mask))
+
+        # COUNT(DISTINCT video_id)
+        videos = columns['video'][start:end]
+        if mask is not None:
+            videos = videos[mask]
+        if len(videos) * 8 < self.store.videos_count:
+            return int(np.unique(videos).size)
+        seen = np.zeros(self.store.videos_count, dtype=bool)
+        seen[videos] = True
+        return int(np.count_nonzero(seen))
+
+    def stats(self) -> dict:
+        return {
+            'generation': self.store.generation if self.store else None,
+            'answered': self.answered,
+            'unsupported': self.unsupported,
+            'stale': self.stale,
+        }
+
+
+def _meta_generation(path: str) -> Optional[int]:
+    try:
+        return read_meta(path).get('generation')
+    except (OSError, ValueError):
+        return None
+
+
+def _create_engine() -> Optional[ColumnarEngine]:
+    if not COLUMNAR_ENABLED:
+        return None
+    if np is None:
+        logger.warning("COLUMNAR_ENABLED=1, но numpy не установлен: колоночный движок выключен")
+        return None
+    return ColumnarEngine()
+
+
+columnar_engine: Optional[ColumnarEngine] = _create_engine()
@@ -0,0 +1,142 @@
+"""
+Колоночная копия videos и video_snapshots в файлах NumPy
+
+Каждая колонка хранится отдельным .npy файлом и открывается через mmap, так
+что в память попадают только страницы, которые нужны запросу. Строки обеих
+таблиц отсортированы по времени (video_created_at / created_at), поэтому
+интервал по времени находится двоичным поиском. creator_id и video_id
+заменены целыми кодами: код видео - номер строки в videos, код креатора -
+номер в creators.json. В meta.json записано поколение данных, на котором
+сделана выгрузка (см. scripts/export_columnar.py), и число NULL в колонках:
+NULL записываются нулями, и по таким колонкам движок не отвечает.
+"""
+import json
+import os
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+
+FORMAT_VERSION = 2
+TIME_DTYPE = 'datetime64[us]'
+
+# Колонки каждой таблицы и их типы
+VIDEO_COLUMNS = {
+    'video_created_at': TIME_DTYPE,
+    'creator': 'int32',
+    'views_count': 'int64',
+    'likes_count': 'int64',
+    'comments_count': 'int64',
+    'reports_count': 'int64',
+}
+SNAPSHOT_COLUMNS = {
+    'created_at': TIME_DTYPE,
+    'video': 'int32',
+    'creator': 'int32',
+    'views_count': 'int64',
+    'likes_count': 'int64',
+    'comments_count': 'int64',
+    'reports_count': 'int64',
+    'delta_views_count': 'int64',
+    'delta_likes_count': 'int64',
+    'delta_comments_count': 'int64',
+    'delta_reports_count': 'int64',
+}
+TABLES = {
+    'videos': VIDEO_COLUMNS,
+    'video_snapshots': SNAPSHOT_COLUMNS,
+}
+
+
+def _column_path(path: str, table: str, column: str) -> str:
+    return os.path.join(path, f"{table}.{column}.npy")
+
+
+@dataclass
+class ColumnStore:
+    """Открытая выгрузка: колонки по таблицам, словарь креаторов и поколение данных"""
+    path: str
+    generation: Optional[int]
+    tables: dict[str, dict[str, np.ndarray]]
+    creators: dict[str, int]
+    rows: dict[str, int]
+    # Таблица -> колонки, в которых были NULL (записаны нулями)
+    nulls: dict[str, dict[str, int]]
+
+    @property
+    def videos_count(self) -> int:
+        return self.rows['videos']
+
+    @classmethod
+    def open(cls, path: str) -> 'ColumnStore':
+        """Открывает колонки только для чтения через mmap"""
+        meta = read_meta(path)
+        if meta.get('version') != FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия выгрузки: {meta.get('version')}")
+        tables = {
+            table: {column: np.load(_column_path(path, table, column), mmap_mode='r') for column in columns}
+            for table, columns in TABLES.items()
+        }
+        for table, columns in tables.items():
+            sizes = {len(values) for values in columns.values()}
+            if sizes != {meta['rows'][table]}:
+                raise ValueError(f"Колонки {table} разной длины: {sorted(sizes)}")
+        with open(os.path.join(path, 'creators.json'), encoding='utf-8') as f:
+            creators = {creator_id: code for code, creator_id in enumerate(json.load(f))}
+        return cls(path, meta.get('generation'), tables, creators, meta['rows'], meta['nulls'])
+
+
+def read_meta(path: str) -> dict:
+    with open(os.path.join(path, 'meta.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+class ColumnWriter:
+    """Запись выгрузки по частям в заранее выделенные файлы колонок"""
+
+    def __init__(self, path: str, rows: dict[str, int]):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.rows = rows
+        self._columns = {
+            table: {
+                column: np.lib.format.open_memmap(
+                    _column_path(path, table, column), mode='w+', dtype=dtype, shape=(rows[table],)
+                )
+                for column, dtype in columns.items()
+            }
+            for table, columns in TABLES.items()
+        }
+        self._offsets = {table: 0 for table in TABLES}
+
+    def append(self, table: str, chunk: dict[str, np.ndarray]):
+        """Дописывает часть строк таблицы (все колонки одной длины)"""
+        start = self._offsets[table]
+        size = len(next(iter(chunk.values())))
+        if start + size > self.rows[table]:
+            raise ValueError(f"{table}: строк больше, чем {self.rows[table]}")
+        for column, values in chunk.items():
+            self._columns[table][column][start:start + size] = values
+        self._offsets[table] = start + size
+
+    def close(
+        self, creators: list[str], generation: Optional[int], exported_at: str,
+        nulls: Optional[dict[str, dict[str, int]]] = None,
+    ):
+        """Сбрасывает колонки на диск и пишет словарь креаторов и meta.json (последним)"""
+        for table, columns in self._columns.items():
+            if self._offsets[table] != self.rows[table]:
+                raise ValueError(f"{table}: записано {self._offsets[table]} строк из {self.rows[table]}")
+            for values in columns.values():
+                values.flush()
+        self._columns = {}
+        with open(os.path.join(self.path, 'creators.json'), 'w', encoding='utf-8') as f:
+            json.dump(creators, f)
+        meta = {
+            'version': FORMAT_VERSION,
+            'generation': generation,
+            'exported_at': exported_at,
+            'rows': self.rows,
+            'nulls': nulls or {table: {} for table in TABLES},
+        }
+        with open(os.path.join(self.path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
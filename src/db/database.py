@@ -1,10 +1,60 @@
+from datetime import datetime
+from itertools import cycle
+from typing import Optional
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy import text
 from sqlalchemy.orm import declarative_base
-from src.config import DATABASE_URL
+from src.config import (
+    DATABASE_URL,
+    DATABASE_REPLICA_URLS,
+    DB_MAX_OVERFLOW,
+    DB_POOL_PRE_PING,
+    DB_POOL_RECYCLE,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_STATEMENT_CACHE_SIZE,
+)
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+
+def _create_engine(url: str):
+    return create_async_engine(
+        url,
+        echo=False,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        pool_timeout=DB_POOL_TIMEOUT,
+        connect_args={
+            # Кэш asyncpg и кэш диалекта SQLAlchemy поверх него
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        },
+    )
+
+
+# Основная БД: запись (загрузчик) и служебные чтения
+engine = _create_engine(DATABASE_URL)
 async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+# Реплики для запросов бота; без реплик чтение идет в основную БД
+replica_engines = [_create_engine(url) for url in DATABASE_REPLICA_URLS]
+_read_session_makers = cycle(
+    [async_sessionmaker(e, class_=AsyncSession, expire_on_commit=False) for e in replica_engines]
+    or [async_session_maker]
+)
+
+
+def read_session_maker() -> async_sessionmaker:
+    """Фабрика сессий для только читающих запросов (реплики по кругу)"""
+    return next(_read_session_makers)
+
+
+async def close_db():
+    """Закрывает пулы соединений всех движков"""
+    for e in [engine, *replica_engines]:
+        await e.dispose()
+
 
 async def get_db() -> AsyncSession:
     async with async_session_maker() as session:
@@ -17,3 +67,45 @@ async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
+
+BUMP_DATA_GENERATION_SQL = (
+    "INSERT INTO data_generation (id, generation, updated_at) VALUES (1, 1, now()) "
+    "ON CONFLICT (id) DO UPDATE SET generation = data_generation.generation + 1, updated_at = now()"
+)
+
+
+_MARK_ROLLUPS_STALE_SQL = (
+    "UPDATE data_generation SET rollups_stale_from = LEAST(rollups_stale_from, {start}), "
+    "rollups_stale_to = GREATEST(rollups_stale_to, {end}) WHERE id = 1"
+)
+# Для asyncpg: $1, $2 - минимальное и максимальное created_at записанных замеров
+MARK_ROLLUPS_STALE_SQL = _MARK_ROLLUPS_STALE_SQL.format(start='$1', end='$2')
+
+
+async def bump_data_generation(
+    session: AsyncSession, start: Optional[datetime] = None, end: Optional[datetime] = None,
+):
+    """
+    Увеличивает счетчик поколений данных в текущей транзакции.
+    Вызывается перед каждым коммитом загрузчика, чтобы сбросить кэш результатов.
+    start/end - интервал записанных замеров: агрегаты за него отмечаются устаревшими
+    до пересчета (scripts/load_data.py), и бот не перенаправляет в них запросы.
+    """
+    await session.execute(text(BUMP_DATA_GENERATION_SQL))
+    if start is not None and end is not None:
+        await session.execute(
+            text(_MARK_ROLLUPS_STALE_SQL.format(start=':start', end=':end')), {'start': start, 'end': end},
+        )
+
+
+async def fetch_data_generation(session: AsyncSession) -> int:
+    """Возвращает текущее поколение данных (0, если загрузок еще не было)"""
+    result = await session.execute(text("SELECT generation FROM data_generation WHERE id = 1"))
+    value = result.scalar()
+    return int(value) if value is not None else 0
+
+
+async def fetch_rollups_stale(session: AsyncSession) -> bool:
+    """Есть ли замеры, загруженные после последнего пересчета агрегатов"""
+    result = await session.execute(text("SELECT rollups_stale_from FROM data_generation WHERE id = 1"))
+    return result.scalar() is not None
@@ -0,0 +1,91 @@
+"""
+Ограничения ресурсов для SQL запросов бота
+
+Каждый запрос выполняется в read-only транзакции с локальными statement_timeout
+и work_mem, поэтому зависший запрос отменяется сервером и соединение
+возвращается в пул. Перед выполнением SQL от LLM проверяется оценка
+стоимости плана (EXPLAIN).
+"""
+import json
+from typing import Any, Optional
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.config import QUERY_MAX_COST, QUERY_STATEMENT_TIMEOUT_MS, QUERY_WORK_MEM
+from src.db.database import fetch_data_generation
+from src.metrics import span
+
+_SET_LIMITS_SQL = text(
+    "SELECT set_config('statement_timeout', :timeout, true), set_config('work_mem', :work_mem, true)"
+)
+
+
+class QueryCostExceeded(Exception):
+    """Оценка стоимости плана превышает допустимый порог"""
+
+    def __init__(self, cost: float, limit: float):
+        super().__init__(f"Оценка стоимости плана {cost:,.0f} превышает порог {limit:,.0f}")
+        self.cost = cost
+        self.limit = limit
+
+
+def error_sqlstate(error: DBAPIError) -> str:
+    """SQLSTATE ошибки asyncpg (пустая строка, если ошибка возникла не на сервере)"""
+    cause = getattr(error.orig, '__cause__', None)
+    return getattr(cause, 'sqlstate', None) or ''
+
+
+async def estimate_cost(session: AsyncSession, sql: str, params: Optional[dict] = None) -> float:
+    """Оценка полной стоимости плана без выполнения запроса"""
+    result = await session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params or {})
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return float(plan[0]['Plan']['Total Cost'])
+
+
+async def run_guarded(
+    session: AsyncSession,
+    sql: str,
+    max_cost: Optional[float] = QUERY_MAX_COST,
+    timeout_ms: int = QUERY_STATEMENT_TIMEOUT_MS,
+    work_mem: str = QUERY_WORK_MEM,
+    params: Optional[dict] = None,
+    with_generation: bool = False,
+) -> Optional[Any]:
+    """
+    Выполняет запрос с ограничениями и возвращает первую строку результата
+
+    Args:
+        max_cost: Порог стоимости плана; None или 0 - не проверять
+        params: Значения параметров :name в sql (см. src/sql/parameterize.py)
+        with_generation: Вернуть (строка, поколение данных); поколение читается в том же
+            снимке REPEATABLE READ, что и результат (на реплике - с ее отставанием)
+
+    Raises:
+        QueryCostExceeded: если оценка стоимости выше max_cost
+    """
+    async with session.begin():
+        # Соединение из пула (или реплики) берется здесь, чтобы ожидание пула было видно отдельно
+        with span("db_acquire"):
+            await session.connection()
+
+        # Должно быть первым оператором транзакции
+        if with_generation:
+            await session.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY"))
+        else:
+            await session.execute(text("SET TRANSACTION READ ONLY"))
+        await session.execute(_SET_LIMITS_SQL, {'timeout': str(timeout_ms), 'work_mem': work_mem})
+
+        if max_cost:
+            with span("db_explain"):
+                cost = await estimate_cost(session, sql, params)
+            if cost > max_cost:
+                raise QueryCostExceeded(cost, max_cost)
+
+        with span("db_execute"):
+            result = await session.execute(text(sql), params or {})
+            row = result.fetchone()
+        if with_generation:
+            return row, await fetch_data_generation(session)
+        return row
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, BigInteger, DateTime, ForeignKey, String
+from sqlalchemy import Column, Integer, BigInteger, Date, DateTime, ForeignKey, String
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -23,7 +23,9 @@ class Video(Base):
 
 
 class VideoSnapshot(Base):
+    """Почасовой замер статистики; таблица секционирована по created_at (см. src/db/partitions.py)"""
     __tablename__ = "video_snapshots"
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
 
     id = Column(String, primary_key=True)
     video_id = Column(String, ForeignKey("videos.id"), nullable=False, index=True)
@@ -35,8 +37,56 @@ class VideoSnapshot(Base):
     delta_likes_count = Column(BigInteger, default=0)
     delta_comments_count = Column(BigInteger, default=0)
     delta_reports_count = Column(BigInteger, default=0)
-    created_at = Column(DateTime, nullable=False, index=True)
+    # Ключ секционирования обязан входить в первичный ключ
+    created_at = Column(DateTime, primary_key=True, nullable=False, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     video = relationship("Video", back_populates="snapshots")
 
+
+class DataGeneration(Base):
+    """Счетчик поколений данных: загрузчик увеличивает его при каждом коммите"""
+    __tablename__ = "data_generation"
+
+    id = Column(Integer, primary_key=True)
+    generation = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Интервал замеров, загруженных после последнего пересчета агрегатов (NULL - агрегаты актуальны)
+    rollups_stale_from = Column(DateTime, nullable=True)
+    rollups_stale_to = Column(DateTime, nullable=True)
+
+
+class SnapshotRollupHourly(Base):
+    """Почасовые суммы приращений и число видео по креатору (заполняется загрузчиком)"""
+    __tablename__ = "snapshot_rollup_hourly"
+
+    bucket = Column(DateTime, primary_key=True)
+    creator_id = Column(String, primary_key=True)
+    delta_views_count = Column(BigInteger, nullable=False, default=0)
+    delta_likes_count = Column(BigInteger, nullable=False, default=0)
+    delta_comments_count = Column(BigInteger, nullable=False, default=0)
+    delta_reports_count = Column(BigInteger, nullable=False, default=0)
+    snapshots_count = Column(BigInteger, nullable=False, default=0)
+    videos_count = Column(BigInteger, nullable=False, default=0)
+    videos_with_views_growth = Column(BigInteger, nullable=False, default=0)
+    videos_with_likes_growth = Column(BigInteger, nullable=False, default=0)
+    videos_with_comments_growth = Column(BigInteger, nullable=False, default=0)
+    videos_with_reports_growth = Column(BigInteger, nullable=False, default=0)
+
+
+class SnapshotRollupDaily(Base):
+    """Дневные суммы приращений и число видео по креатору (заполняется загрузчиком)"""
+    __tablename__ = "snapshot_rollup_daily"
+
+    day = Column(Date, primary_key=True)
+    creator_id = Column(String, primary_key=True)
+    delta_views_count = Column(BigInteger, nullable=False, default=0)
+    delta_likes_count = Column(BigInteger, nullable=False, default=0)
+    delta_comments_count = Column(BigInteger, nullable=False, default=0)
+    delta_reports_count = Column(BigInteger, nullable=False, default=0)
+    snapshots_count = Column(BigInteger, nullable=False, default=0)
+    videos_count = Column(BigInteger, nullable=False, default=0)
+    videos_with_views_growth = Column(BigInteger, nullable=False, default=0)
+    videos_with_likes_growth = Column(BigInteger, nullable=False, default=0)
+    videos_with_comments_growth = Column(BigInteger, nullable=False, default=0)
+    videos_with_reports_growth = Column(BigInteger, nullable=False, default=0)
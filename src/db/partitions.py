@@ -0,0 +1,141 @@
+"""
+Партиции таблицы video_snapshots по диапазонам created_at
+
+Таблица секционирована по месяцам или дням (SNAPSHOT_PARTITION_INTERVAL).
+Партиции создаются заранее перед записью пачки, старые - отсоединяются
+целиком без удаления строк по одной.
+"""
+import re
+from datetime import date, datetime, timedelta
+from typing import Awaitable, Callable, Optional
+from src.config import SNAPSHOT_PARTITION_INTERVAL
+
+PARENT_TABLE = 'video_snapshots'
+INTERVALS = ('month', 'day')
+
+LIST_PARTITIONS_SQL = """
+SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = 'video_snapshots'::regclass
+ORDER BY c.relname
+"""
+
+_BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def partition_start(value: datetime, interval: str = SNAPSHOT_PARTITION_INTERVAL) -> date:
+    """Начало партиции, в которую попадает момент времени"""
+    if interval == 'month':
+        return value.date().replace(day=1)
+    if interval == 'day':
+        return value.date()
+    raise ValueError(f"Неизвестный интервал партиций: {interval}")
+
+
+def next_partition_start(start: date, interval: str = SNAPSHOT_PARTITION_INTERVAL) -> date:
+    if interval == 'month':
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start + timedelta(days=1)
+
+
+def partition_name(start: date, interval: str = SNAPSHOT_PARTITION_INTERVAL) -> str:
+    if interval == 'month':
+        return f"{PARENT_TABLE}_p{start:%Y_%m}"
+    return f"{PARENT_TABLE}_p{start:%Y_%m_%d}"
+
+
+def partitions_for_range(
+    start: datetime, end: datetime, interval: str = SNAPSHOT_PARTITION_INTERVAL
+) -> list[tuple[str, date, date]]:
+    """Партиции (имя, начало, конец), покрывающие замеры с start по end включительно"""
+    partitions = []
+    lower = partition_start(start, interval)
+    last = partition_start(end, interval)
+    while lower <= last:
+        upper = next_partition_start(lower, interval)
+        partitions.append((partition_name(lower, interval), lower, upper))
+        lower = upper
+    return partitions
+
+
+def create_partition_sql(name: str, lower: date, upper: date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+    )
+
+
+def parse_partition_bound(bound: str) -> Optional[tuple[datetime, datetime]]:
+    """Разбирает 'FOR VALUES FROM (...) TO (...)' из pg_get_expr"""
+    m = _BOUND_RE.search(bound or '')
+    if not m:
+        return None
+    return datetime.fromisoformat(m.group(1)), datetime.fromisoformat(m.group(2))
+
+
+class PartitionManager:
+    """
+    Создает недостающие партиции перед записью.
+
+    Уже созданные в этом процессе партиции запоминаются, поэтому DDL
+    выполняется только при первом попадании в новый месяц (день).
+    """
+
+    def __init__(self, interval: str = SNAPSHOT_PARTITION_INTERVAL):
+        if interval not in INTERVALS:
+            raise ValueError(f"Неизвестный интервал партиций: {interval}")
+        self.interval = interval
+        self._known: set[str] = set()
+        self.created = 0
+
+    async def ensure(
+        self,
+        execute: Callable[[str], Awaitable],
+        start: Optional[datetime],
+        end: Optional[datetime],
+    ):
+        """
+        Создает партиции для замеров в [start, end].
+
+        Args:
+            execute: Корутина выполнения DDL вне транзакции пачки
+                (например, asyncpg.Connection.execute), чтобы откат пачки
+                не откатывал созданную партицию
+        """
+        if start is None or end is None:
+            return
+        for name, lower, upper in partitions_for_range(start, end, self.interval):
+            if name in self._known:
+                continue
+            await execute(create_partition_sql(name, lower, upper))
+            self._known.add(name)
+            self.created += 1
+
+
+async def list_partitions(conn) -> list[tuple[str, datetime, datetime]]:
+    """Партиции video_snapshots (имя, начало, конец) через asyncpg соединение"""
+    partitions = []
+    for name, bound in await conn.fetch(LIST_PARTITIONS_SQL):
+        parsed = parse_partition_bound(bound)
+        if parsed is not None:
+            partitions.append((name, *parsed))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+async def detach_partitions_before(conn, cutoff: datetime, drop: bool = False) -> list[str]:
+    """
+    Отсоединяет партиции, целиком лежащие раньше cutoff
+
+    Отсоединенная партиция остается обычной таблицей (ее можно выгрузить
+    или удалить позже); с drop=True она сразу удаляется.
+    """
+    detached = []
+    for name, _, upper in await list_partitions(conn):
+        if upper > cutoff:
+            continue
+        await conn.execute(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}")
+        if drop:
+            await conn.execute(f"DROP TABLE {name}")
+        detached.append(name)
+    return detached
@@ -0,0 +1,113 @@
+"""
+Кэш результатов SQL запросов с инвалидацией по поколению данных
+"""
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+from src.config import RESULT_CACHE_ENABLED, RESULT_CACHE_SIZE, RESULT_CACHE_GENERATION_CHECK_INTERVAL
+from src.db.database import async_session_maker, fetch_data_generation
+
+logger = logging.getLogger(__name__)
+
+_QUOTED_RE = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+_SPACE_AROUND_PUNCT_RE = re.compile(r'\s*([(),=<>!+*/-])\s*')
+
+
+def canonicalize_sql(sql: str) -> str:
+    """
+    Приводит SQL к канонической форме для ключа кэша:
+    регистр и пробелы вне строковых литералов не важны, ';' в конце отбрасывается
+    """
+    parts = _QUOTED_RE.split(sql.strip().rstrip(';'))
+    canonical = []
+    for i, part in enumerate(parts):
+        # Нечетные элементы - литералы в кавычках, их не трогаем
+        if i % 2 == 1:
+            canonical.append(part)
+            continue
+        part = re.sub(r'\s+', ' ', part.lower())
+        canonical.append(_SPACE_AROUND_PUNCT_RE.sub(r'\1', part))
+    return ''.join(canonical).strip()
+
+
+class QueryResultCache:
+    """
+    LRU кэш результатов запросов.
+
+    Все записи принадлежат одному поколению данных. Поколение читается из
+    таблицы data_generation не чаще, чем раз в check_interval секунд;
+    при его изменении (загрузчик закоммитил новые данные) кэш очищается.
+    """
+
+    def __init__(
+        self,
+        max_size: int = RESULT_CACHE_SIZE,
+        check_interval: float = RESULT_CACHE_GENERATION_CHECK_INTERVAL,
+    ):
+        self.max_size = max_size
+        self.check_interval = check_interval
+        self._entries: OrderedDict[str, Any] = OrderedDict()
+        self._generation: Optional[int] = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def refresh_generation(self) -> Optional[int]:
+        """
+        Возвращает актуальное поколение данных, при необходимости перечитывая его из БД.
+        None означает, что поколение неизвестно и кэш использовать нельзя.
+        """
+        now = time.monotonic()
+        if self._generation is not None and now - self._checked_at < self.check_interval:
+            return self._generation
+
+        try:
+            async with async_session_maker() as session:
+                generation = await fetch_data_generation(session)
+        except Exception as e:
+            logger.warning("Не удалось получить поколение данных: %s", e)
+            self._entries.clear()
+            self._generation = None
+            return None
+
+        if generation != self._generation:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._generation = generation
+        self._checked_at = now
+        return generation
+
+    def get(self, key: str) -> tuple[bool, Any]:
+        """Возвращает (найдено, значение) для канонического SQL"""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, self._entries[key]
+        self.misses += 1
+        return False, None
+
+    def put(self, key: str, value: Any, generation: Optional[int]):
+        """Сохраняет результат, полученный при указанном поколении данных"""
+        if generation is None or generation != self._generation:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Счетчики кэша"""
+        return {
+            'size': len(self._entries),
+            'generation': self._generation,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+        }
+
+
+result_cache: Optional[QueryResultCache] = QueryResultCache() if RESULT_CACHE_ENABLED else None
@@ -0,0 +1,173 @@
+"""
+Массовая загрузка через бинарный COPY asyncpg
+
+Чтение файла идет в отдельном потоке, разбор дат и сборка строк - в пуле
+процессов, а единственный писатель выполняет COPY в videos и video_snapshots.
+Между ними ограниченная очередь, поэтому память не растет, если БД не успевает.
+"""
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Awaitable, Callable, Optional
+import asyncpg
+from src.config import DATABASE_URL
+from src.db.database import BUMP_DATA_GENERATION_SQL, MARK_ROLLUPS_STALE_SQL
+from src.db.partitions import PartitionManager
+from src.ingest.checkpoint import LoadCheckpoint
+from src.ingest.reader import iter_videos
+from src.ingest.rollups import TimeBounds
+from src.ingest.records import VIDEO_COLUMNS, SNAPSHOT_COLUMNS, snapshot_time_bounds, transform_chunk
+
+# Вторичные индексы из начальной миграции: имя -> DDL для пересоздания
+SECONDARY_INDEXES = {
+    'ix_videos_creator_id': 'CREATE INDEX IF NOT EXISTS ix_videos_creator_id ON videos (creator_id)',
+    'ix_videos_video_created_at': 'CREATE INDEX IF NOT EXISTS ix_videos_video_created_at ON videos (video_created_at)',
+    'ix_video_snapshots_video_id': 'CREATE INDEX IF NOT EXISTS ix_video_snapshots_video_id ON video_snapshots (video_id)',
+    'ix_video_snapshots_created_at': 'CREATE INDEX IF NOT EXISTS ix_video_snapshots_created_at ON video_snapshots (created_at)',
+}
+
+
+@dataclass
+class LoadStats:
+    """Итоги загрузки"""
+    videos: int = 0
+    snapshots: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    # Время замеров, затронутых загрузкой (для пересчета агрегатов)
+    time_bounds: TimeBounds = field(default_factory=TimeBounds)
+
+    @property
+    def rows_per_second(self) -> float:
+        return (self.videos + self.snapshots) / self.elapsed if self.elapsed else 0.0
+
+    def report(self, mode: str) -> str:
+        return (
+            f"[{mode}] видео: {self.videos}, снапшотов: {self.snapshots}, ошибок: {self.failed}, "
+            f"время: {self.elapsed:.1f} с, скорость: {self.rows_per_second:,.0f} строк/с"
+        )
+
+
+def asyncpg_dsn(url: str = DATABASE_URL) -> str:
+    """Преобразует SQLAlchemy URL (postgresql+asyncpg://) в DSN для asyncpg"""
+    return url.replace('postgresql+asyncpg://', 'postgresql://', 1)
+
+
+async def drop_secondary_indexes(conn: asyncpg.Connection):
+    """Удаляет вторичные индексы перед массовой загрузкой"""
+    for name in SECONDARY_INDEXES:
+        await conn.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+async def rebuild_secondary_indexes(conn: asyncpg.Connection):
+    """Пересоздает вторичные индексы и обновляет статистику планировщика"""
+    for name, ddl in SECONDARY_INDEXES.items():
+        print(f"Создание индекса {name}...")
+        await conn.execute(ddl)
+    await conn.execute('ANALYZE videos')
+    await conn.execute('ANALYZE video_snapshots')
+
+
+async def copy_chunk(
+    conn: asyncpg.Connection, videos: list[tuple], snapshots: list[tuple]
+) -> tuple[int, int]:
+    """
+    Записывает пачку строк одной транзакцией, увеличивает поколение данных
+    и отмечает агрегаты за время замеров пачки устаревшими
+    """
+    async with conn.transaction():
+        if videos:
+            await conn.copy_records_to_table('videos', records=videos, columns=VIDEO_COLUMNS)
+        if snapshots:
+            await conn.copy_records_to_table('video_snapshots', records=snapshots, columns=SNAPSHOT_COLUMNS)
+        await conn.execute(BUMP_DATA_GENERATION_SQL)
+        if snapshots:
+            await conn.execute(MARK_ROLLUPS_STALE_SQL, *snapshot_time_bounds(snapshots))
+    return len(videos), len(snapshots)
+
+
+async def bulk_load(
+    json_file: str,
+    fmt: str = 'auto',
+    chunk_size: int = 1000,
+    workers: int = 4,
+    queue_size: Optional[int] = None,
+    drop_indexes: bool = False,
+    checkpoint: Optional[LoadCheckpoint] = None,
+    resume: bool = False,
+    writer: Callable[..., Awaitable[tuple[int, int]]] = copy_chunk,
+) -> LoadStats:
+    """
+    Загружает файл через COPY
+
+    Args:
+        chunk_size: Сколько видео в одной пачке (одна транзакция COPY)
+        workers: Число процессов для разбора записей
+        queue_size: Сколько готовящихся пачек может ждать писателя (по умолчанию 2 * workers)
+        drop_indexes: Удалить вторичные индексы на время загрузки и пересоздать после
+        writer: Корутина записи пачки (conn, videos, snapshots) -> (видео, снапшоты);
+            по умолчанию - COPY без проверки конфликтов
+    """
+    stats = LoadStats()
+    partitions = PartitionManager()
+    skip = checkpoint.load() if checkpoint is not None and resume else 0
+    if skip:
+        print(f"Продолжение с контрольной точки: пропускаем {skip} уже загруженных видео")
+
+    loop = asyncio.get_running_loop()
+    videos_iter = islice(iter_videos(json_file, fmt), skip, None)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or 2 * workers)
+    processed = skip
+    started = time.perf_counter()
+
+    conn = await asyncpg.connect(asyncpg_dsn())
+    try:
+        if drop_indexes:
+            await drop_secondary_indexes(conn)
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+
+            async def produce():
+                while True:
+                    chunk = await asyncio.to_thread(lambda: list(islice(videos_iter, chunk_size)))
+                    if not chunk:
+                        break
+                    await queue.put((len(chunk), loop.run_in_executor(pool, transform_chunk, chunk)))
+                await queue.put(None)
+
+            producer = asyncio.create_task(produce())
+            try:
+                while (item := await queue.get()) is not None:
+                    count, future = item
+                    videos, snapshots, errors, bounds = await future
+                    for error in errors:
+                        print(f"Ошибка при обработке видео {error}")
+
+                    # Партиции создаются вне транзакции пачки, до COPY в родительскую таблицу
+                    await partitions.ensure(conn.execute, *bounds)
+                    videos_written, snapshots_written = await writer(conn, videos, snapshots)
+
+                    processed += count
+                    stats.videos += videos_written
+                    stats.snapshots += snapshots_written
+                    stats.failed += len(errors)
+                    stats.time_bounds.update(*bounds)
+                    if checkpoint is not None:
+                        checkpoint.save(processed)
+                    print(f"Обработано {processed} видео...")
+                await producer
+            finally:
+                if not producer.done():
+                    producer.cancel()
+
+        if checkpoint is not None:
+            checkpoint.clear()
+    finally:
+        if drop_indexes:
+            await rebuild_secondary_indexes(conn)
+        await conn.close()
+
+    stats.elapsed = time.perf_counter() - started
+    return stats
@@ -0,0 +1,52 @@
+"""
+Контрольная точка загрузки: сколько видео из файла уже обработано
+и какие пачки до этой позиции не закоммитились
+"""
+import json
+import os
+
+
+class LoadCheckpoint:
+    """
+    Хранит число закоммиченных видео для конкретного файла.
+    Если файл изменился (размер или время модификации), контрольная точка игнорируется.
+    """
+
+    def __init__(self, path: str, source_file: str):
+        self.path = path
+        stat = os.stat(source_file)
+        self.source = {
+            'file': os.path.abspath(source_file),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+        }
+
+    def _read(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if data.get('source') == self.source else {}
+
+    def load(self) -> int:
+        """Возвращает число уже загруженных видео (0, если продолжать нечего)"""
+        return int(self._read().get('committed', 0))
+
+    def load_failed(self) -> list[tuple[int, int]]:
+        """Номера видео [начало, конец) из пачек до контрольной точки, которые не закоммитились"""
+        return [(int(start), int(end)) for start, end in self._read().get('failed', [])]
+
+    def save(self, committed: int, **extra):
+        """Атомарно записывает прогресс"""
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'source': self.source, 'committed': committed, **extra}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        """Удаляет контрольную точку после успешной загрузки"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,106 @@
+"""
+Инкрементальная (идемпотентная) догрузка данных
+
+Видео обновляются через INSERT ... ON CONFLICT DO UPDATE только если изменились
+счетчики. Для снапшотов по каждому видео берется максимальный уже загруженный
+created_at, и вставляются только более новые замеры. Повторный запуск на тех же
+данных ничего не меняет и не сбрасывает кэш результатов бота.
+"""
+import asyncpg
+from src.db.database import BUMP_DATA_GENERATION_SQL, MARK_ROLLUPS_STALE_SQL
+from src.ingest.records import VIDEO_COLUMNS, SNAPSHOT_COLUMNS, snapshot_time_bounds
+
+_COUNTERS = ['views_count', 'likes_count', 'comments_count', 'reports_count']
+
+_VIDEO_COLS = ', '.join(VIDEO_COLUMNS)
+_SNAPSHOT_COLS = ', '.join(SNAPSHOT_COLUMNS)
+
+UPSERT_VIDEOS_SQL = f"""
+INSERT INTO videos ({_VIDEO_COLS})
+SELECT DISTINCT ON (id) {_VIDEO_COLS} FROM stage_videos ORDER BY id
+ON CONFLICT (id) DO UPDATE SET
+    {', '.join(f'{col} = EXCLUDED.{col}' for col in _COUNTERS)},
+    updated_at = EXCLUDED.updated_at
+WHERE ({', '.join(f'videos.{col}' for col in _COUNTERS)})
+    IS DISTINCT FROM ({', '.join(f'EXCLUDED.{col}' for col in _COUNTERS)})
+"""
+
+INSERT_SNAPSHOTS_SQL = f"""
+INSERT INTO video_snapshots ({_SNAPSHOT_COLS})
+SELECT {_SNAPSHOT_COLS} FROM stage_snapshots
+ON CONFLICT DO NOTHING
+"""
+
+HIGH_WATER_MARKS_SQL = """
+SELECT video_id, MAX(created_at) FROM video_snapshots
+WHERE video_id = ANY($1::text[])
+GROUP BY video_id
+"""
+
+_VIDEO_ID = SNAPSHOT_COLUMNS.index('video_id')
+_CREATED_AT = SNAPSHOT_COLUMNS.index('created_at')
+
+
+def _affected_rows(status: str) -> int:
+    """Число строк из статуса команды ('INSERT 0 42' -> 42)"""
+    return int(status.rsplit(' ', 1)[-1])
+
+
+class IncrementalWriter:
+    """Писатель пачек для bulk_load в режиме upsert"""
+
+    def __init__(self):
+        self._prepared = False
+        self.videos_seen = 0
+        self.snapshots_skipped = 0
+
+    async def _prepare(self, conn: asyncpg.Connection):
+        # Временные таблицы живут в рамках соединения и очищаются при каждом коммите
+        await conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS stage_videos "
+            "(LIKE videos INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+        )
+        await conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS stage_snapshots "
+            "(LIKE video_snapshots INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+        )
+        self._prepared = True
+
+    async def __call__(
+        self, conn: asyncpg.Connection, videos: list[tuple], snapshots: list[tuple]
+    ) -> tuple[int, int]:
+        """
+        Записывает пачку
+
+        Returns:
+            (вставлено или изменено видео, вставлено новых снапшотов)
+        """
+        if not self._prepared:
+            await self._prepare(conn)
+
+        async with conn.transaction():
+            video_ids = list({row[_VIDEO_ID] for row in snapshots})
+            marks = dict(await conn.fetch(HIGH_WATER_MARKS_SQL, video_ids)) if video_ids else {}
+            fresh = [
+                row for row in snapshots
+                if row[_VIDEO_ID] not in marks or row[_CREATED_AT] > marks[row[_VIDEO_ID]]
+            ]
+
+            videos_written = 0
+            snapshots_written = 0
+            if videos:
+                await conn.copy_records_to_table('stage_videos', records=videos, columns=VIDEO_COLUMNS)
+                videos_written = _affected_rows(await conn.execute(UPSERT_VIDEOS_SQL))
+            if fresh:
+                await conn.copy_records_to_table('stage_snapshots', records=fresh, columns=SNAPSHOT_COLUMNS)
+                snapshots_written = _affected_rows(await conn.execute(INSERT_SNAPSHOTS_SQL))
+
+            # Поколение данных меняем только если что-то действительно изменилось
+            if videos_written or snapshots_written:
+                await conn.execute(BUMP_DATA_GENERATION_SQL)
+            if snapshots_written:
+                await conn.execute(MARK_ROLLUPS_STALE_SQL, *snapshot_time_bounds(fresh))
+
+        self.videos_seen += len(videos)
+        self.snapshots_skipped += len(snapshots) - snapshots_written
+        return videos_written, snapshots_written
@@ -0,0 +1,190 @@
+"""
+Потоковое чтение JSON с видео: по одной записи за раз, без загрузки файла целиком
+
+Поддерживаемые форматы:
+- массив видео верхнего уровня: [{...}, {...}]
+- объект с ключом 'videos': {"videos": [{...}, ...]}
+- NDJSON: по одному объекту видео в строке
+Любой из них может быть сжат gzip.
+"""
+import gzip
+import json
+import os
+import re
+from typing import Iterator, TextIO
+
+FORMATS = ('auto', 'array', 'object', 'ndjson')
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+# Поля, с которых начинается объект видео (признак NDJSON при автоопределении)
+VIDEO_FIELDS = ('id', 'creator_id', 'video_created_at', 'snapshots')
+# Запись длиннее этого (в символах) считается поврежденной: иначе буфер рос бы до конца файла
+MAX_RECORD_SIZE = 64 << 20
+
+_decoder = json.JSONDecoder()
+_FIRST_KEY_RE = re.compile(r'\{\s*"([^"\\]*)"')
+
+
+class _StreamBuffer:
+    """Буфер над текстовым файлом, из которого JSON значения читаются по одному"""
+
+    def __init__(self, f: TextIO, chunk_size: int = 1 << 20, max_record_size: int = MAX_RECORD_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.max_record_size = max_record_size
+        self.buf = ''
+        self.pos = 0
+        # Сколько символов файла уже отброшено из буфера (для позиций в ошибках)
+        self.offset = 0
+        self.eof = False
+
+    @property
+    def position(self) -> int:
+        """Позиция разбора от начала файла (в символах)"""
+        return self.offset + self.pos
+
+    def _fill(self, min_size: int = 0) -> bool:
+        """Дочитывает данные в буфер, отбрасывая уже разобранную часть"""
+        if self.eof:
+            return False
+        if self.pos:
+            self.buf = self.buf[self.pos:]
+            self.offset += self.pos
+            self.pos = 0
+        chunk = self.f.read(max(self.chunk_size, min_size))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf += chunk
+        return True
+
+    def peek(self) -> str:
+        """Возвращает следующий значимый символ (пропуская пробелы) или '' в конце файла"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Ожидался символ '{char}' в позиции {self.position}")
+        self.pos += 1
+
+    def decode(self):
+        """Декодирует следующее JSON значение, дочитывая файл, пока значение не станет полным"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                # Число в конце буфера могло быть обрезано - дочитываем и повторяем
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if len(self.buf) - self.pos > self.max_record_size:
+                raise ValueError(
+                    f"Запись в позиции {self.position} не закончилась за {self.max_record_size:,} символов "
+                    "(поврежденный JSON?)"
+                )
+            if not self._fill(min_size=len(self.buf)):
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                self.pos = end
+                return value
+
+    def iter_array(self) -> Iterator:
+        """Итерирует элементы массива, начинающегося в текущей позиции"""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.decode()
+            char = self.peek()
+            self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f"Ожидался ',' или ']' в позиции {self.position - 1}")
+
+
+def open_text(path: str) -> TextIO:
+    """Открывает файл как текст, прозрачно распаковывая gzip"""
+    with open(path, 'rb') as f:
+        magic = f.read(2)
+    if magic == b'\x1f\x8b':
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def _detect_format(path: str, stream: _StreamBuffer) -> str:
+    name = path[:-3] if path.endswith('.gz') else path
+    if os.path.splitext(name)[1].lower() in NDJSON_EXTENSIONS:
+        return 'ndjson'
+
+    char = stream.peek()
+    if char == '[':
+        return 'array'
+    if char != '{':
+        raise ValueError(f"Неизвестный формат файла {path}")
+
+    # Смотрим на первый ключ, не сдвигая позицию разбора
+    while len(stream.buf) - stream.pos < 4096 and stream._fill():
+        pass
+    m = _FIRST_KEY_RE.match(stream.buf, stream.pos)
+    first_key = m.group(1) if m else None
+    return 'ndjson' if first_key in VIDEO_FIELDS else 'object'
+
+
+def _iter_object_videos(stream: _StreamBuffer) -> Iterator[dict]:
+    stream.expect('{')
+    if stream.peek() == '}':
+        return
+    while True:
+        key = stream.decode()
+        stream.expect(':')
+        if key == 'videos':
+            yield from stream.iter_array()
+        else:
+            stream.decode()
+        char = stream.peek()
+        stream.pos += 1
+        if char == '}':
+            return
+        if char != ',':
+            raise ValueError(f"Ожидался ',' или '}}' в позиции {stream.position - 1}")
+
+
+def iter_videos(
+    path: str, fmt: str = 'auto', chunk_size: int = 1 << 20, max_record_size: int = MAX_RECORD_SIZE,
+) -> Iterator[dict]:
+    """
+    Последовательно возвращает объекты видео (вместе с вложенными snapshots)
+
+    Args:
+        path: Путь к файлу (.json, .ndjson/.jsonl, опционально .gz)
+        fmt: 'auto', 'array', 'object' или 'ndjson'
+        chunk_size: Размер блока чтения в символах
+        max_record_size: Максимальная длина одной записи в символах
+
+    Raises:
+        ValueError: поврежденный JSON или запись длиннее max_record_size
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат: {fmt}")
+
+    with open_text(path) as f:
+        stream = _StreamBuffer(f, chunk_size, max_record_size)
+        if fmt == 'auto':
+            fmt = _detect_format(path, stream)
+
+        if fmt == 'array':
+            yield from stream.iter_array()
+        elif fmt == 'object':
+            yield from _iter_object_videos(stream)
+        else:
+            while stream.peek():
+                yield stream.decode()
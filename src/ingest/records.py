@@ -0,0 +1,107 @@
+"""
+Преобразование JSON записей видео в кортежи строк таблиц videos и video_snapshots
+
+Функции модуля выполняются в процессах-обработчиках, поэтому они
+не зависят от ORM и соединения с БД.
+"""
+from datetime import datetime
+from typing import Optional
+
+VIDEO_COLUMNS = [
+    'id', 'creator_id', 'video_created_at',
+    'views_count', 'likes_count', 'comments_count', 'reports_count',
+    'created_at', 'updated_at',
+]
+
+SNAPSHOT_COLUMNS = [
+    'id', 'video_id',
+    'views_count', 'likes_count', 'comments_count', 'reports_count',
+    'delta_views_count', 'delta_likes_count', 'delta_comments_count', 'delta_reports_count',
+    'created_at', 'updated_at',
+]
+
+_SNAPSHOT_CREATED_AT = SNAPSHOT_COLUMNS.index('created_at')
+
+
+def parse_datetime(dt_str: str) -> datetime:
+    """Парсит строку даты в datetime объект (без timezone)"""
+    try:
+        dt = datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
+        # Убираем timezone для PostgreSQL TIMESTAMP WITHOUT TIME ZONE
+        if dt.tzinfo is not None:
+            dt = dt.replace(tzinfo=None)
+        return dt
+    except:
+        dt = datetime.fromisoformat(dt_str)
+        if dt.tzinfo is not None:
+            dt = dt.replace(tzinfo=None)
+        return dt
+
+
+def video_record(video_data: dict) -> tuple:
+    """Строка таблицы videos в порядке VIDEO_COLUMNS"""
+    return (
+        video_data['id'],
+        video_data['creator_id'],
+        parse_datetime(video_data['video_created_at']),
+        video_data.get('views_count', 0),
+        video_data.get('likes_count', 0),
+        video_data.get('comments_count', 0),
+        video_data.get('reports_count', 0),
+        parse_datetime(video_data.get('created_at', video_data['video_created_at'])),
+        parse_datetime(video_data.get('updated_at', video_data['video_created_at'])),
+    )
+
+
+def snapshot_records(video_data: dict) -> list[tuple]:
+    """Строки таблицы video_snapshots в порядке SNAPSHOT_COLUMNS"""
+    records = []
+    for snapshot_data in video_data.get('snapshots', []):
+        records.append((
+            snapshot_data['id'],
+            video_data['id'],
+            snapshot_data.get('views_count', 0),
+            snapshot_data.get('likes_count', 0),
+            snapshot_data.get('comments_count', 0),
+            snapshot_data.get('reports_count', 0),
+            snapshot_data.get('delta_views_count', 0),
+            snapshot_data.get('delta_likes_count', 0),
+            snapshot_data.get('delta_comments_count', 0),
+            snapshot_data.get('delta_reports_count', 0),
+            parse_datetime(snapshot_data['created_at']),
+            parse_datetime(snapshot_data.get('updated_at', snapshot_data['created_at'])),
+        ))
+    return records
+
+
+def snapshot_time_bounds(snapshots: list[tuple]) -> tuple[Optional[datetime], Optional[datetime]]:
+    """Минимальное и максимальное created_at среди строк снапшотов"""
+    if not snapshots:
+        return None, None
+    times = [row[_SNAPSHOT_CREATED_AT] for row in snapshots]
+    return min(times), max(times)
+
+
+def transform_chunk(
+    chunk: list[dict],
+) -> tuple[list[tuple], list[tuple], list[str], tuple[Optional[datetime], Optional[datetime]]]:
+    """
+    Преобразует пачку видео в строки для COPY
+
+    Returns:
+        (строки videos, строки video_snapshots, ошибки по видео, которые не удалось разобрать,
+         (минимальное, максимальное) время замеров)
+    """
+    videos = []
+    snapshots = []
+    errors = []
+    for video_data in chunk:
+        try:
+            video = video_record(video_data)
+            video_snapshots = snapshot_records(video_data)
+        except Exception as e:
+            errors.append(f"{video_data.get('id', 'unknown')}: {e}")
+            continue
+        videos.append(video)
+        snapshots.extend(video_snapshots)
+    return videos, snapshots, errors, snapshot_time_bounds(snapshots)
@@ -0,0 +1,109 @@
+"""
+Пересчет предагрегированных таблиц snapshot_rollup_hourly и snapshot_rollup_daily
+
+Агрегаты пересчитываются целыми днями: удаляются и заново вставляются все
+строки за дни, которые затронула загрузка. Каждая пачка загрузчика в своей
+транзакции расширяет интервал устаревших агрегатов в data_generation; пока он
+не пуст, бот не перенаправляет запросы в агрегаты. Пересчет захватывает и этот
+интервал, поэтому дни, записанные прерванной загрузкой, тоже пересчитываются.
+"""
+from datetime import date, datetime, timedelta
+from typing import Optional
+import asyncpg
+from src.db.database import BUMP_DATA_GENERATION_SQL
+
+METRICS = ('views', 'likes', 'comments', 'reports')
+
+ROLLUP_COLUMNS = (
+    [f'delta_{metric}_count' for metric in METRICS]
+    + ['snapshots_count', 'videos_count']
+    + [f'videos_with_{metric}_growth' for metric in METRICS]
+)
+
+_AGGREGATES = ',\n    '.join(
+    [f'COALESCE(SUM(vs.delta_{metric}_count), 0)' for metric in METRICS]
+    + ['COUNT(*)', 'COUNT(DISTINCT vs.video_id)']
+    + [f'COUNT(DISTINCT vs.video_id) FILTER (WHERE vs.delta_{metric}_count > 0)' for metric in METRICS]
+)
+
+
+def _refresh_sql(table: str, key: str, bucket_expr: str) -> tuple[str, str]:
+    delete_sql = f"DELETE FROM {table} WHERE {key} >= $1 AND {key} < $2"
+    insert_sql = f"""
+INSERT INTO {table} ({key}, creator_id, {', '.join(ROLLUP_COLUMNS)})
+SELECT
+    {bucket_expr},
+    v.creator_id,
+    {_AGGREGATES}
+FROM video_snapshots vs
+JOIN videos v ON vs.video_id = v.id
+WHERE vs.created_at >= $1 AND vs.created_at < $2
+GROUP BY 1, 2
+"""
+    return delete_sql, insert_sql
+
+
+HOURLY_SQL = _refresh_sql('snapshot_rollup_hourly', 'bucket', "date_trunc('hour', vs.created_at)")
+DAILY_SQL = _refresh_sql('snapshot_rollup_daily', 'day', 'vs.created_at::date')
+
+
+class TimeBounds:
+    """Минимальное и максимальное время замеров, затронутых загрузкой"""
+
+    def __init__(self):
+        self.start: Optional[datetime] = None
+        self.end: Optional[datetime] = None
+
+    def update(self, start: Optional[datetime], end: Optional[datetime]):
+        if start is not None and (self.start is None or start < self.start):
+            self.start = start
+        if end is not None and (self.end is None or end > self.end):
+            self.end = end
+
+    def days(self) -> Optional[tuple[date, date]]:
+        """Полуоткрытый интервал затронутых дней [первый, последний + 1)"""
+        if self.start is None or self.end is None:
+            return None
+        return self.start.date(), self.end.date() + timedelta(days=1)
+
+
+async def refresh_rollups(
+    conn: asyncpg.Connection, days: Optional[tuple[date, date]] = None,
+) -> Optional[tuple[date, date]]:
+    """
+    Пересчитывает агрегаты за дни [first_day, end_day) и за интервал, отмеченный
+    устаревшим, одной транзакцией
+
+    Returns:
+        Пересчитанные дни или None, если пересчитывать нечего
+    """
+    async with conn.transaction():
+        # Блокировка строки: пачки загрузчика ждут конца пересчета и отметят свои дни заново
+        stale = await conn.fetchrow(
+            "SELECT rollups_stale_from, rollups_stale_to FROM data_generation WHERE id = 1 FOR UPDATE"
+        )
+        bounds = TimeBounds()
+        if stale is not None:
+            bounds.update(stale['rollups_stale_from'], stale['rollups_stale_to'])
+        stale_days = bounds.days()
+        if days is not None:
+            first_day, end_day = days
+            if stale_days is not None:
+                first_day, end_day = min(first_day, stale_days[0]), max(end_day, stale_days[1])
+        elif stale_days is not None:
+            first_day, end_day = stale_days
+        else:
+            return None
+
+        start = datetime.combine(first_day, datetime.min.time())
+        end = datetime.combine(end_day, datetime.min.time())
+        await conn.execute(HOURLY_SQL[0], start, end)
+        await conn.execute(HOURLY_SQL[1], start, end)
+        await conn.execute(DAILY_SQL[0], first_day, end_day)
+        await conn.execute(DAILY_SQL[1], start, end)
+        await conn.execute(
+            "UPDATE data_generation SET rollups_stale_from = NULL, rollups_stale_to = NULL WHERE id = 1"
+        )
+        # Результаты, посчитанные по старым агрегатам, больше не актуальны
+        await conn.execute(BUMP_DATA_GENERATION_SQL)
+    return first_day, end_day
@@ -0,0 +1,163 @@
+"""
+Каскад моделей для генерации SQL
+
+Модели перечисляются в OLLAMA_MODEL_TIERS от быстрой к сильной. В режиме
+sequential вопрос сначала получает быстрая модель; если из ее ответа не
+извлекся SQL, он не прошел валидацию или PostgreSQL не смог построить план
+(EXPLAIN), вопрос передается следующей модели. В режиме speculative все
+модели запускаются сразу и берется первый годный ответ, остальные генерации
+отменяются. Ответ последней модели принимается без EXPLAIN: передать его
+больше некому, а ошибку выполнения бот и так покажет.
+
+По каждой модели считаются время ответа, исходы и доля передач дальше.
+"""
+import asyncio
+import logging
+import time
+from collections import Counter as CounterDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from src.config import CASCADE_EXPLAIN_CHECK, CASCADE_MODE, OLLAMA_MODEL_TIERS
+from src.db.database import read_session_maker
+from src.db.guard import error_sqlstate, estimate_cost
+from src.metrics import DEFAULT_BUCKETS, registry
+
+logger = logging.getLogger(__name__)
+
+TIER_SECONDS = registry.histogram(
+    'bot_llm_tier_duration_seconds', 'Время ответа модели каскада по исходу', ('model', 'result'),
+    buckets=DEFAULT_BUCKETS + (120,),
+)
+ESCALATIONS = registry.counter(
+    'bot_llm_escalations_total', 'Передачи вопроса следующей модели каскада по причине', ('model', 'reason'),
+)
+ANSWERS = registry.counter('bot_llm_answers_total', 'Сгенерированные SQL по модели, давшей ответ', ('model',))
+
+# Модель -> (SQL или None, исход: ok, no_sql, invalid, timeout, connect, http_status, error)
+AskModel = Callable[[str], Awaitable[tuple[Optional[str], str]]]
+
+
+@dataclass
+class _Attempt:
+    model: str
+    sql: Optional[str]
+    result: str
+
+
+async def explain_error(sql: str) -> Optional[str]:
+    """
+    Ошибка построения плана запроса (неизвестная колонка, неверный литерал и т.п.).
+    None - план построен или БД недоступна (это не повод звать другую модель).
+    """
+    try:
+        async with read_session_maker()() as session:
+            async with session.begin():
+                await session.execute(text("SET TRANSACTION READ ONLY"))
+                await estimate_cost(session, sql)
+    except DBAPIError as e:
+        if error_sqlstate(e)[:2] in ('22', '42'):
+            return str(e.orig)
+    except Exception as e:
+        logger.debug("EXPLAIN не выполнен: %s", e)
+    return None
+
+
+class ModelCascade:
+    """Генерация SQL по цепочке моделей с учетом времени и передач по каждой модели"""
+
+    def __init__(
+        self,
+        tiers: list[str] = OLLAMA_MODEL_TIERS,
+        mode: str = CASCADE_MODE,
+        explain_check: bool = CASCADE_EXPLAIN_CHECK,
+    ):
+        self.tiers = tiers
+        self.mode = mode
+        self.explain_check = explain_check
+        self.attempts: CounterDict[str] = CounterDict()
+        self.answered: CounterDict[str] = CounterDict()
+        self.escalated: CounterDict[str] = CounterDict()
+        self.cancelled: CounterDict[str] = CounterDict()
+        self.seconds: CounterDict[str] = CounterDict()
+
+    async def _attempt(self, ask: AskModel, model: str, final: bool) -> _Attempt:
+        """Один вызов модели с проверкой плана (кроме последней модели)"""
+        self.attempts[model] += 1
+        started = time.perf_counter()
+        result = 'cancelled'
+        try:
+            sql, result = await ask(model)
+            if sql and self.explain_check and not final:
+                error = await explain_error(sql)
+                if error is not None:
+                    logger.info("План SQL не построен", extra={'model': model, 'sql': sql, 'error': error})
+                    sql, result = None, 'explain'
+            return _Attempt(model, sql, result)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.seconds[model] += elapsed
+            TIER_SECONDS.observe(elapsed, model=model, result=result)
+            if result == 'cancelled':
+                self.cancelled[model] += 1
+
+    def _escalate(self, attempt: _Attempt):
+        self.escalated[attempt.model] += 1
+        ESCALATIONS.inc(model=attempt.model, reason=attempt.result)
+        logger.info("Вопрос передан следующей модели", extra={'model': attempt.model, 'reason': attempt.result})
+
+    def _accept(self, attempt: _Attempt) -> str:
+        self.answered[attempt.model] += 1
+        ANSWERS.inc(model=attempt.model)
+        return attempt.sql
+
+    async def generate(self, ask: AskModel) -> Optional[str]:
+        """SQL от первой модели, давшей годный ответ, или None"""
+        if self.mode == 'speculative' and len(self.tiers) > 1:
+            return await self._speculative(ask)
+
+        for i, model in enumerate(self.tiers):
+            attempt = await self._attempt(ask, model, final=i == len(self.tiers) - 1)
+            if attempt.sql:
+                return self._accept(attempt)
+            if i < len(self.tiers) - 1:
+                self._escalate(attempt)
+        return None
+
+    async def _speculative(self, ask: AskModel) -> Optional[str]:
+        last = len(self.tiers) - 1
+        tasks = [
+            asyncio.create_task(self._attempt(ask, model, final=i == last)) for i, model in enumerate(self.tiers)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                attempt = await next_done
+                if attempt.sql:
+                    return self._accept(attempt)
+                if attempt.model != self.tiers[last]:
+                    self._escalate(attempt)
+            return None
+        finally:
+            # Генерации, которые уже не нужны, отменяются (Ollama прекращает их при закрытии соединения)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        tiers = {}
+        for model in self.tiers:
+            attempts = self.attempts[model]
+            finished = attempts - self.cancelled[model]
+            tiers[model] = {
+                'attempts': attempts,
+                'answered': self.answered[model],
+                'escalated': self.escalated[model],
+                'cancelled': self.cancelled[model],
+                'escalation_rate': round(self.escalated[model] / finished, 3) if finished else 0.0,
+                'avg_ms': round(self.seconds[model] / attempts * 1000, 1) if attempts else 0.0,
+            }
+        return {'mode': self.mode, 'tiers': tiers}
+
+
+model_cascade = ModelCascade()
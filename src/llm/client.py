@@ -0,0 +1,142 @@
+"""
+Долгоживущий HTTP клиент для Ollama с пулом соединений и ограничением параллелизма
+"""
+import asyncio
+import json
+from typing import Callable, Optional
+import httpx
+from src.config import (
+    OLLAMA_BASE_URL,
+    OLLAMA_MAX_CONNECTIONS,
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+    OLLAMA_KEEPALIVE_EXPIRY,
+    OLLAMA_CONNECT_TIMEOUT,
+    OLLAMA_REQUEST_TIMEOUT,
+    OLLAMA_MAX_CONCURRENCY,
+)
+
+
+class OllamaClient:
+    """
+    Клиент Ollama, переиспользующий TCP соединения между запросами.
+
+    Семафор ограничивает число одновременных генераций, чтобы всплеск
+    сообщений не перегружал Ollama параллельными запросами.
+    """
+
+    def __init__(
+        self,
+        base_url: str = OLLAMA_BASE_URL,
+        max_connections: int = OLLAMA_MAX_CONNECTIONS,
+        max_keepalive_connections: int = OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = OLLAMA_KEEPALIVE_EXPIRY,
+        connect_timeout: float = OLLAMA_CONNECT_TIMEOUT,
+        request_timeout: float = OLLAMA_REQUEST_TIMEOUT,
+        max_concurrency: int = OLLAMA_MAX_CONCURRENCY,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(request_timeout, connect=connect_timeout),
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def generate(self, payload: dict, timeout: Optional[float] = None) -> dict:
+        """
+        Вызывает /api/generate и возвращает JSON ответа
+
+        Args:
+            payload: Тело запроса к Ollama
+            timeout: Таймаут конкретного запроса (по умолчанию - из настроек клиента)
+        """
+        kwargs = {}
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=OLLAMA_CONNECT_TIMEOUT)
+
+        async with self._semaphore:
+            response = await self._client.post("/api/generate", json=payload, **kwargs)
+            response.raise_for_status()
+            return response.json()
+
+    async def generate_stream(
+        self,
+        payload: dict,
+        should_stop: Optional[Callable[[str], bool]] = None,
+        timeout: Optional[float] = None,
+    ) -> dict:
+        """
+        Вызывает /api/generate в потоковом режиме и собирает текст по частям
+
+        Args:
+            payload: Тело запроса к Ollama ("stream" выставляется в True)
+            should_stop: Проверка накопленного текста; если вернула True, чтение
+                прекращается и соединение закрывается, что останавливает генерацию
+            timeout: Таймаут конкретного запроса
+
+        Returns:
+            Последний объект потока с полным текстом в "response" и признаком "stopped_early"
+        """
+        kwargs = {}
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(timeout, connect=OLLAMA_CONNECT_TIMEOUT)
+
+        parts = []
+        last: dict = {}
+        stopped_early = False
+        async with self._semaphore:
+            async with self._client.stream(
+                "POST", "/api/generate", json={**payload, "stream": True}, **kwargs
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    last = json.loads(line)
+                    parts.append(last.get("response", ""))
+                    if last.get("done"):
+                        break
+                    if should_stop is not None and should_stop("".join(parts)):
+                        stopped_early = True
+                        break
+
+        return {**last, "response": "".join(parts), "stopped_early": stopped_early}
+
+    async def aclose(self):
+        """Закрывает все соединения пула"""
+        await self._client.aclose()
+
+
+_client: Optional[OllamaClient] = None
+
+
+def init_llm_client(**kwargs) -> OllamaClient:
+    """Создает общий клиент Ollama (вызывается при старте бота)"""
+    global _client
+    if _client is None:
+        _client = OllamaClient(**kwargs)
+    return _client
+
+
+def get_llm_client() -> OllamaClient:
+    """
+    Возвращает общий клиент Ollama.
+
+    Если клиент не был создан при старте (например, в скриптах),
+    он создается лениво при первом обращении.
+    """
+    if _client is None:
+        return init_llm_client()
+    return _client
+
+
+async def close_llm_client():
+    """Закрывает общий клиент Ollama (вызывается при остановке бота)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,100 @@
+"""
+Банк проверенных примеров вопрос/SQL и выбор похожих примеров для промпта
+
+Вместо всех примеров в промпт попадают только top-k ближайших к вопросу.
+Близость считается по TF-IDF символьных n-грамм нормализованного текста
+(литералы заменены метками, см. src/llm/literals.py), без внешних сервисов.
+"""
+import json
+import logging
+import math
+import os
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+from src.config import EXAMPLE_RETRIEVAL_ENABLED, EXAMPLES_PATH, EXAMPLES_TOP_K
+from src.llm.literals import normalize_question
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Example:
+    """Проверенный пример: вопрос, эталонный SQL и тип вопроса"""
+    question: str
+    sql: str
+    intent: str = ''
+
+
+def load_examples(path: str = EXAMPLES_PATH) -> list[Example]:
+    """Загружает банк примеров из JSON файла (список объектов question/sql/intent)"""
+    with open(path, encoding='utf-8') as f:
+        return [Example(item['question'], item['sql'], item.get('intent', '')) for item in json.load(f)]
+
+
+def char_ngrams(text: str, n_min: int = 3, n_max: int = 5) -> Counter:
+    """Символьные n-граммы нормализованного вопроса (с границами слов)"""
+    text = f" {normalize_question(text)} "
+    grams = Counter()
+    for n in range(n_min, n_max + 1):
+        for i in range(len(text) - n + 1):
+            grams[text[i:i + n]] += 1
+    return grams
+
+
+class ExampleIndex:
+    """TF-IDF индекс по символьным n-граммам с косинусной близостью"""
+
+    def __init__(self, examples: list[Example]):
+        self.examples = examples
+        grams = [char_ngrams(example.question) for example in examples]
+        df = Counter()
+        for counts in grams:
+            df.update(counts.keys())
+        total = len(examples)
+        self._idf = {gram: math.log((1 + total) / (1 + freq)) + 1 for gram, freq in df.items()}
+        self._vectors = [self._vectorize(counts) for counts in grams]
+
+    def _vectorize(self, counts: Counter) -> dict[str, float]:
+        # Неизвестные индексу n-граммы не влияют на близость
+        vector = {gram: (1 + math.log(tf)) * self._idf[gram] for gram, tf in counts.items() if gram in self._idf}
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        return {gram: w / norm for gram, w in vector.items()} if norm else {}
+
+    def search(self, question: str, k: int = EXAMPLES_TOP_K) -> list[tuple[float, Example]]:
+        """k ближайших примеров с оценкой близости, по убыванию"""
+        query = self._vectorize(char_ngrams(question))
+        scored = []
+        for vector, example in zip(self._vectors, self.examples):
+            if len(query) > len(vector):
+                score = sum(w * query[g] for g, w in vector.items() if g in query)
+            else:
+                score = sum(w * vector[g] for g, w in query.items() if g in vector)
+            scored.append((score, example))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored[:k]
+
+    def top_k(self, question: str, k: int = EXAMPLES_TOP_K) -> list[Example]:
+        return [example for _, example in self.search(question, k)]
+
+
+def format_examples(examples: list[Example]) -> str:
+    """Блок примеров для промпта в том же формате, что и EXAMPLES"""
+    lines = ["Примеры запросов:", ""]
+    for i, example in enumerate(examples, 1):
+        lines.append(f'{i}. "{example.question}"')
+        lines.append(f"   SQL: {example.sql};")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def _load_index() -> Optional[ExampleIndex]:
+    if not EXAMPLE_RETRIEVAL_ENABLED:
+        return None
+    if not os.path.exists(EXAMPLES_PATH):
+        logger.warning("Банк примеров %s не найден, в промпт идут все примеры", EXAMPLES_PATH)
+        return None
+    return ExampleIndex(load_examples(EXAMPLES_PATH))
+
+
+example_index: Optional[ExampleIndex] = _load_index()
@@ -0,0 +1,129 @@
+"""
+Извлечение литералов (дат, времени, id, чисел) из вопросов на русском языке
+"""
+import re
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Optional
+
+# Основы названий месяцев (покрывают именительный, родительный и предложный падежи)
+MONTH_STEMS = {
+    'январ': 1,
+    'феврал': 2,
+    'март': 3,
+    'апрел': 4,
+    'ма': 5,
+    'июн': 6,
+    'июл': 7,
+    'август': 8,
+    'сентябр': 9,
+    'октябр': 10,
+    'ноябр': 11,
+    'декабр': 12,
+}
+
+_MONTH_WORD = r'(январ[ьяе]|феврал[ьяе]|марта?|марте|апрел[ьяе]|ма[йяе]|июн[ьяе]|июл[ьяе]|августа?|августе|сентябр[ьяе]|октябр[ьяе]|ноябр[ьяе]|декабр[ьяе])'
+
+_ID_RE = re.compile(r'\b[0-9a-fA-F]{32}\b')
+_RU_DATE_RE = re.compile(
+    r'\b(\d{1,2})\s+' + _MONTH_WORD + r'\s+(\d{4})(?:\s*(?:года|год|г\.))?',
+    re.IGNORECASE,
+)
+_ISO_DATE_RE = re.compile(r'\b(\d{4})-(\d{2})-(\d{2})\b')
+_DOT_DATE_RE = re.compile(r'\b(\d{1,2})\.(\d{1,2})\.(\d{4})\b')
+_TIME_RE = re.compile(r'\b(\d{1,2}):(\d{2})\b')
+_NUMBER_RE = re.compile(r'(?<![\w.])(\d{1,3}(?:[ \u00a0]\d{3})+|\d+)(?![\w:]|\.\d)')
+
+
+@dataclass(frozen=True)
+class Literal:
+    """Литерал, найденный в тексте вопроса"""
+    kind: str  # 'id', 'date', 'time' или 'number'
+    value: Any  # str, date, (час, минута) или int
+    start: int
+    end: int
+
+
+def month_from_word(word: str) -> Optional[int]:
+    """Возвращает номер месяца по русскому слову (в любом падеже)"""
+    word = word.lower()
+    # 'март' проверяем раньше 'ма', чтобы не спутать март с маем
+    for stem in sorted(MONTH_STEMS, key=len, reverse=True):
+        if word.startswith(stem):
+            return MONTH_STEMS[stem]
+    return None
+
+
+def _make_date(year: int, month: int, day: int) -> Optional[date]:
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def extract_literals(text: str) -> list[Literal]:
+    """
+    Находит литералы в тексте вопроса
+
+    Порядок поиска задает приоритет: id, даты, время, числа.
+    Литералы не пересекаются и возвращаются в порядке появления в тексте.
+    """
+    found: list[Literal] = []
+    taken: list[tuple[int, int]] = []
+
+    def is_free(start: int, end: int) -> bool:
+        return all(end <= s or start >= e for s, e in taken)
+
+    def add(kind: str, value: Any, start: int, end: int):
+        if value is None or not is_free(start, end):
+            return
+        found.append(Literal(kind, value, start, end))
+        taken.append((start, end))
+
+    for m in _ID_RE.finditer(text):
+        add('id', m.group(0).lower(), m.start(), m.end())
+
+    for m in _RU_DATE_RE.finditer(text):
+        month = month_from_word(m.group(2))
+        value = _make_date(int(m.group(3)), month, int(m.group(1))) if month else None
+        add('date', value, m.start(), m.end())
+
+    for m in _ISO_DATE_RE.finditer(text):
+        add('date', _make_date(int(m.group(1)), int(m.group(2)), int(m.group(3))), m.start(), m.end())
+
+    for m in _DOT_DATE_RE.finditer(text):
+        add('date', _make_date(int(m.group(3)), int(m.group(2)), int(m.group(1))), m.start(), m.end())
+
+    for m in _TIME_RE.finditer(text):
+        hour, minute = int(m.group(1)), int(m.group(2))
+        if hour <= 24 and minute < 60:
+            add('time', (hour, minute), m.start(), m.end())
+
+    for m in _NUMBER_RE.finditer(text):
+        digits = re.sub(r'\D', '', m.group(1))
+        add('number', int(digits), m.start(), m.end())
+
+    found.sort(key=lambda lit: lit.start)
+    return found
+
+
+def normalize_question(text: str, literals: Optional[list[Literal]] = None) -> str:
+    """
+    Приводит вопрос к шаблону: литералы заменяются на <kind>,
+    регистр, кавычки, пунктуация в конце и лишние пробелы убираются
+    """
+    if literals is None:
+        literals = extract_literals(text)
+
+    parts = []
+    pos = 0
+    for lit in literals:
+        parts.append(text[pos:lit.start])
+        parts.append(f' <{lit.kind}> ')
+        pos = lit.end
+    parts.append(text[pos:])
+
+    template = ''.join(parts).lower().replace('ё', 'е')
+    template = re.sub(r'[\'"«»`]', ' ', template)
+    template = re.sub(r'\s+', ' ', template).strip()
+    return template.rstrip('?!. ')
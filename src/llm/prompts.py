@@ -1,6 +1,8 @@
 """
 Промпты для генерации SQL запросов из естественного языка
 """
+from typing import Optional
+from src.llm.examples import Example, example_index, format_examples
 
 SCHEMA_DESCRIPTION = """
 База данных содержит две таблицы:
@@ -84,7 +86,9 @@ EXAMPLES = """
         AND DATE(vs.created_at) = '2025-11-28'
         AND EXTRACT(HOUR FROM vs.created_at) >= 10
         AND EXTRACT(HOUR FROM vs.created_at) < 15;
+"""
 
+GUIDANCE = """
 Важно различать:
 - "Сколько замеров/видео/записей" → используй COUNT(*)
 - "На сколько в сумме/сколько всего" (про сумму значений) → используй SUM()
@@ -98,17 +102,8 @@ EXAMPLES = """
 """
 
 
-def get_sql_generation_prompt(user_query: str) -> str:
-    """
-    Формирует промпт для генерации SQL запроса
-    """
-    prompt = f"""{SCHEMA_DESCRIPTION}
-
-{EXAMPLES}
-
-Запрос пользователя на русском языке: "{user_query}"
-
-Твоя задача: сгенерировать SQL запрос (только SELECT), который отвечает на этот вопрос.
+RULES = """
+Твоя задача: сгенерировать SQL запрос (только SELECT), который отвечает на вопрос пользователя.
 
 Важные правила:
 1. Генерируй ТОЛЬКО SQL запрос, без дополнительных объяснений
@@ -119,8 +114,43 @@ def get_sql_generation_prompt(user_query: str) -> str:
 6. Не используй кавычки вокруг SQL запроса, просто верни чистый SQL
 7. ВАЖНО: Если вопрос "Сколько замеров/видео/записей" - используй COUNT(*), а не SUM()
 8. SUM() используется только когда спрашивают про сумму значений (например "на сколько в сумме")
+"""
 
+# Системный промпт не зависит от вопроса и одинаков побайтно для всех запросов,
+# поэтому Ollama переиспользует уже посчитанный префикс (KV кэш) и не
+# пересчитывает схему и правила для каждого вопроса. Если включен выбор похожих
+# примеров, примеры идут в пользовательскую часть, иначе - все в системный промпт
+def build_system_prompt(with_examples: bool) -> str:
+    """Системный промпт: схема, (все примеры), подсказки и правила"""
+    examples = f"\n{EXAMPLES}" if with_examples else ""
+    return f"""{SCHEMA_DESCRIPTION}
+{examples}
+{GUIDANCE}
+{RULES}"""
+
+
+SYSTEM_PROMPT = build_system_prompt(with_examples=example_index is None)
+
+
+def get_sql_generation_prompt(
+    user_query: str,
+    hint: Optional[str] = None,
+    examples: Optional[list[Example]] = None,
+) -> str:
+    """
+    Формирует пользовательскую часть промпта (после SYSTEM_PROMPT)
+    
+    Args:
+        user_query: Вопрос пользователя
+        hint: Замечание к предыдущему варианту запроса (при повторной генерации)
+        examples: Примеры для промпта; по умолчанию - ближайшие из банка примеров
+    """
+    hint_block = f"\nЗамечание: {hint}\n" if hint else ""
+    if examples is None and example_index is not None:
+        examples = example_index.top_k(user_query)
+    examples_block = format_examples(examples) + "\n" if examples else ""
+    prompt = f"""{examples_block}Запрос пользователя на русском языке: "{user_query}"
+{hint_block}
 SQL запрос:
 """
     return prompt
-
@@ -0,0 +1,343 @@
+"""
+Детерминированный разбор типовых вопросов без обращения к LLM
+
+Парсер извлекает из вопроса намерение и слоты (даты, часы, id креатора,
+метрику, порог) и строит SQL напрямую. Если вопрос не подходит ни под одно
+правило, возвращается None и запрос уходит в generate_sql.
+"""
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Optional
+from src.llm.literals import Literal, extract_literals
+from src.metrics import registry
+
+RULE_MATCHES = registry.counter(
+    'bot_rule_matches_total', 'Вопросы, проверенные правилами, по правилу (none - ушли в LLM)', ('intent',),
+)
+
+METRICS = {
+    'просмотр': 'views',
+    'лайк': 'likes',
+    'комментар': 'comments',
+    'жалоб': 'reports',
+}
+
+# Слова, меняющие смысл вопроса так, что простые правила могут ответить неверно
+_UNSUPPORTED_RE = re.compile(
+    r'средн|максим|минимал|медиан|процент|доля|топ\b|рейтинг|кажд|какой|какое|какие|'
+    r'чаще|реже|кроме|\bили\b|\bне\b|больше всего|меньше всего|между|за последн|вчера|сегодня'
+)
+_MONTH_RE = re.compile(r'январ|феврал|\bмарт|апрел|\bма[йяе]\b|\bиюн|\bиюл|август|сентябр|октябр|ноябр|декабр')
+_CREATOR_RE = re.compile(
+    r'креатор\w*\s+(?:с\s+)?(?:id|айди|идентификатором)?\s*[:=]?\s*[\'"«]?([0-9A-Za-z_-]+)[\'"»]?',
+    re.IGNORECASE,
+)
+_THRESHOLD_RE = re.compile(
+    r'(больше|более|свыше|выше|меньше|менее|ниже)\s+(\d{1,3}(?:[ \u00a0]\d{3})+|\d+)'
+)
+_THRESHOLD_OPS = {
+    'больше': '>', 'более': '>', 'свыше': '>', 'выше': '>',
+    'меньше': '<', 'менее': '<', 'ниже': '<',
+}
+# Предлог перед единственной датой задает открытый интервал вместо одного дня
+_OPEN_BOUND_RE = re.compile(r'\b(начиная с|после|позже|позднее|раньше|ранее|прежде|до|с|по)\s*$')
+_OPEN_BOUNDS = {
+    'начиная с': 'from', 'с': 'from',
+    'после': 'after', 'позже': 'after', 'позднее': 'after',
+    'до': 'before', 'раньше': 'before', 'ранее': 'before', 'прежде': 'before',
+    'по': 'through',
+}
+_HOUR_RANGE_RE = re.compile(r'с\s+(\d{1,2})(?::00)?\s+до\s+(\d{1,2})(?::00)?(?:\s+час\w*)?')
+
+
+@dataclass
+class Slots:
+    """Слоты, извлеченные из вопроса"""
+    text: str
+    literals: list[Literal]
+    metric: Optional[str] = None
+    creator_id: Optional[str] = None
+    dates: list[date] = field(default_factory=list)
+    # Предлог перед каждой датой: from, after, before, through или None
+    date_bounds: list[Optional[str]] = field(default_factory=list)
+    hours: Optional[tuple[int, int]] = None
+    threshold: Optional[tuple[str, int]] = None
+    consumed: set = field(default_factory=set)
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r'\s+', ' ', text.lower().replace('ё', 'е')).strip()
+
+
+def _consume(slots: Slots, start: int, end: int):
+    """Отмечает литералы внутри диапазона как использованные"""
+    for i, lit in enumerate(slots.literals):
+        if lit.start >= start and lit.end <= end:
+            slots.consumed.add(i)
+
+
+def parse_slots(question: str) -> Optional[Slots]:
+    """
+    Извлекает слоты из вопроса
+
+    Returns:
+        Slots или None, если вопрос содержит конструкции, которые правила не поддерживают
+    """
+    text = _normalize(question)
+    if _UNSUPPORTED_RE.search(text):
+        return None
+
+    literals = extract_literals(text)
+    slots = Slots(text=text, literals=literals)
+
+    metrics = {metric for stem, metric in METRICS.items() if stem in text}
+    if len(metrics) > 1:
+        return None
+    slots.metric = metrics.pop() if metrics else None
+
+    m = _CREATOR_RE.search(text)
+    if m:
+        # Значение берем из исходного текста: id чувствительны к регистру
+        original = _CREATOR_RE.search(question)
+        if original is None or original.group(1).lower() != m.group(1):
+            return None
+        # "у креатора с 1 ноября": без явного id за креатора принимается число из даты или времени
+        if any(lit.kind in ('date', 'time') and lit.start < m.end(1) and m.start(1) < lit.end for lit in literals):
+            return None
+        slots.creator_id = original.group(1)
+        _consume(slots, m.start(1), m.end(1))
+
+    for i, lit in enumerate(literals):
+        if lit.kind == 'date':
+            slots.dates.append(lit.value)
+            m = _OPEN_BOUND_RE.search(text[:lit.start])
+            slots.date_bounds.append(_OPEN_BOUNDS[m.group(1)] if m else None)
+            slots.consumed.add(i)
+
+    # Название месяца без полной даты ("в июне 2025") правила не разбирают
+    without_dates = text
+    for lit in reversed(literals):
+        if lit.kind == 'date':
+            without_dates = without_dates[:lit.start] + ' ' + without_dates[lit.end:]
+    if _MONTH_RE.search(without_dates):
+        return None
+
+    m = _HOUR_RANGE_RE.search(text)
+    if m:
+        start_hour, end_hour = int(m.group(1)), int(m.group(2))
+        if not 0 <= start_hour < end_hour <= 24:
+            return None
+        slots.hours = (start_hour, end_hour)
+        _consume(slots, m.start(), m.end())
+
+    m = _THRESHOLD_RE.search(text)
+    if m:
+        slots.threshold = (_THRESHOLD_OPS[m.group(1)], int(re.sub(r'\D', '', m.group(2))))
+        _consume(slots, m.start(2), m.end(2))
+
+    # Любой неразобранный литерал может менять смысл вопроса
+    if len(slots.consumed) != len(literals):
+        return None
+
+    return slots
+
+
+def _ts(value: datetime) -> str:
+    return f"'{value.strftime('%Y-%m-%d %H:%M:%S')}'"
+
+
+def _day_range(slots: Slots) -> Optional[tuple[Optional[datetime], Optional[datetime]]]:
+    """
+    Полуоткрытый интервал [начало, конец) по датам и часам из вопроса;
+    None вместо границы - интервал с этой стороны открыт ("после", "до", "с" без "по")
+    """
+    if len(slots.dates) == 1:
+        day = datetime.combine(slots.dates[0], datetime.min.time())
+        bound = slots.date_bounds[0]
+        if bound is not None:
+            if slots.hours:
+                return None
+            if bound == 'from':
+                return day, None
+            if bound == 'after':
+                return day + timedelta(days=1), None
+            if bound == 'before':
+                return None, day
+            return None, day + timedelta(days=1)
+        if slots.hours:
+            return day + timedelta(hours=slots.hours[0]), day + timedelta(hours=slots.hours[1])
+        return day, day + timedelta(days=1)
+
+    if len(slots.dates) == 2 and not slots.hours and re.search(r'\bс\b.*\bпо\b', slots.text):
+        start, end = sorted(slots.dates)
+        return (datetime.combine(start, datetime.min.time()),
+                datetime.combine(end, datetime.min.time()) + timedelta(days=1))
+
+    return None
+
+
+def _time_conditions(column: str, slots: Slots) -> Optional[list[str]]:
+    """Условия по времени для колонки; None - если даты из вопроса не разобраны"""
+    if not slots.dates:
+        return [] if not slots.hours else None
+    bounds = _day_range(slots)
+    if bounds is None:
+        return None
+    start, end = bounds
+    conditions = []
+    if start is not None:
+        conditions.append(f"{column} >= {_ts(start)}")
+    if end is not None:
+        conditions.append(f"{column} < {_ts(end)}")
+    return conditions
+
+
+def _select(sql: str, conditions: list[str]) -> str:
+    if conditions:
+        return f"{sql} WHERE " + ' AND '.join(conditions)
+    return sql
+
+
+def _rule_total_videos(slots: Slots) -> Optional[str]:
+    """Сколько всего видео"""
+    if not re.search(r'сколько (всего )?видео', slots.text):
+        return None
+    if slots.creator_id or slots.dates or slots.hours or slots.threshold or slots.metric:
+        return None
+    if re.search(r'замер|разн|вырос|прирост|опубликова|вышл|набрал', slots.text):
+        return None
+    return "SELECT COUNT(*) FROM videos"
+
+
+def _rule_count_videos(slots: Slots) -> Optional[str]:
+    """Сколько видео у креатора / за период публикации / с порогом по итоговой метрике"""
+    if not re.search(r'сколько (всего )?видео', slots.text) or slots.hours:
+        return None
+    if re.search(r'замер|разн|вырос|прирост|нов(ые|ых)|получал|за час|отрицательн', slots.text):
+        return None
+    if bool(slots.metric) != bool(slots.threshold):
+        return None
+    if slots.dates and not re.search(r'вышл|опубликова|публикац|загруж', slots.text):
+        return None
+    if not (slots.creator_id or slots.dates or slots.threshold):
+        return None
+
+    time_conditions = _time_conditions('video_created_at', slots)
+    if time_conditions is None:
+        return None
+
+    conditions = []
+    if slots.creator_id:
+        conditions.append(f"creator_id = '{slots.creator_id}'")
+    conditions.extend(time_conditions)
+    if slots.threshold:
+        op, value = slots.threshold
+        conditions.append(f"{slots.metric}_count {op} {value}")
+
+    return _select("SELECT COUNT(*) FROM videos", conditions)
+
+
+def _snapshot_source(slots: Slots) -> Optional[tuple[str, list[str]]]:
+    """FROM и условия для запросов по замерам за период (с JOIN, если указан креатор)"""
+    time_conditions = _time_conditions('vs.created_at', slots)
+    if not time_conditions:
+        return None
+    if slots.creator_id:
+        return ("video_snapshots vs JOIN videos v ON vs.video_id = v.id",
+                [f"v.creator_id = '{slots.creator_id}'"] + time_conditions)
+    return "video_snapshots vs", time_conditions
+
+
+def _rule_sum_growth(slots: Slots) -> Optional[str]:
+    """На сколько выросли <метрика> за день / часы, опционально у креатора"""
+    if not re.search(r'на сколько|насколько', slots.text):
+        return None
+    if not re.search(r'вырос|прирост|увеличил|прибавил', slots.text):
+        return None
+    if not slots.metric or slots.threshold:
+        return None
+
+    source = _snapshot_source(slots)
+    if source is None:
+        return None
+    from_clause, conditions = source
+    return _select(f"SELECT COALESCE(SUM(vs.delta_{slots.metric}_count), 0) FROM {from_clause}", conditions)
+
+
+def _rule_distinct_growing_videos(slots: Slots) -> Optional[str]:
+    """Сколько разных видео получали новые <метрика> за день"""
+    if not re.search(r'сколько разных видео', slots.text):
+        return None
+    if not re.search(r'нов(ые|ых)|получал|вырос|прирост', slots.text):
+        return None
+    if not slots.metric or slots.threshold:
+        return None
+
+    source = _snapshot_source(slots)
+    if source is None:
+        return None
+    from_clause, conditions = source
+    conditions.append(f"vs.delta_{slots.metric}_count > 0")
+    return _select(f"SELECT COUNT(DISTINCT vs.video_id) FROM {from_clause}", conditions)
+
+
+def _rule_negative_snapshots(slots: Slots) -> Optional[str]:
+    """Сколько замеров, в которых прирост <метрики> был отрицательным"""
+    if not re.search(r'сколько', slots.text) or not re.search(r'замер', slots.text):
+        return None
+    if not re.search(r'отрицательн', slots.text):
+        return None
+    if not slots.metric or slots.creator_id or slots.threshold:
+        return None
+
+    time_conditions = _time_conditions('created_at', slots)
+    if time_conditions is None:
+        return None
+    return _select("SELECT COUNT(*) FROM video_snapshots",
+                   [f"delta_{slots.metric}_count < 0"] + time_conditions)
+
+
+RULES = [
+    ('total_videos', _rule_total_videos),
+    ('count_videos', _rule_count_videos),
+    ('sum_growth', _rule_sum_growth),
+    ('distinct_growing_videos', _rule_distinct_growing_videos),
+    ('negative_snapshots', _rule_negative_snapshots),
+]
+
+
+class RuleMatcher:
+    """Применяет правила к вопросам и считает покрытие"""
+
+    def __init__(self):
+        self.total = 0
+        self.matched = 0
+        self.by_intent: dict[str, int] = {name: 0 for name, _ in RULES}
+
+    def match(self, question: str) -> Optional[str]:
+        """Возвращает SQL, если вопрос распознан правилами, иначе None"""
+        self.total += 1
+        slots = parse_slots(question)
+        if slots is not None:
+            for name, rule in RULES:
+                sql = rule(slots)
+                if sql:
+                    self.matched += 1
+                    self.by_intent[name] += 1
+                    RULE_MATCHES.inc(intent=name)
+                    return sql
+        RULE_MATCHES.inc(intent='none')
+        return None
+
+    def coverage(self) -> dict:
+        """Доля вопросов, обработанных без LLM"""
+        return {
+            'total': self.total,
+            'matched': self.matched,
+            'coverage_rate': self.matched / self.total if self.total else 0.0,
+            'by_intent': dict(self.by_intent),
+        }
+
+
+rule_matcher = RuleMatcher()
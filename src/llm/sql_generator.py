@@ -1,11 +1,18 @@
 """
 Генератор SQL запросов из естественного языка через Ollama
 """
+import logging
 import re
 import httpx
 from typing import Optional
-from src.config import OLLAMA_BASE_URL, OLLAMA_MODEL
-from src.llm.prompts import get_sql_generation_prompt
+from src.config import OLLAMA_KEEP_ALIVE, OLLAMA_MODEL, OLLAMA_NUM_PREDICT, OLLAMA_STOP, OLLAMA_STREAM
+from src.llm.cascade import model_cascade
+from src.llm.client import get_llm_client
+from src.llm.prompts import SYSTEM_PROMPT, get_sql_generation_prompt
+from src.llm.template_cache import template_cache
+from src.metrics import CACHE_REQUESTS, LLM_FAILURES, VALIDATION_REJECTS, span
+
+logger = logging.getLogger(__name__)
 
 
 def validate_sql(sql: str) -> bool:
@@ -64,56 +71,154 @@ def extract_sql_from_response(response_text: str) -> Optional[str]:
     return None
 
 
-async def generate_sql(user_query: str) -> Optional[str]:
+_FENCED_SQL_RE = re.compile(r'```(?:sql)?\s*SELECT\b.*?```', re.IGNORECASE | re.DOTALL)
+_SELECT_START_RE = re.compile(r'\bSELECT\b', re.IGNORECASE)
+
+
+def has_complete_sql(text: str) -> bool:
+    """
+    Проверяет, что в ответе уже есть законченный SELECT:
+    закрытый блок ``` или ';' вне строковых литералов
+    """
+    if _FENCED_SQL_RE.search(text):
+        return True
+    m = _SELECT_START_RE.search(text)
+    if not m:
+        return False
+    in_literal = False
+    for ch in text[m.start():]:
+        if ch == "'":
+            in_literal = not in_literal
+        elif ch == ';' and not in_literal:
+            return True
+    return False
+
+
+def generation_options() -> dict:
+    """Параметры генерации Ollama"""
+    options = {
+        "temperature": 0.1,  # Низкая температура для более точных SQL запросов
+    }
+    if OLLAMA_NUM_PREDICT > 0:
+        options["num_predict"] = OLLAMA_NUM_PREDICT
+    if OLLAMA_STOP:
+        options["stop"] = OLLAMA_STOP
+    return options
+
+
+async def generate_sql(user_query: str, hint: Optional[str] = None) -> Optional[str]:
     """
     Генерирует SQL запрос из естественного языка через Ollama
     
     Args:
         user_query: Запрос пользователя на русском языке
+        hint: Замечание к предыдущему варианту (например, слишком дорогой план);
+            с ним кэш шаблонов не читается
+    
+    Новый SQL сохраняется в кэш шаблонов только после успешного выполнения
+    (remember_sql в src/bot/pipeline.py).
         
     Returns:
         SQL запрос или None в случае ошибки
     """
-    prompt = get_sql_generation_prompt(user_query)
+    # Вопрос уже известной формы - подставляем новые литералы в готовый SQL
+    if template_cache is not None and hint is None:
+        cached_sql = template_cache.get(user_query)
+        CACHE_REQUESTS.inc(cache='template', result='hit' if cached_sql else 'miss')
+        if cached_sql:
+            return cached_sql
+    
+    prompt = get_sql_generation_prompt(user_query, hint=hint)
+    
+    # Модели каскада по очереди или одновременно (src/llm/cascade.py)
+    return await model_cascade.generate(lambda model: ask_model(model, prompt))
+
+
+async def ask_model(model: str, prompt: str) -> tuple[Optional[str], str]:
+    """
+    Один запрос к модели: генерация, извлечение и валидация SQL
+    
+    Returns:
+        (SQL или None, исход: ok, no_sql, invalid, timeout, connect, http_status или error)
+    """
+    payload = {
+        "model": model,
+        "system": SYSTEM_PROMPT,
+        "prompt": prompt,
+        "stream": False,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": generation_options(),
+    }
     
     try:
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                f"{OLLAMA_BASE_URL}/api/generate",
-                json={
-                    "model": OLLAMA_MODEL,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.1,  # Низкая температура для более точных SQL запросов
-                    }
-                }
-            )
-            response.raise_for_status()
-            data = response.json()
-            
-            # Извлекаем SQL из ответа
-            response_text = data.get("response", "").strip()
+        with span("llm"):
+            if OLLAMA_STREAM:
+                # Пояснения после SQL не нужны: прекращаем генерацию на первом законченном запросе
+                data = await get_llm_client().generate_stream(payload, should_stop=has_complete_sql)
+            else:
+                data = await get_llm_client().generate(payload)
+        
+        # Извлекаем SQL из ответа
+        response_text = data.get("response", "").strip()
+        with span("extract"):
             sql = extract_sql_from_response(response_text)
-            
-            if not sql:
-                print(f"Не удалось извлечь SQL из ответа: {response_text}")
-                return None
-            
-            # Валидация SQL
-            if not validate_sql(sql):
-                print(f"SQL запрос не прошел валидацию: {sql}")
-                return None
-            
-            return sql
+        
+        if not sql:
+            LLM_FAILURES.inc(reason="no_sql")
+            logger.warning("Не удалось извлечь SQL из ответа", extra={'model': model, 'response': response_text})
+            return None, "no_sql"
+        
+        # Валидация SQL
+        with span("validate"):
+            valid = validate_sql(sql)
+        if not valid:
+            VALIDATION_REJECTS.inc()
+            logger.warning("SQL запрос не прошел валидацию", extra={'model': model, 'sql': sql})
+            return None, "invalid"
+        
+        return sql, "ok"
             
     except httpx.TimeoutException:
-        print("Таймаут при обращении к Ollama")
-        return None
+        LLM_FAILURES.inc(reason="timeout")
+        logger.warning("Таймаут при обращении к Ollama", extra={'model': model})
+        return None, "timeout"
     except httpx.RequestError as e:
-        print(f"Ошибка подключения к Ollama: {e}")
-        return None
+        LLM_FAILURES.inc(reason="connect")
+        logger.warning("Ошибка подключения к Ollama: %s", e)
+        return None, "connect"
+    except httpx.HTTPStatusError as e:
+        LLM_FAILURES.inc(reason="http_status")
+        logger.warning("Ollama вернула ошибку", extra={'model': model, 'status': e.response.status_code})
+        return None, "http_status"
+    except Exception:
+        LLM_FAILURES.inc(reason="error")
+        logger.exception("Неожиданная ошибка при генерации SQL")
+        return None, "error"
+
+
+async def warm_up_llm(
+    question: str = "Сколько всего видео есть в системе?",
+    model: str = OLLAMA_MODEL,
+) -> Optional[dict]:
+    """
+    Пробная генерация одного токена: Ollama загружает модель и считает
+    системный промпт, так что первый вопрос пользователя не ждет ни загрузки,
+    ни полного prefill.
+
+    Returns:
+        Ответ Ollama со статистикой (load_duration, prompt_eval_duration) или None
+    """
+    options = generation_options()
+    options["num_predict"] = 1
+    try:
+        return await get_llm_client().generate({
+            "model": model,
+            "system": SYSTEM_PROMPT,
+            "prompt": get_sql_generation_prompt(question),
+            "stream": False,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "options": options,
+        })
     except Exception as e:
-        print(f"Неожиданная ошибка при генерации SQL: {e}")
+        logger.warning("Не удалось прогреть модель Ollama: %s", e)
         return None
-
@@ -0,0 +1,288 @@
+"""
+Кэш SQL шаблонов: повторные вопросы одной формы обслуживаются без обращения к LLM
+
+Из вопроса извлекаются литералы (даты, время, id, числа), ключом служит
+нормализованный шаблон вопроса. В сгенерированном SQL те же литералы
+заменяются на метки, а при попадании в кэш подставляются новые значения.
+"""
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Optional
+from src.config import (
+    OLLAMA_MODEL,
+    SQL_TEMPLATE_CACHE_ENABLED,
+    SQL_TEMPLATE_CACHE_SIZE,
+    SQL_TEMPLATE_CACHE_TTL,
+    SQL_TEMPLATE_CACHE_PATH,
+)
+from src.llm.literals import Literal, extract_literals, normalize_question
+
+logger = logging.getLogger(__name__)
+
+# Кандидаты на литерал в SQL: строка в кавычках или число после оператора сравнения
+_SQL_CANDIDATE_RE = re.compile(r"'(?:[^']|'')*'|(?<=[<>=])\s*\d+\b")
+_HOUR_CONTEXT_RE = re.compile(r'EXTRACT\s*\(\s*HOUR\s+FROM\s+[\w.]+\s*\)\s*(?:>=|<=|<>|!=|=|>|<)\s*$', re.IGNORECASE)
+_SQL_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+_SQL_TIME_RE = re.compile(r'\b(\d{2}):(\d{2})(?=:\d{2}\b|\b)')
+_SQL_ID_RE = re.compile(r'\b[0-9a-fA-F]{32}\b')
+_MARKER_RE = re.compile(r'<<(\d+):(\w+)>>')
+
+
+class _NotCacheable(Exception):
+    """SQL нельзя однозначно привязать к литералам вопроса"""
+
+
+def _single_match(indexes: list[int]) -> Optional[int]:
+    if len(indexes) > 1:
+        raise _NotCacheable()
+    return indexes[0] if indexes else None
+
+
+def _templatize_quoted(literal_sql: str, literals: list[Literal], used: set) -> str:
+    """Заменяет даты, время и id внутри строкового литерала SQL на метки"""
+
+    def replace_date(m):
+        idx = _single_match([i for i, lit in enumerate(literals)
+                             if lit.kind == 'date' and lit.value.isoformat() == m.group(0)])
+        if idx is None:
+            raise _NotCacheable()
+        used.add(idx)
+        return f'<<{idx}:date>>'
+
+    def replace_time(m):
+        value = (int(m.group(1)), int(m.group(2)))
+        idx = _single_match([i for i, lit in enumerate(literals)
+                             if lit.kind == 'time' and lit.value == value])
+        if idx is None:
+            return m.group(0)
+        used.add(idx)
+        return f'<<{idx}:hm>>'
+
+    def replace_id(m):
+        idx = _single_match([i for i, lit in enumerate(literals)
+                             if lit.kind == 'id' and lit.value == m.group(0).lower()])
+        if idx is None:
+            raise _NotCacheable()
+        used.add(idx)
+        return f'<<{idx}:id>>'
+
+    # Короткие числовые id в кавычках ('123') извлекаются из вопроса как числа
+    inner = literal_sql[1:-1]
+    if inner.isdigit():
+        idx = _single_match([i for i, lit in enumerate(literals)
+                             if lit.kind == 'number' and lit.value == int(inner)])
+        if idx is not None:
+            used.add(idx)
+            return f"'<<{idx}:num>>'"
+
+    result = _SQL_ID_RE.sub(replace_id, literal_sql)
+    result = _SQL_DATE_RE.sub(replace_date, result)
+    return _SQL_TIME_RE.sub(replace_time, result)
+
+
+def templatize_sql(sql: str, literals: list[Literal]) -> Optional[str]:
+    """
+    Превращает SQL в шаблон, заменяя литералы вопроса на метки <<i:форма>>
+
+    Returns:
+        Шаблон или None, если SQL содержит даты/id, которых нет в вопросе,
+        литерал используется неоднозначно или какой-то литерал не попал в SQL
+    """
+    used: set[int] = set()
+    parts = []
+    pos = 0
+
+    try:
+        for m in _SQL_CANDIDATE_RE.finditer(sql):
+            parts.append(sql[pos:m.start()])
+            pos = m.end()
+            token = m.group(0)
+
+            if token.startswith("'"):
+                parts.append(_templatize_quoted(token, literals, used))
+                continue
+
+            number = int(token)
+            prefix = token[:len(token) - len(token.lstrip())]
+            if _HOUR_CONTEXT_RE.search(sql[:m.start()]):
+                idx = _single_match([i for i, lit in enumerate(literals)
+                                     if lit.kind == 'time' and lit.value == (number, 0)])
+                if idx is not None:
+                    used.add(idx)
+                    parts.append(f'{prefix}<<{idx}:hour>>')
+                    continue
+
+            idx = _single_match([i for i, lit in enumerate(literals)
+                                 if lit.kind == 'number' and lit.value == number])
+            if idx is None:
+                parts.append(token)
+            else:
+                used.add(idx)
+                parts.append(f'{prefix}<<{idx}:num>>')
+    except _NotCacheable:
+        return None
+
+    parts.append(sql[pos:])
+    template = ''.join(parts)
+
+    # Литерал вопроса, не попавший в SQL, мог повлиять на запрос неявно
+    if len(used) != len(literals):
+        return None
+    # id вне кавычек, оставшиеся в SQL, не связаны с вопросом
+    if _SQL_ID_RE.search(_MARKER_RE.sub('', template)):
+        return None
+
+    return template
+
+
+def render_sql(template: str, literals: list[Literal]) -> Optional[str]:
+    """Подставляет литералы нового вопроса в SQL шаблон"""
+
+    def replace(m):
+        lit = literals[int(m.group(1))]
+        form = m.group(2)
+        if form == 'date' and isinstance(lit.value, date):
+            return lit.value.isoformat()
+        if form == 'id' and lit.kind == 'id':
+            return lit.value
+        if form == 'num' and lit.kind == 'number':
+            return str(lit.value)
+        if form == 'hm' and lit.kind == 'time':
+            return f'{lit.value[0]:02d}:{lit.value[1]:02d}'
+        if form == 'hour' and lit.kind == 'time' and lit.value[1] == 0:
+            return str(lit.value[0])
+        raise _NotCacheable()
+
+    try:
+        return _MARKER_RE.sub(replace, template)
+    except (_NotCacheable, IndexError):
+        return None
+
+
+class SQLTemplateCache:
+    """
+    LRU кэш SQL шаблонов с TTL, счетчиками и сохранением на диск
+    """
+
+    def __init__(
+        self,
+        max_size: int = SQL_TEMPLATE_CACHE_SIZE,
+        ttl: float = SQL_TEMPLATE_CACHE_TTL,
+        path: str = SQL_TEMPLATE_CACHE_PATH,
+        model: str = OLLAMA_MODEL,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.model = model
+        # ключ -> (sql шаблон, время сохранения)
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.rejected = 0
+        self.evictions = 0
+
+    def _key(self, template: str) -> str:
+        return f'{self.model}\n{template}'
+
+    def get(self, question: str) -> Optional[str]:
+        """Возвращает SQL для вопроса, если шаблон такой формы уже известен"""
+        literals = extract_literals(question)
+        key = self._key(normalize_question(question, literals))
+        entry = self._entries.get(key)
+
+        if entry is not None and time.time() - entry[1] > self.ttl:
+            del self._entries[key]
+            self._dirty = True
+            entry = None
+
+        sql = render_sql(entry[0], literals) if entry is not None else None
+        if sql is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return sql
+
+    def put(self, question: str, sql: str) -> bool:
+        """Сохраняет SQL как шаблон; возвращает False, если SQL нельзя параметризовать"""
+        literals = extract_literals(question)
+        template = templatize_sql(sql, literals)
+        if template is None:
+            self.rejected += 1
+            return False
+
+        key = self._key(normalize_question(question, literals))
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == template:
+            # Ответ из самого кэша: срок жизни шаблона не продлевается
+            return True
+        self._entries[key] = (template, time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+        self.stores += 1
+        self._dirty = True
+        return True
+
+    def stats(self) -> dict:
+        """Счетчики кэша"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'stores': self.stores,
+            'rejected': self.rejected,
+            'evictions': self.evictions,
+        }
+
+    def load(self):
+        """Загружает кэш с диска (если задан путь и файл существует)"""
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Не удалось загрузить кэш SQL шаблонов: %s", e)
+            return
+
+        now = time.time()
+        for key, template, stored_at in data.get('entries', []):
+            if now - stored_at <= self.ttl:
+                self._entries[key] = (template, stored_at)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        self._dirty = False
+
+    def save(self):
+        """Сохраняет кэш на диск атомарной заменой файла"""
+        if not self.path or not self._dirty:
+            return
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f'{self.path}.tmp'
+        entries = [[key, template, stored_at] for key, (template, stored_at) in self._entries.items()]
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'entries': entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+
+template_cache: Optional[SQLTemplateCache] = SQLTemplateCache() if SQL_TEMPLATE_CACHE_ENABLED else None
@@ -0,0 +1,105 @@
+"""
+Неблокирующее структурированное логирование
+
+Обработчики событийного цикла только кладут запись в очередь (QueueHandler),
+а форматирование и запись в stderr выполняет отдельный поток (QueueListener).
+Поля из extra={...} и контекст текущего вопроса (chat_id, request_id)
+выводятся вместе с сообщением: в JSON (LOG_FORMAT=json) или как key=value.
+"""
+import contextvars
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime, timezone
+from typing import Optional
+from src.config import LOG_FORMAT, LOG_LEVEL
+
+# Атрибуты, которые есть у любой LogRecord; остальные пришли из extra
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+_request_context: contextvars.ContextVar[dict] = contextvars.ContextVar('request_context', default={})
+_request_ids = itertools.count(1)
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def bind_request(**fields) -> dict:
+    """Задает контекст текущего вопроса для всех записей лога (и задач, созданных дальше)"""
+    context = {'request_id': next(_request_ids), **fields}
+    _request_context.set(context)
+    return context
+
+
+class _ContextFilter(logging.Filter):
+    """Копирует контекст вопроса в запись: в QueueListener контекстные переменные уже недоступны"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _request_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+def _fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _STANDARD_ATTRS}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON строка на запись"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Обычная строка лога, дополненная полями key=value"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _fields(record)
+        if fields:
+            line += ' | ' + ' '.join(f"{key}={json.dumps(value, ensure_ascii=False, default=str)}"
+                                     for key, value in fields.items())
+        return line
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """Настраивает корневой логгер: очередь в памяти и поток, пишущий в stderr"""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(JsonFormatter() if fmt == 'json' else KeyValueFormatter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(_ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Дописывает оставшиеся записи и останавливает поток логирования"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
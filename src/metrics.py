@@ -0,0 +1,236 @@
+"""
+Метрики бота: счетчики, гистограммы и замеры этапов обработки вопроса
+
+Метрики хранятся в памяти процесса и отдаются в текстовом формате Prometheus
+на локальном HTTP адресе (METRICS_PORT, по умолчанию выключено). Замеры
+этапов (span) попадают и в гистограмму bot_stage_duration_seconds, и в
+разбивку текущего вопроса, которая пишется в лог вместе с ответом.
+"""
+import bisect
+import contextvars
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Callable, Iterable, Optional
+
+# Границы корзин гистограмм длительности, в секундах
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+LabelValues = tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: LabelValues, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric(ABC):
+    """Метрика реестра: имя, описание, метки и строки значений в формате Prometheus"""
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: dict) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: ожидались метки {self.labelnames}, получены {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> list[str]:
+        """Строки значений метрики без заголовков HELP/TYPE"""
+
+    def render(self) -> str:
+        header = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return '\n'.join(header + self.samples())
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """Текущее значение, которое читается функцией в момент выдачи метрик"""
+    kind = 'gauge'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        func: Optional[Callable[[], dict[LabelValues, float]]] = None,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.func = func
+
+    def samples(self) -> list[str]:
+        values = self.func() if self.func is not None else {}
+        return [
+            f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Histogram(_Metric):
+    """Распределение значений по корзинам с суммой и числом наблюдений"""
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # По каждой комбинации меток: счетчики корзин (последняя - +Inf), сумма
+        self._series: dict[LabelValues, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = series
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Набор метрик процесса"""
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), **kwargs) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, **kwargs))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (), func=None) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, func))
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        return '\n'.join(metric.render() for metric in self._metrics.values()) + '\n'
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    'bot_stage_duration_seconds', 'Длительность этапов обработки вопроса', ('stage',),
+)
+REQUESTS = registry.counter('bot_requests_total', 'Обработанные вопросы по исходу', ('outcome',))
+CACHE_REQUESTS = registry.counter(
+    'bot_cache_requests_total', 'Обращения к кэшам по результату', ('cache', 'result'),
+)
+LLM_FAILURES = registry.counter('bot_llm_failures_total', 'Неудачные генерации SQL по причине', ('reason',))
+VALIDATION_REJECTS = registry.counter('bot_sql_validation_rejects_total', 'SQL от LLM, не прошедший валидацию')
+
+# Замеры этапов текущего вопроса (этап -> секунды)
+_request_spans: contextvars.ContextVar[Optional[dict[str, float]]] = contextvars.ContextVar(
+    'request_spans', default=None,
+)
+
+
+def start_request() -> dict[str, float]:
+    """Начинает сбор замеров этапов для текущего вопроса (задачи, созданные дальше, его наследуют)"""
+    spans: dict[str, float] = {}
+    _request_spans.set(spans)
+    return spans
+
+
+def record_span(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans[stage] = spans.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage: str):
+    """Замер этапа: with span('llm'): ..."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - started)
+
+
+async def start_metrics_server(host: str, port: int):
+    """
+    Запускает HTTP сервер с GET /metrics
+
+    Returns:
+        aiohttp AppRunner; остановка - await runner.cleanup()
+    """
+    from aiohttp import web
+
+    async def metrics_handler(request: web.Request) -> web.Response:
+        return web.Response(
+            body=registry.render().encode('utf-8'),
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'},
+        )
+
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,184 @@
+"""
+Вынос констант SQL запроса в параметры
+
+Запрос от LLM или правил приходит с датами, id креаторов и числами прямо в
+тексте, поэтому для PostgreSQL каждый новый литерал - новый запрос, который
+заново разбирается и планируется. Здесь константы в сравнениях заменяются
+параметрами (:p0, :p1, ...): запросы одной формы дают один и тот же текст,
+и кэш подготовленных выражений asyncpg на соединении (DB_STATEMENT_CACHE_SIZE)
+переиспользует уже подготовленное выражение. Форма запроса учитывается по
+отпечатку текста с параметрами.
+
+Выносятся только литералы справа от операторов сравнения, в BETWEEN и в
+списках IN (...): там PostgreSQL выводит тип параметра из колонки. Литералы
+с явным приведением типа (DATE '...', '...'::date) и все, что не распознано,
+остаются в тексте как есть.
+"""
+import hashlib
+import re
+from collections import Counter as CounterDict
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Optional
+from src.metrics import registry
+
+_TOKEN_RE = re.compile(
+    r"(?P<string>'(?:[^']|'')*')"
+    r'|(?P<quoted>"(?:[^"]|"")*")'
+    r'|(?P<comment>--[^\n]*|/\*.*?\*/)'
+    r'|(?P<number>(?<![\w.])\d+(?:\.\d+)?(?![\w.]))'
+    r'|(?P<cast>::)'
+    r'|(?P<op><=|>=|<>|!=|=|<|>)'
+    r'|(?P<word>\w+)'
+    r'|(?P<space>\s+)'
+    r'|(?P<other>.)',
+    re.DOTALL,
+)
+_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_DATETIME_RE = re.compile(r'^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?$')
+# Ключевые слова перед строкой, задающие ее тип: DATE '2025-11-01', INTERVAL '1 day'
+_TYPED_LITERAL_PREFIXES = {'DATE', 'TIME', 'TIMESTAMP', 'TIMESTAMPTZ', 'INTERVAL'}
+
+SQL_STATEMENTS = registry.counter(
+    'bot_sql_statements_total',
+    'Выполненные SQL запросы по способу передачи констант (bound, literal, fallback)',
+    ('mode',),
+)
+SQL_SHAPES = registry.gauge('bot_sql_shapes', 'Число разных форм SQL запросов с параметрами')
+
+
+@dataclass
+class BoundStatement:
+    """SQL с параметрами вместо констант"""
+    sql: str
+    params: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def fingerprint(self) -> str:
+        return hashlib.sha1(self.sql.encode()).hexdigest()[:16]
+
+
+def _string_value(literal: str) -> Optional[Any]:
+    """Значение параметра для строкового литерала; None - оставить литерал в тексте"""
+    value = literal[1:-1].replace("''", "'")
+    if '\\' in value:
+        return None
+    # asyncpg не приводит строки к датам: типы параметров должны совпадать с колонками
+    if _DATE_RE.match(value):
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            return None
+    if _DATETIME_RE.match(value):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return value
+
+
+def _number_value(literal: str) -> Any:
+    return Decimal(literal) if '.' in literal else int(literal)
+
+
+def parameterize(sql: str) -> Optional[BoundStatement]:
+    """
+    Заменяет константы в сравнениях параметрами :p0, :p1, ...
+
+    Пробелы вне литералов схлопываются, чтобы одна форма запроса давала
+    один текст. Возвращает None, если в запросе нечего выносить или он
+    содержит конструкции, которые безопаснее не трогать (комментарии, :name).
+    """
+    tokens = [(m.lastgroup, m.group()) for m in _TOKEN_RE.finditer(sql.strip().rstrip(';').strip())]
+    if any(kind == 'comment' for kind, _ in tokens):
+        return None
+    # Двоеточие вне '::' SQLAlchemy принял бы за свой параметр
+    if any(kind == 'other' and text == ':' for kind, text in tokens):
+        return None
+
+    significant = [(kind, text) for kind, text in tokens if kind != 'space']
+    parts: list[str] = []
+    params: dict[str, Any] = {}
+    # Для каждой открытой скобки: это список IN (...)
+    parens: list[bool] = []
+    between = False
+
+    for i, (kind, text) in enumerate(significant):
+        prev_kind, prev = significant[i - 1] if i else ('', '')
+        next_kind = significant[i + 1][0] if i + 1 < len(significant) else ''
+        value = None
+
+        if kind in ('string', 'number') and next_kind != 'cast':
+            upper_prev = prev.upper()
+            in_list = bool(parens) and parens[-1] and prev in ('(', ',')
+            after_between = upper_prev == 'AND' and between
+            if prev_kind == 'op' or upper_prev == 'BETWEEN' or after_between or in_list:
+                if kind == 'string':
+                    if upper_prev not in _TYPED_LITERAL_PREFIXES:
+                        value = _string_value(text)
+                else:
+                    value = _number_value(text)
+            if after_between:
+                between = False
+
+        if value is not None:
+            name = f"p{len(params)}"
+            params[name] = value
+            text = f":{name}"
+        elif kind == 'word' and text.upper() == 'BETWEEN':
+            between = True
+        elif text == '(':
+            parens.append(prev.upper() == 'IN')
+        elif text == ')' and parens:
+            parens.pop()
+
+        if parts and _needs_space(parts[-1], text):
+            parts.append(' ')
+        parts.append(text)
+
+    if not params:
+        return None
+    return BoundStatement(''.join(parts), params)
+
+
+def _needs_space(left: str, right: str) -> bool:
+    """Токены разделяются одним пробелом, кроме точки, '::', скобок и запятых"""
+    if right == '(' and (left[-1].isalnum() or left[-1] == '_'):
+        return False
+    return left not in ('(', '.', '::') and right not in (')', ',', '.', '::')
+
+
+class ShapeStats:
+    """Сколько раз выполнялась каждая форма запроса и сколько запросов ушло без параметров"""
+
+    def __init__(self):
+        self.shapes: CounterDict[str] = CounterDict()
+        self.literal = 0
+        self.fallback = 0
+        SQL_SHAPES.func = lambda: {(): len(self.shapes)}
+
+    def record_bound(self, statement: BoundStatement):
+        self.shapes[statement.fingerprint] += 1
+        SQL_STATEMENTS.inc(mode='bound')
+
+    def record_literal(self):
+        self.literal += 1
+        SQL_STATEMENTS.inc(mode='literal')
+
+    def record_fallback(self):
+        self.fallback += 1
+        SQL_STATEMENTS.inc(mode='fallback')
+
+    def stats(self) -> dict:
+        bound = sum(self.shapes.values())
+        return {
+            'bound': bound,
+            'shapes': len(self.shapes),
+            'literal': self.literal,
+            'fallback': self.fallback,
+            'top': self.shapes.most_common(5),
+        }
+
+
+shape_stats = ShapeStats()
@@ -0,0 +1,122 @@
+"""
+Перенаправление агрегатов по video_snapshots в предагрегированные таблицы
+
+Запросы вида "SUM(delta_*) / COUNT(*) / COUNT(DISTINCT video_id) за интервал,
+опционально по креатору" переписываются на snapshot_rollup_hourly или
+snapshot_rollup_daily, где ответ собирается из тысяч строк вместо миллионов.
+Пока загрузчик не пересчитал агрегаты после записи новых замеров (в том числе
+после прерванной загрузки), запросы не перенаправляются (RollupState).
+"""
+import logging
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from src.config import ROLLUP_STALENESS_CHECK_INTERVAL
+from src.db.database import async_session_maker, fetch_rollups_stale
+from src.sql.shapes import AggregateShape, parse_aggregate
+
+logger = logging.getLogger(__name__)
+
+_DELTA_RE = re.compile(r'^delta_(views|likes|comments|reports)_count$')
+
+
+def _is_midnight(value: Optional[datetime]) -> bool:
+    return value is None or value == value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _is_hour(value: Optional[datetime]) -> bool:
+    return value is None or value == value.replace(minute=0, second=0, microsecond=0)
+
+
+def _rollup_column(shape: AggregateShape) -> Optional[str]:
+    """Колонка агрегата, соответствующая запросу"""
+    if shape.aggregate == 'sum':
+        if shape.filters or not _DELTA_RE.match(shape.column or ''):
+            return None
+        return shape.column
+
+    if shape.aggregate == 'count':
+        return None if shape.filters else 'snapshots_count'
+
+    if not shape.filters:
+        return 'videos_count'
+    if len(shape.filters) == 1:
+        column, op, value = shape.filters[0]
+        m = _DELTA_RE.match(column)
+        if m and op == '>' and value == 0:
+            return f'videos_with_{m.group(1)}_growth'
+    return None
+
+
+def route_to_rollups(sql: str) -> Optional[str]:
+    """
+    Возвращает эквивалентный запрос к агрегатам или None, если запрос не подходит
+    """
+    shape = parse_aggregate(sql)
+    if shape is None or shape.table != 'video_snapshots':
+        return None
+
+    column = _rollup_column(shape)
+    bounds = shape.half_open_range()
+    if column is None or bounds is None:
+        return None
+    start, end = bounds
+
+    if _is_midnight(start) and _is_midnight(end):
+        table, key, step = 'snapshot_rollup_daily', 'day', timedelta(days=1)
+        fmt = '%Y-%m-%d'
+    elif _is_hour(start) and _is_hour(end):
+        table, key, step = 'snapshot_rollup_hourly', 'bucket', timedelta(hours=1)
+        fmt = '%Y-%m-%d %H:%M:%S'
+    else:
+        return None
+
+    # Число разных видео не складывается между интервалами - только один интервал агрегата
+    if shape.aggregate == 'count_distinct_video':
+        if start is None or end is None:
+            return None
+        if end - start != step:
+            return None
+
+    conditions = []
+    if start is not None:
+        conditions.append(f"{key} >= '{start.strftime(fmt)}'")
+    if end is not None:
+        conditions.append(f"{key} < '{end.strftime(fmt)}'")
+    if shape.creator_id is not None:
+        conditions.append(f"creator_id = '{shape.creator_id}'")
+
+    routed = f"SELECT COALESCE(SUM({column}), 0) FROM {table}"
+    if conditions:
+        routed += " WHERE " + " AND ".join(conditions)
+    return routed
+
+
+class RollupState:
+    """Актуальность агрегатов по data_generation, перечитывается не чаще раза в check_interval секунд"""
+
+    def __init__(self, check_interval: float = ROLLUP_STALENESS_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._fresh = False
+        self._checked_at: Optional[float] = None
+
+    async def refresh(self) -> bool:
+        """True - агрегаты пересчитаны после последней записи замеров и в них можно перенаправлять запросы"""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return self._fresh
+        try:
+            async with async_session_maker() as session:
+                fresh = not await fetch_rollups_stale(session)
+        except Exception as e:
+            logger.warning("Не удалось проверить актуальность агрегатов: %s", e)
+            fresh = False
+        if fresh != self._fresh:
+            logger.info("Агрегаты %s", "актуальны" if fresh else "устарели, запросы идут в исходные таблицы")
+        self._fresh = fresh
+        self._checked_at = now
+        return fresh
+
+
+rollup_state = RollupState()
@@ -0,0 +1,138 @@
+"""
+Переписывание условий по дате и часу в полуоткрытые диапазоны (SARGable)
+
+LLM по примерам из промпта фильтрует замеры через DATE(created_at) = '...'
+и EXTRACT(HOUR FROM created_at) >= X. Функция над колонкой не дает
+PostgreSQL использовать индекс по created_at и отсекать партиции, поэтому
+такие условия переписываются в created_at >= начало AND created_at < конец.
+Результат запроса при этом не меняется.
+"""
+import re
+from datetime import date, datetime, timedelta
+from typing import Optional
+from src.sql.shapes import hour_range
+
+_COLUMN = r'((?:\w+\.)?\w+)'
+_DATE_LITERAL = r"'(\d{4}-\d{2}-\d{2})'(?:\s*::\s*date)?"
+# DATE(col) или col::date
+_DATE_OF = r'(?:\bDATE\s*\(\s*' + _COLUMN + r'\s*\)|\b' + _COLUMN + r'\s*::\s*date\b)'
+
+_DATE_COMPARE_RE = re.compile(_DATE_OF + r'\s*(>=|<=|=|>|<)\s*' + _DATE_LITERAL, re.IGNORECASE)
+_DATE_BETWEEN_RE = re.compile(
+    _DATE_OF + r'\s+BETWEEN\s+' + _DATE_LITERAL + r'\s+AND\s+' + _DATE_LITERAL, re.IGNORECASE
+)
+_HOUR_OF = r'\bEXTRACT\s*\(\s*HOUR\s+FROM\s+' + _COLUMN + r'\s*\)'
+_HOUR_COMPARE_RE = re.compile(_HOUR_OF + r'\s*(>=|<=|=|>|<)\s*(\d{1,2})\b', re.IGNORECASE)
+_HOUR_BETWEEN_RE = re.compile(_HOUR_OF + r'\s+BETWEEN\s+(\d{1,2})\s+AND\s+(\d{1,2})\b', re.IGNORECASE)
+# Конструкции, при которых нельзя просто убрать условия по часам из цепочки AND
+_NOT_AND_CHAIN_RE = re.compile(r'\b(OR|NOT)\b|\bSELECT\b.*\bSELECT\b', re.IGNORECASE | re.DOTALL)
+
+_REMOVED = '\x00'
+
+
+def _ts(value: datetime) -> str:
+    return f"'{value.strftime('%Y-%m-%d %H:%M:%S')}'"
+
+
+def _midnight(value: str) -> datetime:
+    return datetime.combine(date.fromisoformat(value), datetime.min.time())
+
+
+def _range(column: str, start: Optional[datetime], end: Optional[datetime], wrap: bool) -> str:
+    conditions = []
+    if start is not None:
+        conditions.append(f"{column} >= {_ts(start)}")
+    if end is not None:
+        conditions.append(f"{column} < {_ts(end)}")
+    expr = ' AND '.join(conditions)
+    return f"({expr})" if wrap and len(conditions) > 1 else expr
+
+
+def _date_compare(column: str, op: str, value: str, wrap: bool) -> str:
+    day = _midnight(value)
+    next_day = day + timedelta(days=1)
+    if op == '=':
+        return _range(column, day, next_day, wrap)
+    if op == '>=':
+        return _range(column, day, None, wrap)
+    if op == '>':
+        return _range(column, next_day, None, wrap)
+    if op == '<':
+        return _range(column, None, day, wrap)
+    return _range(column, None, next_day, wrap)
+
+
+def _merge_hours(sql: str) -> str:
+    """
+    DATE(col) = D AND EXTRACT(HOUR FROM col) ... -> col >= D + h1 AND col < D + h2
+
+    Выполняется только для простой цепочки AND, где условие по дате одно и
+    все условия по часам относятся к той же колонке.
+    """
+    if _NOT_AND_CHAIN_RE.search(sql):
+        return sql
+
+    dates = [m for m in _DATE_COMPARE_RE.finditer(sql) if m.group(3) == '=']
+    hours = list(_HOUR_COMPARE_RE.finditer(sql))
+    betweens = list(_HOUR_BETWEEN_RE.finditer(sql))
+    if len(dates) != 1 or not (hours or betweens):
+        return sql
+
+    date_match = dates[0]
+    column = (date_match.group(1) or date_match.group(2)).lower()
+    conditions = []
+    for m in hours:
+        if m.group(1).lower() != column:
+            return sql
+        conditions.append((m.group(2), int(m.group(3))))
+    for m in betweens:
+        if m.group(1).lower() != column:
+            return sql
+        conditions += [('>=', int(m.group(2))), ('<=', int(m.group(3)))]
+
+    bounds = hour_range(conditions)
+    if bounds is None:
+        return sql
+
+    day = _midnight(date_match.group(4))
+    replacement = _range(
+        date_match.group(1) or date_match.group(2),
+        day + timedelta(hours=bounds[0]),
+        day + timedelta(hours=bounds[1]),
+        wrap=False,
+    )
+
+    # Заменяем с конца, чтобы не сдвигать позиции еще не обработанных совпадений
+    spans = [(m.start(), m.end(), _REMOVED) for m in hours + betweens]
+    spans.append((date_match.start(), date_match.end(), replacement))
+    for start, end, text in sorted(spans, reverse=True):
+        sql = sql[:start] + text + sql[end:]
+
+    sql = re.sub(r'\s+AND\s+' + _REMOVED, '', sql, flags=re.IGNORECASE)
+    sql = re.sub(_REMOVED + r'\s+AND\s+', '', sql, flags=re.IGNORECASE)
+    return sql if _REMOVED not in sql else None
+
+
+def rewrite_sargable(sql: str) -> str:
+    """
+    Переписывает DATE()/::date/EXTRACT(HOUR) условия в диапазоны по timestamp.
+    Если переписать нельзя, возвращает запрос без изменений.
+    """
+    merged = _merge_hours(sql)
+    if merged is None:
+        return sql
+    sql = merged
+
+    # В цепочке AND скобки не нужны (и не мешают разбору в src/sql/shapes.py)
+    wrap = bool(_NOT_AND_CHAIN_RE.search(sql))
+
+    def replace_between(m: re.Match) -> str:
+        start = _midnight(m.group(3))
+        end = _midnight(m.group(4)) + timedelta(days=1)
+        return _range(m.group(1) or m.group(2), start, end, wrap)
+
+    def replace_compare(m: re.Match) -> str:
+        return _date_compare(m.group(1) or m.group(2), m.group(3), m.group(4), wrap)
+
+    sql = _DATE_BETWEEN_RE.sub(replace_between, sql)
+    return _DATE_COMPARE_RE.sub(replace_compare, sql)
@@ -0,0 +1,237 @@
+"""
+Разбор простых агрегирующих SQL запросов в структурное описание
+
+Поддерживается только узкий класс запросов, которые генерирует LLM и правила:
+одна агрегатная функция, таблица videos или video_snapshots (опционально с
+JOIN videos для фильтра по креатору) и WHERE из условий, соединенных AND.
+Все, что не распознано, возвращает None - вызывающий код должен выполнять
+исходный SQL без изменений.
+"""
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional
+
+# Колонка, по которой фильтруется время, для каждой таблицы
+TIME_COLUMNS = {
+    'videos': 'video_created_at',
+    'video_snapshots': 'created_at',
+}
+
+_IDENT = r'(?:(\w+)\.)?(\w+)'
+_LITERAL = r"'([^']*)'"
+_OPS = r'(>=|<=|<>|!=|=|>|<)'
+
+_SELECT_RE = re.compile(
+    r'^SELECT\s+(?P<agg>.+?)\s+FROM\s+(?P<table>\w+)(?:\s+(?:AS\s+)?(?P<alias>(?!JOIN\b|WHERE\b)\w+))?'
+    r'(?:\s+(?:INNER\s+)?JOIN\s+videos(?:\s+(?:AS\s+)?(?P<jalias>(?!ON\b)\w+))?\s+ON\s+(?P<on>[\w.]+\s*=\s*[\w.]+))?'
+    r'(?:\s+WHERE\s+(?P<where>.+))?$',
+    re.IGNORECASE | re.DOTALL,
+)
+_AGG_RES = [
+    ('count', re.compile(r'^COUNT\s*\(\s*\*\s*\)$', re.IGNORECASE)),
+    ('count_distinct_video', re.compile(r'^COUNT\s*\(\s*DISTINCT\s+' + _IDENT + r'\s*\)$', re.IGNORECASE)),
+    ('sum', re.compile(r'^(?:COALESCE\s*\(\s*)?SUM\s*\(\s*' + _IDENT + r'\s*\)(?:\s*,\s*0\s*\))?$', re.IGNORECASE)),
+]
+_DATE_EQ_RE = re.compile(r'^DATE\s*\(\s*' + _IDENT + r'\s*\)\s*=\s*' + _LITERAL + '$', re.IGNORECASE)
+_HOUR_RE = re.compile(r'^EXTRACT\s*\(\s*HOUR\s+FROM\s+' + _IDENT + r'\s*\)\s*' + _OPS + r'\s*(\d+)$', re.IGNORECASE)
+_COMPARE_LITERAL_RE = re.compile(r'^' + _IDENT + r'\s*' + _OPS + r'\s*' + _LITERAL + '$', re.IGNORECASE)
+_COMPARE_NUMBER_RE = re.compile(r'^' + _IDENT + r'\s*' + _OPS + r'\s*(-?\d+)$', re.IGNORECASE)
+_AND_RE = re.compile(r'\s+AND\s+', re.IGNORECASE)
+# Колонки, которые есть только в videos (без префикса в JOIN относятся к ней)
+_VIDEOS_ONLY_COLUMNS = ('creator_id', 'video_created_at')
+
+
+@dataclass
+class Bound:
+    """Граница временного интервала"""
+    value: datetime
+    inclusive: bool
+
+
+@dataclass
+class AggregateShape:
+    """Структурное описание агрегирующего запроса"""
+    table: str
+    aggregate: str  # 'count', 'count_distinct_video' или 'sum'
+    column: Optional[str] = None  # колонка для SUM
+    joined_videos: bool = False
+    creator_id: Optional[str] = None
+    lower: Optional[Bound] = None
+    upper: Optional[Bound] = None
+    hours: Optional[tuple[int, int]] = None  # [начальный час, конечный час)
+    filters: list[tuple[str, str, int]] = field(default_factory=list)
+
+    @property
+    def time_column(self) -> str:
+        return TIME_COLUMNS[self.table]
+
+    def half_open_range(self) -> Optional[tuple[Optional[datetime], Optional[datetime]]]:
+        """
+        Интервал времени в виде [начало, конец) с учетом часов внутри одного дня.
+        None, если границы нельзя записать полуоткрытым интервалом.
+        """
+        if self.lower is not None and not self.lower.inclusive:
+            return None
+        if self.upper is not None and self.upper.inclusive:
+            return None
+        start = self.lower.value if self.lower else None
+        end = self.upper.value if self.upper else None
+        if self.hours is None:
+            return start, end
+        # Часы сужают интервал только если он ровно один день
+        if start is None or end is None or end - start != timedelta(days=1) or start != _day(start):
+            return None
+        return start + timedelta(hours=self.hours[0]), start + timedelta(hours=self.hours[1])
+
+
+def _day(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def parse_timestamp(value: str) -> Optional[datetime]:
+    """Разбирает литерал 'YYYY-MM-DD' или 'YYYY-MM-DD HH:MM[:SS]'"""
+    try:
+        return datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+
+
+def hour_range(conditions: list[tuple[str, int]]) -> Optional[tuple[int, int]]:
+    """Интервал часов [начало, конец) по условиям (оператор, час) на EXTRACT(HOUR ...)"""
+    start, end = 0, 24
+    for op, value in conditions:
+        if op == '>=':
+            start = max(start, value)
+        elif op == '>':
+            start = max(start, value + 1)
+        elif op == '<':
+            end = min(end, value)
+        elif op == '<=':
+            end = min(end, value + 1)
+        elif op == '=':
+            start, end = max(start, value), min(end, value + 1)
+        else:
+            return None
+    return (start, end) if start < end else None
+
+
+def parse_aggregate(sql: str) -> Optional[AggregateShape]:
+    """Разбирает SQL в AggregateShape или возвращает None"""
+    sql = re.sub(r'\s+', ' ', sql.strip().rstrip(';')).strip()
+    if re.search(r'\b(OR|NOT|GROUP|HAVING|ORDER|LIMIT|UNION|SELECT\s.*\bSELECT)\b', sql, re.IGNORECASE):
+        return None
+
+    m = _SELECT_RE.match(sql)
+    if not m:
+        return None
+
+    table = m.group('table').lower()
+    if table not in TIME_COLUMNS:
+        return None
+    alias = (m.group('alias') or table).lower()
+    joined = m.group('on') is not None
+    if joined and table != 'video_snapshots':
+        return None
+    join_alias = (m.group('jalias') or 'videos').lower()
+
+    def owner(qualifier: Optional[str], column: str) -> Optional[str]:
+        """Какой таблице принадлежит колонка: 'main', 'videos' или None (неоднозначно)"""
+        if qualifier:
+            q = qualifier.lower()
+            if q == alias:
+                return 'main'
+            return 'videos' if joined and q == join_alias else None
+        if not joined:
+            return 'main'
+        if column in _VIDEOS_ONLY_COLUMNS:
+            return 'videos'
+        if column == 'video_id' or column.startswith('delta_'):
+            return 'main'
+        return None
+
+    if joined:
+        left, right = [part.strip().lower() for part in m.group('on').split('=')]
+        expected = {f'{alias}.video_id', f'{join_alias}.id'}
+        if {left, right} != expected:
+            return None
+
+    shape = None
+    agg = m.group('agg').strip()
+    for kind, regex in _AGG_RES:
+        am = regex.match(agg)
+        if not am:
+            continue
+        if kind == 'count':
+            shape = AggregateShape(table=table, aggregate=kind)
+        elif kind == 'count_distinct_video':
+            if table != 'video_snapshots' or am.group(2).lower() != 'video_id' or owner(am.group(1), 'video_id') != 'main':
+                return None
+            shape = AggregateShape(table=table, aggregate=kind)
+        else:
+            column = am.group(2).lower()
+            if owner(am.group(1), column) != 'main':
+                return None
+            shape = AggregateShape(table=table, aggregate=kind, column=column)
+        break
+    if shape is None:
+        return None
+    shape.joined_videos = joined
+
+    where = m.group('where')
+    hour_conditions = []
+    for condition in (_AND_RE.split(where) if where else []):
+        condition = condition.strip()
+
+        dm = _DATE_EQ_RE.match(condition)
+        if dm:
+            if owner(dm.group(1), dm.group(2)) != 'main' or dm.group(2).lower() != shape.time_column:
+                return None
+            day = parse_timestamp(dm.group(3))
+            if day is None or day != _day(day) or shape.lower or shape.upper:
+                return None
+            shape.lower = Bound(day, True)
+            shape.upper = Bound(day + timedelta(days=1), False)
+            continue
+
+        hm = _HOUR_RE.match(condition)
+        if hm:
+            if owner(hm.group(1), hm.group(2)) != 'main' or hm.group(2).lower() != shape.time_column:
+                return None
+            hour_conditions.append((hm.group(3), int(hm.group(4))))
+            continue
+
+        lm = _COMPARE_LITERAL_RE.match(condition)
+        if lm:
+            column, op, value = lm.group(2).lower(), lm.group(3), lm.group(4)
+            where_owner = owner(lm.group(1), column)
+            if column == 'creator_id' and op == '=' and shape.creator_id is None and (
+                    where_owner == 'videos' or (table == 'videos' and where_owner == 'main')):
+                shape.creator_id = value
+                continue
+            if where_owner != 'main' or column != shape.time_column:
+                return None
+            ts = parse_timestamp(value)
+            if ts is None:
+                return None
+            if op in ('>=', '>') and shape.lower is None:
+                shape.lower = Bound(ts, op == '>=')
+            elif op in ('<', '<=') and shape.upper is None:
+                shape.upper = Bound(ts, op == '<=')
+            else:
+                return None
+            continue
+
+        nm = _COMPARE_NUMBER_RE.match(condition)
+        if nm and owner(nm.group(1), nm.group(2).lower()) == 'main':
+            shape.filters.append((nm.group(2).lower(), nm.group(3), int(nm.group(4))))
+            continue
+
+        return None
+
+    if hour_conditions:
+        shape.hours = hour_range(hour_conditions)
+        if shape.hours is None:
+            return None
+
+    return shape